@@ -1,13 +1,13 @@
 # -*- coding: utf-8 -*-
+import argparse
 import os
 import sys
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
 from datetime import datetime, timedelta, timezone
 
 # --- DATABASE SETUP (Correct Way) ---
-# Replicating the connection method from backend/database.py
-# This ensures the script uses the same environment variables as the main app.
+# The engine and session factory come from backend/database.py so the script
+# uses the same environment variables and pool settings as the main app.
+# .env.local must be loaded before that module is imported.
 try:
     from dotenv import load_dotenv
     # Assuming the script is run from the root directory where .env.local is
@@ -22,18 +22,14 @@ except ImportError:
     pass
 
 from backend import models
+from backend.database import ReadSessionLocal, engine
 from backend.core.email import send_email
+from backend.core.metrics import TICKETS_ESCALATED, record_automation_run
+from backend.core.tracing import traced_run
+from backend.core.profiling import add_profile_argument, run_profiled
+from backend.core.logging_config import setup_logging
+from backend.core.memory import add_memory_argument, run_traced
 
-DB_USER = os.getenv("DB_USER", "root")
-DB_PASS = os.getenv("DB_PASS", "root")
-DB_HOST = os.getenv("DB_HOST", "localhost")
-DB_PORT = int(os.getenv("DB_PORT", 3306))
-DB_NAME = os.getenv("DB_NAME", "innovaweb")
-
-DATABASE_URL = f"mysql+mysqlconnector://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 def get_customer_email(db, customer_code):
     """Fetches the email for a given customer code."""
@@ -48,14 +44,18 @@ def get_customer_email(db, customer_code):
         return main_contact_email
     return None
 
+@traced_run("check_escalations")
 def check_ticket_escalations():
     """
     Main function to check all open tickets and send escalation notifications
     based on the configured attention flow rules.
     """
-    db = SessionLocal()
+    # Reads go to the replica when configured; the final commit goes to the primary
+    db = ReadSessionLocal()
     print(f"--- Running escalation check at {datetime.now(timezone.utc)} ---")
-    print(f"Connecting to DB: {DB_HOST}:{DB_PORT} as {DB_USER}")
+    print(f"Connecting to DB: {engine.url}") # The password is masked
+    succeeded = True
+    escalated = {"customer": 0, "assignee": 0}
 
     try:
         # 1. Fetch Attention Flow Settings
@@ -67,10 +67,25 @@ def check_ticket_escalations():
         print(f"Loaded settings: Nuevo={settings.max_time_new}h, Pendiente={settings.max_time_pending}h, Pruebas={settings.max_time_testing}h, Espera={settings.max_time_waiting}h")
         print(f"Priority settings: Low={settings.max_time_priority_low}h, Medium={settings.max_time_priority_medium}h, High={settings.max_time_priority_high}h, Critical={settings.max_time_priority_critical}h")
 
-        # 2. Fetch all open tickets that have a state change date
+        # 2. Fetch open tickets idle for longer than the shortest configured limit.
+        # Tickets changed more recently cannot exceed any limit, and the cutoff
+        # lets the query use the state_last_changed_date index.
+        configured_limits = [
+            hours for hours in (
+                settings.max_time_new, settings.max_time_pending, settings.max_time_testing,
+                settings.max_time_waiting, settings.max_time_priority_low, settings.max_time_priority_medium,
+                settings.max_time_priority_high, settings.max_time_priority_critical
+            ) if hours and hours > 0
+        ]
+        if not configured_limits:
+            print("No time limits configured. Nothing to check.")
+            return
+
+        # state_last_changed_date is stored as naive UTC
+        idle_cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(hours=min(configured_limits))
         open_tickets = db.query(models.Card).filter(
-            models.Card.State.notin_(['Cerrado', 'Terminado']),
-            models.Card.state_last_changed_date.isnot(None)
+            models.Card.state_last_changed_date < idle_cutoff,
+            models.Card.State.notin_(['Cerrado', 'Terminado'])
         ).all()
         
         print(f"Found {len(open_tickets)} open tickets to check.")
@@ -110,7 +125,8 @@ def check_ticket_escalations():
                             subject = f"Recordatorio: Ticket #{ticket.internalId} en espera de su respuesta"
                             body = f"<p>Hola,</p><p>Te recordamos que el ticket '{ticket.Name}' sigue esperando una respuesta de tu parte para poder continuar.</p><p>Por favor, revisa el ticket en el sistema.</p>"
                             try:
-                                send_email(customer_email, subject, body)
+                                if send_email(customer_email, subject, body):
+                                    escalated["customer"] += 1
                                 ticket.last_escalation_sent_date = now
                                 print(f"  > Notification sent to customer at {customer_email}")
                             except Exception as e:
@@ -162,7 +178,8 @@ def check_ticket_escalations():
                             subject = f"Alerta: Ticket #{ticket.internalId} ha excedido el tiempo límite"
                             body = f"<p>Hola {ticket.assign},</p><p>Te informamos que el ticket '{ticket.Name}' (Prioridad: {ticket.Priority}) ha permanecido en estado '{ticket.State}' por más tiempo del configurado ({max_hours} horas).</p><p>Por favor, revisa el ticket en el sistema.</p>"
                             try:
-                                send_email(assignee.gmail, subject, body)
+                                if send_email(assignee.gmail, subject, body):
+                                    escalated["assignee"] += 1
                                 ticket.last_escalation_sent_date = now
                                 print(f"  > Notification sent to assignee at {assignee.gmail}")
                             except Exception as e:
@@ -171,13 +188,23 @@ def check_ticket_escalations():
                             print(f"  > Could not find assignee email for user '{ticket.assign}'")
 
         db.commit()
+        # Counted after the commit so a rolled back run does not report escalations
+        for target, count in escalated.items():
+            TICKETS_ESCALATED.labels(target).inc(count)
 
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
         db.rollback()
+        succeeded = False
     finally:
+        record_automation_run("check_escalations", succeeded)
         print("--- Escalation check finished ---")
         db.close()
 
 if __name__ == "__main__":
-    check_ticket_escalations()
\ No newline at end of file
+    setup_logging()
+    parser = argparse.ArgumentParser(description="Send the escalation notifications of open tickets")
+    add_profile_argument(parser)
+    add_memory_argument(parser)
+    args = parser.parse_args()
+    run_traced(lambda: run_profiled(check_ticket_escalations, args.profile), args.memory)
\ No newline at end of file
@@ -5,13 +5,12 @@ Script de Notificación de Consumo de Horas de Soporte
 Este script verifica el consumo de horas de soporte de cada cliente y envía
 notificaciones cuando se alcanzan los umbrales del 80%, 100% y 120%.
 
-Ejecución: python check_support_hours.py
+Ejecución: python check_support_hours.py [--profile [archivo.folded]] [--memory]
 Recomendado: Programar como tarea diaria a las 8:00 AM
 """
+import argparse
 import os
 import sys
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
 from datetime import datetime, timezone, timedelta
 
 # --- DATABASE SETUP ---
@@ -25,18 +24,14 @@ except ImportError:
     pass
 
 from backend import models
+from backend.database import ReadSessionLocal, engine
 from backend.core.email import send_email
+from backend.core.metrics import CLIENTS_ALERTED, record_automation_run
+from backend.core.tracing import traced_run
+from backend.core.profiling import add_profile_argument, run_profiled
+from backend.core.logging_config import setup_logging
+from backend.core.memory import add_memory_argument, run_traced
 
-DB_USER = os.getenv("DB_USER", "root")
-DB_PASS = os.getenv("DB_PASS", "root")
-DB_HOST = os.getenv("DB_HOST", "localhost")
-DB_PORT = int(os.getenv("DB_PORT", 3306))
-DB_NAME = os.getenv("DB_NAME", "innovaweb")
-
-DATABASE_URL = f"mysql+mysqlconnector://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
 def calculate_duration(hora_inicio, hora_fin):
@@ -207,14 +202,17 @@ def send_threshold_notification(db, cliente, percentage, consumed_hours, remaini
     return sent_count, level
 
 
+@traced_run("check_support_hours")
 def check_support_hours():
     """
     Función principal que verifica el consumo de horas de todos los clientes
     y envía notificaciones según los umbrales configurados.
     """
-    db = SessionLocal()
+    # Reads go to the replica when configured; the final commit goes to the primary
+    db = ReadSessionLocal()
     print(f"--- Verificación de Horas de Soporte: {datetime.now(timezone.utc)} ---")
-    print(f"Conectando a DB: {DB_HOST}:{DB_PORT} como {DB_USER}")
+    print(f"Conectando a DB: {engine.url}") # La contraseña se muestra enmascarada
+    succeeded = True
     
     try:
         # Obtener emails de administradores
@@ -286,6 +284,7 @@ def check_support_hours():
         
         # Commit de cambios
         db.commit()
+        CLIENTS_ALERTED.inc(clients_notified)
         
         print(f"\n--- Resumen ---")
         print(f"Clientes notificados: {clients_notified}")
@@ -294,10 +293,17 @@ def check_support_hours():
     except Exception as e:
         print(f"Error inesperado: {e}")
         db.rollback()
+        succeeded = False
     finally:
+        record_automation_run("check_support_hours", succeeded)
         print("--- Verificación finalizada ---")
         db.close()
 
 
 if __name__ == "__main__":
-    check_support_hours()
+    setup_logging()
+    parser = argparse.ArgumentParser(description="Notify clients and admins about support hour consumption")
+    add_profile_argument(parser)
+    add_memory_argument(parser)
+    args = parser.parse_args()
+    run_traced(lambda: run_profiled(check_support_hours, args.profile), args.memory)
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Script de Exportación del Snapshot Analítico
+
+Copia las tablas Activity, Cards, Customer y Project a un archivo DuckDB
+(ANALYTICS_SNAPSHOT_PATH) que usa el modo analítico de /api/reports, para que
+los análisis históricos no consulten la base compartida con el ERP.
+Lee de la réplica cuando DB_REPLICA_URL está configurada.
+
+Ejecución: python -m automatizaciones.export_analytics_snapshot [--parquet-dir DIR]
+Recomendado: Programar como tarea diaria a las 2:00 AM
+"""
+import argparse
+import os
+import time
+from datetime import datetime, timezone
+
+# --- DATABASE SETUP ---
+try:
+    from dotenv import load_dotenv
+    dotenv_path = os.path.join(os.path.dirname(__file__), '.env.local')
+    if os.path.exists(dotenv_path):
+        load_dotenv(dotenv_path)
+except ImportError:
+    print("python-dotenv not found, relying on system environment variables.")
+
+from backend.database import create_db_engine, DB_REPLICA_URL
+from backend.core.analytics import export_snapshot, ANALYTICS_SNAPSHOT_PATH
+from backend.core.logging_config import setup_logging
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the analytics snapshot")
+    parser.add_argument("--output", default=ANALYTICS_SNAPSHOT_PATH, help="DuckDB file to write")
+    parser.add_argument("--parquet-dir", help="Also write one Parquet file per table to this directory")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Rows read per query")
+    args = parser.parse_args()
+
+    print(f"--- Exportando snapshot analítico: {datetime.now(timezone.utc)} ---")
+    # Conexión propia sin límite de tiempo por consulta: la exportación lee tablas completas
+    # por lotes y no debe competir con el pool de la API.
+    db_engine = create_db_engine(DB_REPLICA_URL, statement_timeout_ms=0, pool_size=1, max_overflow=0)
+    started = time.perf_counter()
+    try:
+        counts = export_snapshot(db_engine, args.output, args.batch_size, args.parquet_dir)
+    finally:
+        db_engine.dispose()
+
+    for name, rows in counts.items():
+        print(f"  {name}: {rows} filas")
+    print(f"Snapshot escrito en {args.output} ({time.perf_counter() - started:.1f}s)")
+
+
+if __name__ == "__main__":
+    setup_logging()
+    main()
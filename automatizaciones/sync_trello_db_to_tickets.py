@@ -1,9 +1,9 @@
 # -*- coding: utf-8 -*-
+import argparse
 import os
 import sys
 import json
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, joinedload
+from sqlalchemy.orm import joinedload
 from datetime import datetime, timezone
 
 # --- Path Setup ---
@@ -19,16 +19,12 @@ except ImportError:
     print("python-dotenv not found, relying on system environment variables.")
 
 from backend import models
-
-DB_USER = os.getenv("DB_USER", "root")
-DB_PASS = os.getenv("DB_PASS", "root")
-DB_HOST = os.getenv("DB_HOST", "localhost")
-DB_PORT = int(os.getenv("DB_PORT", 3306))
-DB_NAME = os.getenv("DB_NAME", "innovaweb")
-
-DATABASE_URL = f"mysql+mysqlconnector://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+from backend.database import SessionLocal, ReadSessionLocal
+from backend.core.metrics import TRELLO_CARDS_CREATED, record_automation_run
+from backend.core.tracing import traced_run
+from backend.core.profiling import add_profile_argument, run_profiled
+from backend.core.logging_config import setup_logging
+from backend.core.memory import add_memory_argument, run_traced
 
 
 def get_trello_creation_date(trello_card_id):
@@ -39,17 +35,22 @@ def get_trello_creation_date(trello_card_id):
     except Exception:
         return datetime.now(timezone.utc)
 
+@traced_run("sync_trello")
 def sync_trello_to_tickets():
     """
     Reads Trello card data from the local DB mirror and creates new tickets
     in the application's Cards table if they don't already exist.
     """
     db = SessionLocal()
+    # Board configuration and the Trello mirror are read from the replica when
+    # configured. The duplicate check stays on the primary with the inserts.
+    read_db = ReadSessionLocal()
     print(f"--- Running Trello DB Sync at {datetime.now(timezone.utc)} ---")
+    succeeded = True
     
     try:
         # 1. Get all active boards marked for updating
-        active_boards = db.query(models.Board).options(joinedload(models.Board.lists)).filter_by(UpdateC=True, Closed=False).all()
+        active_boards = read_db.query(models.Board).options(joinedload(models.Board.lists)).filter_by(UpdateC=True, Closed=False).all()
         if not active_boards:
             print("No active boards found for updating. Exiting.")
             return
@@ -61,7 +62,7 @@ def sync_trello_to_tickets():
             print(f"\nProcessing board: '{board.Name}' (ID: {board.ID}) for customer '{board.Customer}'")
             
             # 2. Get the raw Trello JSON data for the board using the correct column 'Code'
-            trello_data = db.query(models.TrelloBoardData).filter_by(Code=board.ID).first()
+            trello_data = read_db.query(models.TrelloBoardData).filter_by(Code=board.ID).first()
             if not trello_data or not trello_data.Data:
                 print(f" > No Trello data found for board with Code/ID {board.ID}. Skipping.")
                 continue
@@ -111,7 +112,7 @@ def sync_trello_to_tickets():
                     assign=board.Assigned or "updcards",
                 )
 
-                customer = db.query(models.Cliente).filter(models.Cliente.code == board.Customer).first()
+                customer = read_db.query(models.Cliente).filter(models.Cliente.code == board.Customer).first()
                 if customer:
                     new_ticket.nombre_cliente = customer.razon_social
 
@@ -124,6 +125,7 @@ def sync_trello_to_tickets():
 
         if new_tickets_created_total > 0:
             db.commit()
+            TRELLO_CARDS_CREATED.inc(new_tickets_created_total)
             print(f"\nSuccessfully created a total of {new_tickets_created_total} new tickets.")
         else:
             print("\nNo new tickets to create across all boards.")
@@ -131,10 +133,18 @@ def sync_trello_to_tickets():
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
         db.rollback()
+        succeeded = False
     finally:
+        record_automation_run("sync_trello", succeeded)
         print("--- Trello DB Sync finished ---")
+        read_db.close()
         db.close()
 
 
 if __name__ == "__main__":
-    sync_trello_to_tickets()
\ No newline at end of file
+    setup_logging()
+    parser = argparse.ArgumentParser(description="Create tickets for new Trello cards")
+    add_profile_argument(parser)
+    add_memory_argument(parser)
+    args = parser.parse_args()
+    run_traced(lambda: run_profiled(sync_trello_to_tickets, args.profile), args.memory)
\ No newline at end of file
@@ -1,3 +1,5 @@
+import logging
+
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session, joinedload
 from pydantic import BaseModel
@@ -5,10 +7,13 @@ from typing import List, Optional
 from datetime import datetime
 
 from .. import models
-from ..database import get_db
+from ..database import get_db, get_read_db, get_report_db
 from ..core.email import send_email # Import send_email
+from ..core import queries
 from .users_api import get_current_user
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(
     prefix="/api",
     tags=["Actividades"]
@@ -56,21 +61,21 @@ class ActivityDetailResponse(ActivityResponse):
 def create_actividad(actividad: ActivityCreate, db: Session = Depends(get_db), current_user: models.PersonOfCustomer = Depends(get_current_user)):
     
     # 1. Find the client
-    cliente = db.query(models.Cliente).filter(models.Cliente.id == actividad.cliente_id).first()
+    cliente = db.execute(queries.CLIENTE_BY_ID, {"cliente_id": actividad.cliente_id}).scalars().first()
     
     # Fallback: Try finding by Code (as string) if not found by ID
     if not cliente:
-        cliente = db.query(models.Cliente).filter(models.Cliente.code == str(actividad.cliente_id)).first()
+        cliente = db.execute(queries.CLIENTE_BY_CODE, {"code": str(actividad.cliente_id)}).scalars().first()
 
     if not cliente:
         raise HTTPException(status_code=404, detail=f"Cliente with ID {actividad.cliente_id} not found")
 
     # 1.5 Check for overlapping activities for the same user
     # Get all activities for the current user on the same day
-    same_day_activities = db.query(models.Actividad).filter(
-        models.Actividad.user == current_user.user,
-        models.Actividad.fecha_creacion == actividad.hora_inicio.date()
-    ).all()
+    same_day_activities = db.execute(
+        queries.ACTIVITIES_OF_USER_ON,
+        {"username": current_user.user, "day": actividad.hora_inicio.date()}
+    ).scalars().all()
 
     new_start = actividad.hora_inicio.time()
     new_end = actividad.hora_fin.time()
@@ -90,26 +95,27 @@ def create_actividad(actividad: ActivityCreate, db: Session = Depends(get_db), c
     # 3. Update client's consumed hours
     cliente.support_hours_consumed += duration_hours
 
-    print(f"DEBUG: Cliente ID: {cliente.id}, Horas de soporte: {cliente.support_hours}, Horas consumidas: {cliente.support_hours_consumed}")
-    print(f"DEBUG: Last Alert Level: {cliente.last_alert_level}")
+    logger.debug(
+        "Cliente ID: %s, Horas de soporte: %s, Horas consumidas: %s, Last Alert Level: %s",
+        cliente.id, cliente.support_hours, cliente.support_hours_consumed, cliente.last_alert_level
+    )
 
     # 4. Check for support hour thresholds and send alerts
     if cliente.support_hours > 0: # Avoid division by zero
         utilization_percentage = (cliente.support_hours_consumed / cliente.support_hours) * 100
-        print(f"DEBUG: Porcentaje de utilización: {utilization_percentage}")
+        logger.debug("Porcentaje de utilización: %s", utilization_percentage)
         alert_thresholds = [80.0, 100.0, 120.0] # Define thresholds
 
         for threshold in sorted(alert_thresholds):
-            print(f"DEBUG: Checking threshold {threshold}. Current utilization: {utilization_percentage}. Last alert level: {cliente.last_alert_level}")
             if utilization_percentage >= threshold and cliente.last_alert_level < threshold:
-                print(f"DEBUG: Threshold {threshold} met and alert not sent yet. Searching for support managers.")
+                logger.debug("Threshold %s met and alert not sent yet. Searching for support managers.", threshold)
                 # Find support managers belonging to the client to send email to
                 support_managers = db.query(models.PersonOfCustomer).filter(
                     models.PersonOfCustomer.roll == 4, # Changed from string to integer 4
                     models.PersonOfCustomer.cliente_id == cliente.id
                 ).all() # Assuming "gerente de soporte" is the role and client_id links managers to clients
 
-                print(f"DEBUG: Found {len(support_managers)} support managers.")
+                logger.debug("Found %d support managers.", len(support_managers))
                 if support_managers:
                     subject = f"Alerta de Bolsa de Horas - Cliente {cliente.nombre} al {int(threshold)}%"
                     body = f"""
@@ -128,17 +134,18 @@ Saludos,
 Sistema de Tickets Innova
                     """
                     for manager in support_managers:
-                        print(f"DEBUG: Manager found - ID: {manager.id}, Gmail: {manager.gmail}")
                         if manager.gmail:
                             try:
                                 send_email(manager.gmail, subject, body)
-                                print(f"DEBUG: Email de alerta enviado a {manager.gmail} para cliente {cliente.nombre} al {int(threshold)}%")
-                            except Exception as e:
-                                print(f"ERROR: Fallo al enviar email de alerta a {manager.gmail}: {e}")
+                                logger.info(
+                                    "Email de alerta enviado a %s para cliente %s al %d%%", manager.gmail, cliente.nombre, threshold
+                                )
+                            except Exception:
+                                logger.exception("Fallo al enviar email de alerta a %s", manager.gmail)
                         else:
-                            print(f"DEBUG: Gerente de soporte {manager.id} no tiene un email configurado.")
+                            logger.debug("Gerente de soporte %s no tiene un email configurado.", manager.id)
                 else:
-                    print("DEBUG: No support managers found with roll 4 for this client.")
+                    logger.debug("No support managers found with roll 4 for this client.")
                 
                 # Update last_alert_level to prevent sending the same alert multiple times
                 cliente.last_alert_level = threshold
@@ -188,13 +195,13 @@ Sistema de Tickets Innova
 
     # 6. Update Ticket Status if requested
     if actividad.update_ticket_additional_status and actividad.card_id:
-        card = db.query(models.Card).filter(models.Card.internalId == actividad.card_id).first()
+        card = db.execute(queries.CARD_BY_ID, {"card_id": actividad.card_id}).scalars().first()
         if card:
             # Only update if not already set to avoid overwriting existing status
             if not card.AdditionalHoursStatus or card.AdditionalHoursStatus == 'No Adicional':
                 card.AdditionalHoursStatus = 'Pendiente de Aprobacion'
                 db.commit()
-                print(f"DEBUG: Updated Ticket {card.internalId} AdditionalHoursStatus to 'Pendiente de Aprobacion'")
+                logger.debug("Updated Ticket %s AdditionalHoursStatus to 'Pendiente de Aprobacion'", card.internalId)
     
     # Reverse mapping for response
     task_type_mapping_rev = {
@@ -271,7 +278,7 @@ def read_actividades(
 
     limit: int = 100, 
 
-    db: Session = Depends(get_db), 
+    db: Session = Depends(get_read_db), 
 
     current_user: models.PersonOfCustomer = Depends(get_current_user),
 
@@ -346,7 +353,7 @@ def read_actividades(
     return response
 
 @router.get("/reports/additional-hours/{cliente_id}", tags=["Reportes"])
-def get_additional_hours_report(cliente_id: int, db: Session = Depends(get_db), current_user: models.PersonOfCustomer = Depends(get_current_user)):
+def get_additional_hours_report(cliente_id: int, db: Session = Depends(get_report_db), current_user: models.PersonOfCustomer = Depends(get_current_user)):
     # 1. Get all tickets (Cards) for the client that have AdditionalHoursStatus set (assuming not null means relevant)
     # Adjust the filter based on exact requirements. Here assuming "Pendiente de Aprobacion" or others are relevant.
     # Or maybe we want ALL tickets that have activities with overtime?
@@ -359,6 +366,23 @@ def get_additional_hours_report(cliente_id: int, db: Session = Depends(get_db),
         models.Card.AdditionalHoursStatus != ""
     ).all()
 
+    # Consumed Hours: sum of the duration of the activities linked to each ticket,
+    # loaded for all the tickets in one query
+    consumed_by_ticket = {}
+    ticket_ids = [ticket.internalId for ticket in tickets]
+    if ticket_ids:
+        activities = db.query(
+            models.Actividad.card_id, models.Actividad.hora_inicio, models.Actividad.hora_fin
+        ).filter(models.Actividad.card_id.in_(ticket_ids)).all()
+        for card_id, hora_inicio, hora_fin in activities:
+            if hora_inicio and hora_fin:
+                # Calculate duration
+                start = datetime.combine(datetime.min, hora_inicio)
+                end = datetime.combine(datetime.min, hora_fin)
+                duration = (end - start).total_seconds() / 3600.0
+                if duration > 0:
+                    consumed_by_ticket[card_id] = consumed_by_ticket.get(card_id, 0.0) + duration
+
     report_data = []
     total_approved = 0.0
     total_consumed = 0.0
@@ -366,22 +390,7 @@ def get_additional_hours_report(cliente_id: int, db: Session = Depends(get_db),
     for ticket in tickets:
         # Approved Hours
         approved_hours = ticket.HourCot if ticket.HourCot else 0.0
-        
-        # Consumed Hours: Sum of duration of linked activities
-        # We need to calculate duration for each activity linked to this card
-        consumed_hours = 0.0
-        
-        # Fetch activities linked to this card
-        activities = db.query(models.Actividad).filter(models.Actividad.card_id == ticket.internalId).all()
-        
-        for act in activities:
-            if act.hora_inicio and act.hora_fin:
-                # Calculate duration
-                start = datetime.combine(datetime.min, act.hora_inicio)
-                end = datetime.combine(datetime.min, act.hora_fin)
-                duration = (end - start).total_seconds() / 3600.0
-                if duration > 0:
-                    consumed_hours += duration
+        consumed_hours = consumed_by_ticket.get(ticket.internalId, 0.0)
 
         balance = approved_hours - consumed_hours
         
@@ -8,6 +8,7 @@ import uuid
 
 from .. import models
 from ..database import get_db
+from ..core import queries
 
 router = APIRouter(
     prefix="/api",
@@ -22,7 +23,7 @@ async def upload_attachments(
     files: List[UploadFile] = File(...),
     db: Session = Depends(get_db)
 ):
-    db_card = db.query(models.Card).filter(models.Card.internalId == card_id).first()
+    db_card = db.execute(queries.CARD_BY_ID, {"card_id": card_id}).scalars().first()
     if not db_card:
         raise HTTPException(status_code=404, detail="Card not found")
 
@@ -64,7 +65,7 @@ async def upload_attachments(
 
 @router.get("/cards/{card_id}/attachments", response_model=List[dict])
 def get_attachments_for_card(card_id: int, db: Session = Depends(get_db)):
-    db_card = db.query(models.Card).filter(models.Card.internalId == card_id).first()
+    db_card = db.execute(queries.CARD_BY_ID, {"card_id": card_id}).scalars().first()
     if not db_card:
         raise HTTPException(status_code=404, detail="Card not found")
     
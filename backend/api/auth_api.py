@@ -1,43 +1,51 @@
 # backend/api/auth_api.py
+import logging
+
 from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from jose import JWTError, jwt
-from werkzeug.security import check_password_hash, generate_password_hash # Added generate_password_hash
+from dataclasses import dataclass
+import uuid
+from sqlalchemy.exc import SQLAlchemyError
 from datetime import datetime, timedelta
-import hashlib
 from pydantic import BaseModel # Added BaseModel
 import random # Added random
 import string # Added string
 
-from backend.database import get_db
-from backend.models import PersonOfCustomer
+from backend.database import get_async_db
+from backend.models import PersonOfCustomer, Cliente
 from backend.core.email import send_email # Added send_email
+from backend.core import queries, passwords, revocation
+from backend.core.metrics import LEGACY_PASSWORDS_REHASHED
 
 # --- Configuration ---
+# .env.local is already loaded by backend.database
 import os
-from dotenv import load_dotenv
-
-# Load environment variables from .env.local
-load_dotenv('.env.local')
 
 SECRET_KEY = os.getenv("SECRET_KEY", "a_very_secret_key_that_should_be_in_a_config_file")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
+# A refresh token presented again this soon after its first use is accepted:
+# concurrent requests of one browser renew with the same token
+REFRESH_TOKEN_REUSE_GRACE_SECONDS = int(os.getenv("REFRESH_TOKEN_REUSE_GRACE_SECONDS", "30"))
+# How long a revocation has to be kept: until the last token it covers expires
+TOKEN_MAX_LIFETIME = max(timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES), timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS))
 
 # --- Security ---
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/token")
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(
     prefix="/api",
     tags=["Authentication"]
 )
 
 # --- Helper Functions ---
-def verify_password_legacy(plain_password, hashed_password):
-    """Verifies a SHA256 hashed password."""
-    return hashlib.sha256(plain_password.encode('utf-8')).hexdigest() == hashed_password
-
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
     if expires_delta:
@@ -48,6 +56,76 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+@dataclass(frozen=True)
+class Principal:
+    """
+    The caller of an authenticated route, built from the access token claims
+    without reading the database. Same attribute names as PersonOfCustomer,
+    plus the code of the user's client.
+    """
+    id: int
+    user: str
+    gmail: str | None
+    roll: str | None
+    cliente_id: int | None
+    customer_code: str | None
+    status: int | None
+    is_verified: bool
+    token_version: int
+    session_id: str | None = None # sid of the login; None for tokens issued before sessions
+
+    @classmethod
+    def from_user(cls, user: PersonOfCustomer, customer_code: str | None):
+        return cls(
+            id=user.id, user=user.user, gmail=user.gmail, roll=user.roll, cliente_id=user.cliente_id,
+            customer_code=customer_code, status=user.status, is_verified=bool(user.is_verified),
+            token_version=user.token_version or 0
+        )
+
+    @classmethod
+    def from_claims(cls, claims: dict):
+        return cls(
+            id=claims["id"], user=claims["sub"], gmail=claims.get("email"), roll=claims.get("roll"),
+            cliente_id=claims.get("cliente_id"), customer_code=claims.get("cust"), status=claims.get("status"),
+            is_verified=bool(claims.get("verified")), token_version=claims["ver"], session_id=claims.get("sid")
+        )
+
+    def claims(self):
+        return {
+            "sub": self.user, "id": self.id, "email": self.gmail, "roll": self.roll, "cliente_id": self.cliente_id,
+            "cust": self.customer_code, "status": self.status, "verified": self.is_verified, "ver": self.token_version
+        }
+
+def issue_tokens(principal: Principal, session_id: str | None = None):
+    """
+    A fresh access token with the principal's claims and a refresh token to
+    renew it. Both carry the login's session id (sid), new unless given, which
+    logout revokes.
+    """
+    session_id = session_id or uuid.uuid4().hex
+    issued_at = datetime.utcnow()
+    # iat has whole seconds; revocations compare the issue time in milliseconds
+    issued = {"iat": issued_at, "iat_ms": revocation.to_ms(issued_at)}
+    access_token = create_access_token(
+        data={**principal.claims(), "typ": "access", "sid": session_id, **issued},
+        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    refresh_token = create_access_token(
+        data={"sub": principal.user, "id": principal.id, "typ": "refresh", "sid": session_id, **issued,
+              "jti": uuid.uuid4().hex},
+        expires_delta=timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    )
+    return {
+        "access_token": access_token,
+        "refresh_token": refresh_token,
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+        "user_info": {
+            "username": principal.user,
+            "roll": principal.roll
+        }
+    }
+
 # Pydantic Models for Registration
 class RegisterRequest(BaseModel):
     user: str
@@ -55,19 +133,20 @@ class RegisterRequest(BaseModel):
     password: str
 
 @router.post("/register", status_code=status.HTTP_201_CREATED, tags=["Authentication"])
-async def register_user(request: RegisterRequest, db: Session = Depends(get_db)):
+async def register_user(request: RegisterRequest, db: AsyncSession = Depends(get_async_db)):
     # Check if user or gmail already exists
-    existing_user = db.query(PersonOfCustomer).filter(
+    result = await db.execute(select(PersonOfCustomer).filter(
         or_(
             PersonOfCustomer.user == request.user,
             PersonOfCustomer.gmail == request.gmail
         )
-    ).first()
+    ))
+    existing_user = result.scalars().first()
     if existing_user:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Username or email already registered")
 
-    # Hash password
-    hashed_password = generate_password_hash(request.password)
+    # Hash password (on the hashing pool, it is slow on purpose)
+    hashed_password = await passwords.hash_password(request.password)
     
     # Generate verification code
     verification_code = ''.join(random.choices(string.digits, k=6)) # 6-digit code
@@ -83,11 +162,12 @@ async def register_user(request: RegisterRequest, db: Session = Depends(get_db))
         status=0 # Default status
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
 
-    # Send verification email
-    email_sent = send_email(
+    # Send verification email (SMTP is blocking, keep it off the event loop)
+    email_sent = await run_in_threadpool(
+        send_email,
         to_email=new_user.gmail,
         subject="Verificación de Cuenta",
         body=f"Hola {new_user.user},<br><br>Gracias por registrarte. Tu código de verificación es: <b>{verification_code}</b><br><br>Por favor, usa este código para verificar tu cuenta."
@@ -95,8 +175,8 @@ async def register_user(request: RegisterRequest, db: Session = Depends(get_db))
 
     if not email_sent:
         # If email sending fails, rollback the user creation
-        db.delete(new_user)
-        db.commit()
+        await db.delete(new_user)
+        await db.commit()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to send verification email. Please check SMTP settings."
@@ -109,8 +189,9 @@ class VerifyRequest(BaseModel):
     code: str
 
 @router.post("/verify", status_code=status.HTTP_200_OK, tags=["Authentication"])
-async def verify_user(request: VerifyRequest, db: Session = Depends(get_db)):
-    db_person = db.query(PersonOfCustomer).filter(PersonOfCustomer.user == request.user).first()
+async def verify_user(request: VerifyRequest, db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(select(PersonOfCustomer).filter(PersonOfCustomer.user == request.user))
+    db_person = result.scalars().first()
     if not db_person:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
@@ -119,7 +200,7 @@ async def verify_user(request: VerifyRequest, db: Session = Depends(get_db)):
 
     db_person.is_verified = True
     db_person.verification_code = None
-    db.commit()
+    await db.commit()
 
     return {"message": "Account verified successfully"}
 
@@ -127,54 +208,48 @@ class ForgotPasswordRequest(BaseModel):
     email: str
 
 @router.post("/forgot-password", status_code=status.HTTP_200_OK, tags=["Authentication"])
-async def forgot_password(request: ForgotPasswordRequest, req: Request, db: Session = Depends(get_db)):
-    print(f"DEBUG: forgot_password called with email: {request.email}")
-    
-    db_person = db.query(PersonOfCustomer).filter(PersonOfCustomer.gmail == request.email).first()
-    
-    print(f"DEBUG: User found in database: {db_person is not None}")
-    
+async def forgot_password(request: ForgotPasswordRequest, req: Request, db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(select(PersonOfCustomer).filter(PersonOfCustomer.gmail == request.email))
+    db_person = result.scalars().first()
+
     if not db_person:
         # To prevent user enumeration, we don't reveal that the user doesn't exist.
         # We just return a success message as if the email was sent.
-        print("DEBUG: User not found, returning generic success message")
+        logger.debug("forgot_password: no user with that email, returning generic success message")
         return {"message": "If an account with this email exists, a password reset link has been sent."}
 
     # Generate and store reset token
     reset_token = ''.join(random.choices(string.ascii_letters + string.digits, k=32))
     db_person.reset_token = reset_token
     db_person.reset_token_expires = datetime.utcnow() + timedelta(hours=1)
-    db.commit()
+    await db.commit()
 
     # Send password reset email
     # Use the origin from the request headers, or fallback to localhost
     origin = req.headers.get("origin")
-    print(f"DEBUG: Origin header: {origin}")
-    
     if not origin:
         # Fallback logic: try to construct from host header if origin is missing
         host = req.headers.get("host")
-        print(f"DEBUG: Host header: {host}")
         if host:
             origin = f"http://{host}"
         else:
             origin = "http://127.0.0.1:5000"
-    
-    print(f"DEBUG: Final origin for reset link: {origin}")
+
+    # The link carries the reset token, so only its origin is logged
+    logger.debug("Sending password reset link to user %s with origin %s", db_person.user, origin)
     reset_link = f"{origin}/reset_password?token={reset_token}"
-    print(f"DEBUG: Reset link: {reset_link}")
     
-    email_sent = send_email(
+    email_sent = await run_in_threadpool(
+        send_email,
         to_email=db_person.gmail,
         subject="Reseteo de Contraseña",
         body=f"Hola {db_person.user},<br><br>Recibimos una solicitud para resetear tu contraseña. Haz clic en el siguiente enlace para continuar:<br><br>"
              f"<a href='{reset_link}'>{reset_link}</a><br><br>"
              f"Si no solicitaste esto, puedes ignorar este correo. El enlace expirará en 1 hora."
     )
-    
-    print(f"DEBUG: Email sent result: {email_sent}")
 
     if not email_sent:
+        logger.warning("Password reset email to user %s could not be sent", db_person.user)
         # Don't rollback the token, but raise an error so the user knows something went wrong.
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -188,17 +263,18 @@ class ResetPasswordRequest(BaseModel):
     new_password: str
 
 @router.post("/reset-password", status_code=status.HTTP_200_OK, tags=["Authentication"])
-async def reset_password(request: ResetPasswordRequest, db: Session = Depends(get_db)):
-    db_person = db.query(PersonOfCustomer).filter(PersonOfCustomer.reset_token == request.token).first()
+async def reset_password(request: ResetPasswordRequest, db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(select(PersonOfCustomer).filter(PersonOfCustomer.reset_token == request.token))
+    db_person = result.scalars().first()
     
     if not db_person or db_person.reset_token_expires < datetime.utcnow():
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid or expired token")
 
     # Update password and clear token
-    db_person.hashed_password = generate_password_hash(request.new_password)
+    db_person.hashed_password = await passwords.hash_password(request.new_password)
     db_person.reset_token = None
     db_person.reset_token_expires = None
-    db.commit()
+    await db.commit()
 
     return {"message": "Password has been reset successfully."}
 
@@ -209,13 +285,18 @@ from sqlalchemy import or_
 # ... (omitting unchanged code for brevity) ...
 
 @router.post("/token")
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(PersonOfCustomer).filter(
-        or_(
-            PersonOfCustomer.user == form_data.username,
-            PersonOfCustomer.gmail == form_data.username
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(
+        select(PersonOfCustomer, Cliente.code)
+        .outerjoin(Cliente, Cliente.id == PersonOfCustomer.cliente_id)
+        .filter(
+            or_(
+                PersonOfCustomer.user == form_data.username,
+                PersonOfCustomer.gmail == form_data.username
+            )
         )
-    ).first()
+    )
+    user, customer_code = result.first() or (None, None)
     
     if not user or not user.hashed_password:
         raise HTTPException(
@@ -224,21 +305,8 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
             headers={"WWW-Authenticate": "Bearer"},
         )
         
-    # Try modern hash check first, fallback to legacy SHA256
-    password_verified = False
-    try:
-        # Werkzeug's check_password_hash works for hashes like 'bcrypt_sha256' etc.
-        if check_password_hash(user.hashed_password, form_data.password):
-            password_verified = True
-    except Exception:
-        # This will likely fail if the hash is a plain SHA256 string.
-        pass
-
-    if not password_verified:
-        if verify_password_legacy(form_data.password, user.hashed_password):
-            password_verified = True
-            # TODO: Add a logging mechanism to flag this user for password migration.
-            # print(f"User {user.user} logged in with legacy password. Migration needed.")
+    # Werkzeug hashes, or the bare SHA256 digests of the old system
+    password_verified, needs_rehash = await passwords.verify_password(form_data.password, user.hashed_password)
     
     if not password_verified:
         raise HTTPException(
@@ -247,17 +315,63 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.user, "id": user.id, "roll": user.roll}, expires_delta=access_token_expires
+    if user.deactivated_at is not None:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="User account is deactivated")
+
+    if needs_rehash:
+        # Move legacy SHA256 passwords to the current scheme now that we have the plain text
+        try:
+            user.hashed_password = await passwords.hash_password(form_data.password)
+            await db.commit()
+            LEGACY_PASSWORDS_REHASHED.inc()
+            logger.info("Rehashed the legacy password of user %s", user.user)
+        except SQLAlchemyError:
+            # The login still succeeds; the rehash is retried on the next one
+            await db.rollback()
+            logger.warning("Could not rehash the legacy password of user %s", user.user, exc_info=True)
+
+    return issue_tokens(Principal.from_user(user, customer_code))
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+@router.post("/token/refresh")
+async def refresh_access_token(request: RefreshRequest, db: AsyncSession = Depends(get_async_db)):
+    """
+    Trades a refresh token for a new access token with the user's current
+    claims, and a new refresh token. Clients call it when the access token
+    expires or is refused after a change to the user. Each refresh token
+    works once: a second use, past a short grace period for concurrent
+    requests, revokes the whole login session.
+    """
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid or expired refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
     )
-
-    return {
-        "access_token": access_token,
-        "token_type": "bearer",
-        "user_info": {
-            "username": user.user,
-            "roll": user.roll
-        }
-    }
+    try:
+        payload = jwt.decode(request.refresh_token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise credentials_exception
+    if payload.get("typ") != "refresh" or payload.get("sub") is None or payload.get("jti") is None:
+        raise credentials_exception
+    if (await revocation.current_revocations(db)).revokes(payload):
+        raise credentials_exception
+
+    result = await db.execute(queries.PRINCIPAL_BY_USERNAME, {"username": payload["sub"]})
+    row = result.first()
+    # A username taken over by a new account after the old one was deleted does not match
+    if row is None or row[0].id != payload.get("id"):
+        raise credentials_exception
+    if row[0].deactivated_at is not None:
+        raise credentials_exception
+    principal = Principal.from_user(*row)
+
+    reuse_grace = timedelta(seconds=REFRESH_TOKEN_REUSE_GRACE_SECONDS)
+    if not await revocation.use_refresh_token(db, payload, TOKEN_MAX_LIFETIME, reuse_grace):
+        await db.commit()
+        logger.warning("Refresh token of user %s used twice; its session is revoked", principal.user)
+        raise credentials_exception
+    await db.commit()
+    return issue_tokens(principal, session_id=payload.get("sid"))
 
@@ -1,15 +1,20 @@
+import logging
+
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import date, datetime, timezone
 
 from .. import models
-from ..database import get_db
+from ..database import get_db, get_read_db
 from .users_api import get_current_user
 from ..core.email import send_email
+from ..core import queries
 from ..models import PersonOfCustomer
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(
     prefix="/api",
     tags=["Cards"]
@@ -65,11 +70,11 @@ def _send_assignment_notification(db: Session, db_card: models.Card, new_assigne
         body = f"<html><body><p>Hola {new_assignee},</p><p>Se te ha asignado un nuevo ticket:</p><p><strong>ID:</strong> #{db_card.internalId}<br><strong>Cliente:</strong> {client_name}<br><strong>Título:</strong> {db_card.Name}</p></body></html>"
         try:
             send_email(assigned_user.gmail, subject, body)
-            print(f"Notification email sent to {assigned_user.gmail} for ticket {db_card.internalId}")
-        except Exception as e:
-            print(f"Failed to send email for ticket {db_card.internalId}: {e}")
+            logger.info("Notification email sent to %s for ticket %s", assigned_user.gmail, db_card.internalId)
+        except Exception:
+            logger.exception("Failed to send email for ticket %s", db_card.internalId)
     else:
-        print(f"Could not send notification: User {new_assignee} not found or has no email.")
+        logger.warning("Could not send notification: User %s not found or has no email.", new_assignee)
 
 @router.put("/cards/{card_id}/assign", response_model=CardResponse, tags=["Cards"])
 def update_card_assign(
@@ -81,7 +86,7 @@ def update_card_assign(
     if current_user.roll != '1':
         raise HTTPException(status_code=403, detail="Not authorized")
 
-    db_card = db.query(models.Card).filter(models.Card.internalId == card_id).first()
+    db_card = db.execute(queries.CARD_BY_ID, {"card_id": card_id}).scalars().first()
     if not db_card:
         raise HTTPException(status_code=404, detail="Card not found")
 
@@ -131,7 +136,9 @@ def create_card(card: CardCreate, db: Session = Depends(get_db)):
                 if manager_user:
                     db_card_data['assign'] = manager_user.user
                     assigned_from_module = True
-                    print(f"DEBUG: Auto-assigned ticket to {manager_user.user} via Module {board.Name} (Dept: {board.Department})")
+                    logger.debug(
+                        "Auto-assigned ticket to %s via Module %s (Dept: %s)", manager_user.user, board.Name, board.Department
+                    )
     
     # Si la asignación se hizo mediante el ModuleID, no continuamos
     # --------------------------------------------------------
@@ -180,7 +187,7 @@ def read_cards(
     CustCode: Optional[str] = None,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: models.PersonOfCustomer = Depends(get_current_user)
 ):
     query = db.query(models.Card)
@@ -189,10 +196,9 @@ def read_cards(
     # Assuming role '2' is Cliente and '4' is also related to client (Gerente Soporte)
     # Safer to check if they have a cliente_id and are NOT admin/support staff (Role 1 or 3)
     if current_user.roll not in ['1', '3'] and current_user.cliente_id:
-        # Fetch client code
-        client = db.query(models.Cliente).filter(models.Cliente.id == current_user.cliente_id).first()
-        if client:
-            query = query.filter(models.Card.CustCode == client.code)
+        # The client code comes signed in the token
+        if current_user.customer_code:
+            query = query.filter(models.Card.CustCode == current_user.customer_code)
             
     if search_term:
         query = query.filter(
@@ -218,23 +224,18 @@ def read_cards(
 
 @router.get("/cards/{card_id}", response_model=CardDetailResponse, tags=["Cards"])
 def read_card(card_id: int, db: Session = Depends(get_db)):
-    db_card = db.query(models.Card).options(joinedload(models.Card.cliente)).filter(models.Card.internalId == card_id).first()
+    db_card = db.execute(queries.CARD_WITH_CLIENTE_BY_ID, {"card_id": card_id}).scalars().first()
     if not db_card:
         raise HTTPException(status_code=404, detail="Card not found")
-    
-    print(f"DEBUG: Fetched card from DB. db_card.assign = '{db_card.assign}'")
 
     response = CardDetailResponse.from_orm(db_card)
     if db_card.cliente:
         response.customer_internal_id = db_card.cliente.id
-        
-    print(f"DEBUG: Pydantic response object created. response.assign = '{response.assign}'")
-    
     return response
 
 @router.put("/cards/{card_id}", response_model=CardResponse, tags=["Cards"])
 def update_card(card_id: int, card: CardBase, db: Session = Depends(get_db)):
-    db_card = db.query(models.Card).filter(models.Card.internalId == card_id).first()
+    db_card = db.execute(queries.CARD_BY_ID, {"card_id": card_id}).scalars().first()
     if not db_card:
         raise HTTPException(status_code=404, detail="Card not found")
 
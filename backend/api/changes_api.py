@@ -0,0 +1,74 @@
+import json
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..database import get_read_db
+from .users_api import get_current_user
+
+router = APIRouter(
+    prefix="/api",
+    tags=["Changes"]
+)
+
+class ChangeEntry(BaseModel):
+    cursor: int
+    table: str
+    row_id: int
+    operation: str
+    changed_columns: Optional[List[str]] = None
+    data: Optional[dict] = None
+    changed_at: datetime
+
+class ChangesPage(BaseModel):
+    changes: List[ChangeEntry]
+    next_cursor: int
+    has_more: bool
+
+@router.get("/changes", response_model=ChangesPage)
+def read_changes(
+    after: int = 0,
+    limit: int = Query(500, ge=1, le=5000),
+    table: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+    current_user: models.PersonOfCustomer = Depends(get_current_user)
+):
+    """
+    Committed changes to Cards, Activity, CardsEventRow and Customer in the
+    order they were written, starting after the given cursor. Pass next_cursor back as `after` to
+    continue; has_more tells whether another page is already available.
+    """
+    if current_user.roll != '1':
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
+
+    query = db.query(models.ChangeLog).filter(models.ChangeLog.id > after)
+    if table:
+        query = query.filter(models.ChangeLog.table_name == table)
+    # One extra row tells whether there is another page
+    rows = query.order_by(models.ChangeLog.id).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    # Entries are written in commit order (see core/changes.py), so no entry
+    # below the last one returned can show up later
+    rows = rows[:limit]
+
+    changes = [
+        ChangeEntry(
+            cursor=row.id,
+            table=row.table_name,
+            row_id=row.row_id,
+            operation=row.operation,
+            changed_columns=json.loads(row.changed_columns) if row.changed_columns else None,
+            data=json.loads(row.data) if row.data else None,
+            changed_at=row.changed_at
+        )
+        for row in rows
+    ]
+    return ChangesPage(
+        changes=changes,
+        next_cursor=changes[-1].cursor if changes else after,
+        has_more=has_more
+    )
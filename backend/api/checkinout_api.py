@@ -1,12 +1,13 @@
 # backend/api/checkinout_api.py
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session, aliased
-from sqlalchemy import func
+from sqlalchemy.orm import aliased
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select
 from pydantic import BaseModel
 from typing import List
 from datetime import date, time
 
-from backend.database import get_db
+from backend.database import get_async_db
 from backend.models import CheckInOut
 
 # Pydantic models for request and response
@@ -28,15 +29,15 @@ router = APIRouter(
 )
 
 @router.get("/last-serial")
-async def get_last_serial_number(db: Session = Depends(get_db)):
+async def get_last_serial_number(db: AsyncSession = Depends(get_async_db)):
     """
     Gets the last (highest) serial number from the CheckInOut table.
     """
-    last_ser_nr = db.query(func.max(CheckInOut.SerNr)).scalar()
+    last_ser_nr = await db.scalar(select(func.max(CheckInOut.SerNr)))
     return {"last_serial_number": last_ser_nr or 0}
 
 @router.post("/bulk")
-async def bulk_insert_attendance(request: BulkAttendanceRequest, db: Session = Depends(get_db)):
+async def bulk_insert_attendance(request: BulkAttendanceRequest, db: AsyncSession = Depends(get_async_db)):
     """
     Inserts a bulk list of attendance records, avoiding duplicates.
     """
@@ -44,14 +45,22 @@ async def bulk_insert_attendance(request: BulkAttendanceRequest, db: Session = D
     new_records = []
     
     # Get the last serial number to start incrementing from
-    last_ser_nr = db.query(func.max(CheckInOut.SerNr)).scalar() or 0
+    last_ser_nr = await db.scalar(select(func.max(CheckInOut.SerNr))) or 0
     current_ser_nr = last_ser_nr + 1
 
-    # Create a set of existing records for efficient lookup
-    existing_records = {
-        (r.Employee, r.attendance_date, r.attendance_time) 
-        for r in db.query(CheckInOut.Employee, CheckInOut.attendance_date, CheckInOut.attendance_time).all()
-    }
+    # Create a set of existing records for efficient lookup.
+    # Only the dates present in this batch can produce duplicates.
+    batch_dates = {record.chDate for record in request.records}
+    existing_records = set()
+    if batch_dates:
+        result = await db.execute(
+            select(CheckInOut.Employee, CheckInOut.attendance_date, CheckInOut.attendance_time)
+            .filter(CheckInOut.attendance_date.in_(batch_dates))
+        )
+        existing_records = {
+            (r.Employee, r.attendance_date, r.attendance_time)
+            for r in result.all()
+        }
 
     today = date.today()
     now = time()
@@ -78,10 +87,10 @@ async def bulk_insert_attendance(request: BulkAttendanceRequest, db: Session = D
     if new_records:
         try:
             db.add_all(new_records)
-            db.commit()
+            await db.commit()
             inserted_count = len(new_records)
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Database error: {e}"
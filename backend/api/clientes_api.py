@@ -1,12 +1,16 @@
+import logging
+
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import List
 
 from .. import models
-from ..database import get_db # Use centralized get_db
+from ..database import get_db, get_read_db # Use centralized get_db
 from .users_api import get_current_user # Use centralized get_current_user
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(
     prefix="/api",
     tags=["Clientes"]
@@ -70,27 +74,28 @@ def create_cliente(cliente: ClienteCreate, db: Session = Depends(get_db), curren
     return db_cliente
 
 @router.get("/clientes/", response_model=List[ClienteWithTicketStatus], tags=["Clientes"])
-def read_clientes(skip: int = 0, limit: int = 1000, db: Session = Depends(get_db), current_user: models.PersonOfCustomer = Depends(get_current_user)):
+def read_clientes(skip: int = 0, limit: int = 1000, db: Session = Depends(get_read_db), current_user: models.PersonOfCustomer = Depends(get_current_user)):
     # All authenticated users can view clients
     clientes = db.query(models.Cliente).offset(skip).limit(limit).all()
-    
+
+    # Additional-hours states present among the tickets of each client, in one query for the whole page
+    codes = [cliente.code for cliente in clientes if cliente.code]
+    statuses_by_code = {}
+    if codes:
+        rows = db.query(models.Card.CustCode, models.Card.AdditionalHoursStatus).filter(
+            models.Card.CustCode.in_(codes),
+            models.Card.AdditionalHoursStatus.in_(['Rechazado', 'Pendiente de Aprobacion', 'Aprobado'])
+        ).distinct().all()
+        for code, additional_status in rows:
+            statuses_by_code.setdefault(code, set()).add(additional_status)
+
     clientes_with_status = []
     for cliente in clientes:
-        # Query for tickets related to this client
-        client_tickets = db.query(models.Card).filter(models.Card.CustCode == cliente.code).all()
-
-        has_rejected = False
-        has_pending = False
-        has_approved = False
-
-        for ticket in client_tickets:
-            if ticket.AdditionalHoursStatus == 'Rechazado':
-                has_rejected = True
-            elif ticket.AdditionalHoursStatus == 'Pendiente de Aprobacion':
-                has_pending = True
-            elif ticket.AdditionalHoursStatus == 'Aprobado':
-                has_approved = True
-        
+        statuses = statuses_by_code.get(cliente.code, set())
+        has_rejected = 'Rechazado' in statuses
+        has_pending = 'Pendiente de Aprobacion' in statuses
+        has_approved = 'Aprobado' in statuses
+
         clientes_with_status.append(ClienteWithTicketStatus(
             id=cliente.id,
             code=cliente.code,
@@ -180,7 +185,7 @@ def search_clientes(q: str, db: Session = Depends(get_db), current_user: models.
 
     """
 
-    print(f"Client search query received: {q}") # Debugging
+    logger.debug("Client search query received: %s", q)
 
     search = f"%{q}%"
 
@@ -194,7 +199,7 @@ def search_clientes(q: str, db: Session = Depends(get_db), current_user: models.
 
     ).limit(10).all()
 
-    print(f"Clients found: {clientes}") # Debugging
+    logger.debug("Clients found for %r: %d", q, len(clientes))
 
     return clientes
 
@@ -3,8 +3,6 @@ from sqlalchemy.orm import Session, joinedload
 from pydantic import BaseModel
 from typing import List, Optional
 
-print("DEBUG: department_manager_api.py is being imported!")
-
 from .. import models
 from ..database import get_db
 from .users_api import get_current_user
@@ -88,11 +86,13 @@ def get_department_managers_config(
     if current_user.roll not in ['1', '3']:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to view department managers configuration")
 
-    # Load rows with in_charge_person to get the name
-    db.refresh(manager_instance, attribute_names=['rows']) # Ensure rows are loaded
-    
+    # Load rows with in_charge_person to get the name, in the same query
+    rows = db.query(models.DepartmentManagerRow).options(
+        joinedload(models.DepartmentManagerRow.in_charge_person)
+    ).filter(models.DepartmentManagerRow.master_id == manager_instance.id).order_by(models.DepartmentManagerRow.id).all()
+
     response_rows = []
-    for row in manager_instance.rows:
+    for row in rows:
         response_rows.append(DepartmentManagerRowResponse(
             id=row.id,
             master_id=row.master_id,
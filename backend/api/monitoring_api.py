@@ -0,0 +1,98 @@
+import os
+import tracemalloc
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from pydantic import BaseModel, Field
+
+from .. import models
+from ..core import memory
+from ..database import engine, read_engine, report_engine, async_engine, get_pool_status
+from .users_api import get_current_user
+
+router = APIRouter(
+    prefix="/api/monitoring",
+    tags=["Monitoring"]
+)
+
+class MemoryTracingStart(BaseModel):
+    frames: int = Field(memory.MEMORY_TRACE_FRAMES, ge=1, le=100)
+
+class MemorySnapshotCreate(BaseModel):
+    label: Optional[str] = None
+
+@router.get("/db-pool")
+def read_db_pool_status(current_user: models.PersonOfCustomer = Depends(get_current_user)):
+    """
+    Live connection pool figures: connections checked out, overflow in use
+    and the time requests spent waiting for a connection.
+    """
+    if current_user.roll != '1':
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
+
+    return {
+        "sync": get_pool_status(engine),
+        "async": get_pool_status(async_engine),
+        "replica": get_pool_status(read_engine) if read_engine is not engine else None,
+        "reporting": get_pool_status(report_engine),
+    }
+
+@router.get("/memory")
+def read_memory_status(current_user: models.PersonOfCustomer = Depends(get_current_user)):
+    """Resident and traced memory of the worker that answers, and the snapshots it holds."""
+    if current_user.roll != '1':
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
+    return memory.status()
+
+@router.post("/memory/tracing")
+def start_memory_tracing(settings: MemoryTracingStart, current_user: models.PersonOfCustomer = Depends(get_current_user)):
+    """Starts tracemalloc on this worker. Allocations get slower until it is stopped."""
+    if current_user.roll != '1':
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
+    memory.start_tracing(settings.frames)
+    return memory.status()
+
+@router.delete("/memory/tracing")
+def stop_memory_tracing(current_user: models.PersonOfCustomer = Depends(get_current_user)):
+    """Stops tracemalloc on this worker and drops its snapshots."""
+    if current_user.roll != '1':
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
+    memory.stop_tracing()
+    return memory.status()
+
+@router.post("/memory/snapshots", status_code=status.HTTP_201_CREATED)
+def create_memory_snapshot(snapshot: MemorySnapshotCreate, current_user: models.PersonOfCustomer = Depends(get_current_user)):
+    if current_user.roll != '1':
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
+    if not tracemalloc.is_tracing():
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Memory tracing is not running on this worker")
+    snapshot_id = memory.take_snapshot(snapshot.label)
+    return {"id": snapshot_id, **memory.status()}
+
+@router.get("/memory/diff")
+def read_memory_diff(
+    first: int,
+    second: int,
+    group_by: Literal["lineno", "filename", "traceback"] = "lineno",
+    limit: int = Query(25, ge=1, le=500),
+    current_user: models.PersonOfCustomer = Depends(get_current_user)
+):
+    """
+    Allocations that grew the most from snapshot first to snapshot second.
+    Both must have been taken by the worker that answers (see pid).
+    """
+    if current_user.roll != '1':
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
+    snapshots = {snapshot_id: memory.get_snapshot(snapshot_id) for snapshot_id in (first, second)}
+    missing = [snapshot_id for snapshot_id, snapshot in snapshots.items() if snapshot is None]
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Snapshot {missing[0]} is not held by worker {os.getpid()}"
+        )
+    return {
+        "pid": os.getpid(),
+        "first": first,
+        "second": second,
+        **memory.compare(snapshots[first], snapshots[second], group_by, limit),
+    }
@@ -3,10 +3,13 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import List
+from datetime import datetime
 
 from .. import models
-from ..database import get_db
+from ..database import get_db, get_read_db
 from .users_api import get_current_user # Use the centralized dependency
+from .auth_api import TOKEN_MAX_LIFETIME
+from ..core import revocation
 
 router = APIRouter(
     prefix="/api",
@@ -32,7 +35,7 @@ class PersonOfCustomer(PersonOfCustomerBase):
 # CRUD Endpoints for PersonOfCustomer (for admin use)
 
 @router.get("/personas/", response_model=List[PersonOfCustomer], tags=["Personas"])
-def read_persons_of_customer(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: models.PersonOfCustomer = Depends(get_current_user)):
+def read_persons_of_customer(skip: int = 0, limit: int = 100, db: Session = Depends(get_read_db), current_user: models.PersonOfCustomer = Depends(get_current_user)):
     # Optional: Add role-based access control if needed
     # if current_user.roll != '1': # Assuming '1' is admin
     #     raise HTTPException(status_code=403, detail="Not authorized to view all users")
@@ -76,6 +79,13 @@ def update_person_status(person_id: int, request: StatusUpdateRequest, db: Sessi
         raise HTTPException(status_code=404, detail="Person not found")
 
     db_person.status = request.status
+    if request.status == 1:
+        db_person.deactivated_at = None
+    else:
+        # Deactivated users are logged out everywhere and can neither log in
+        # nor refresh until an admin activates them again
+        db_person.deactivated_at = datetime.utcnow()
+        revocation.revoke_user(db, db_person.user, TOKEN_MAX_LIFETIME)
     db.commit()
 
     return {"message": "User status updated successfully"}
@@ -123,6 +133,8 @@ def delete_person_of_customer(person_id: int, db: Session = Depends(get_db), cur
     if db_person is None:
         raise HTTPException(status_code=404, detail="Person not found")
 
+    # Also refuses the old tokens should the username be registered again
+    revocation.revoke_user(db, db_person.user, TOKEN_MAX_LIFETIME)
     db.delete(db_person)
     db.commit()
 
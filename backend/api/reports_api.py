@@ -2,11 +2,12 @@ from fastapi import APIRouter, Depends, HTTPException # Se agrega HTTPException
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import func, case, extract
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Optional, Literal
 from datetime import datetime, time, timedelta
 
 from .. import models
-from ..database import get_db
+from ..database import get_report_db
+from ..core import analytics
 
 router = APIRouter(
     prefix="/api/reports",
@@ -44,6 +45,21 @@ class GlobalActivityDetail(BaseModel):
     duration_hours: float
     is_additional: bool
 
+class HoursSummaryRow(BaseModel):
+    period: str
+    client_id: Optional[int]
+    client_name: Optional[str]
+    consultant: Optional[str]
+    activity_count: int
+    total_hours: float
+    additional_hours: float
+
+class SnapshotStatus(BaseModel):
+    path: str
+    taken_at: datetime
+    source: str
+    tables: dict
+
 # --- Helper Function for Duration Calculation ---
 
 def calculate_duration(hora_inicio: time, hora_fin: time) -> float:
@@ -63,7 +79,7 @@ def calculate_duration(hora_inicio: time, hora_fin: time) -> float:
 # --- Report Endpoints ---
 
 @router.get("/activities_by_user", response_model=List[ActivitiesByUser])
-def get_activities_by_user(db: Session = Depends(get_db)):
+def get_activities_by_user(db: Session = Depends(get_report_db)):
     """
     Counts the number of activities assigned to each user with a 'developer' or 'admin' role.
     Filter by the current month.
@@ -94,7 +110,7 @@ def get_activities_by_user(db: Session = Depends(get_db)):
 
 
 @router.get("/support_hours/{client_id}", response_model=SupportHoursDetail)
-def get_support_hours_by_client_id(client_id: int, db: Session = Depends(get_db)):
+def get_support_hours_by_client_id(client_id: int, db: Session = Depends(get_report_db)):
     """
     Calculates contracted vs consumed support hours for a specific client
     and returns a detailed list of the activities.
@@ -150,17 +166,23 @@ def get_support_hours_by_client_id(client_id: int, db: Session = Depends(get_db)
 
 @router.get("/global_activities", response_model=List[GlobalActivityDetail])
 def get_global_activities(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_report_db),
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
     ticket_id: Optional[int] = None,
     is_additional: Optional[bool] = None,
     client_id: Optional[int] = None,
-    user_id: Optional[str] = None
+    user_id: Optional[str] = None,
+    source: Literal["live", "snapshot"] = "live"
 ):
     """
     Provides a global report of all activities with extensive filtering.
+    With source=snapshot it is answered from the nightly analytics snapshot
+    instead of the live database (data up to the last export).
     """
+    if source == "snapshot":
+        return _snapshot_global_activities(start_date, end_date, ticket_id, is_additional, client_id, user_id)
+
     # Consulta robusta usando etiquetas para la desestructuración
     query = db.query(
         models.Actividad.id.label('activity_id'),
@@ -214,4 +236,119 @@ def get_global_activities(
             is_additional=(additional_status == 'Aprobado')
         ))
 
-    return report_data
\ No newline at end of file
+    return report_data
+
+# --- Analytics mode (nightly DuckDB snapshot, see core/analytics.py) ---
+
+_SNAPSHOT_ACTIVITIES = """
+    FROM activities a
+    LEFT JOIN customers c ON a."CustCode" = c."internalId"
+    LEFT JOIN projects p ON a."Project" = p."internalId"
+    LEFT JOIN cards k ON a."CardId" = k."internalId"
+"""
+
+def _snapshot_filters(start_date, end_date, client_id, user_id, ticket_id=None, is_additional=None):
+    """WHERE clause and parameters for the snapshot queries, same filters as the live report."""
+    conditions, params = [], []
+    if start_date:
+        conditions.append('a."TransDate" >= ?')
+        params.append(start_date.date())
+    if end_date:
+        conditions.append('a."TransDate" <= ?')
+        params.append(end_date.date())
+    if ticket_id:
+        conditions.append('a."CardId" = ?')
+        params.append(ticket_id)
+    if client_id:
+        conditions.append('a."CustCode" = ?')
+        params.append(client_id)
+    if user_id:
+        conditions.append('a."User" = ?')
+        params.append(user_id)
+    if is_additional is not None:
+        conditions.append("coalesce(k.\"AdditionalHoursStatus\" = 'Aprobado', false) = ?")
+        params.append(is_additional)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return where, params
+
+def _query_snapshot(sql, params):
+    try:
+        duck = analytics.open_snapshot()
+    except analytics.SnapshotUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    try:
+        return duck.execute(sql, params).fetchall()
+    finally:
+        duck.close()
+
+def _snapshot_global_activities(start_date, end_date, ticket_id, is_additional, client_id, user_id):
+    where, params = _snapshot_filters(start_date, end_date, client_id, user_id, ticket_id, is_additional)
+    rows = _query_snapshot(f"""
+        SELECT a."internalId", a."TransDate", a."User", c."Name", a."CardId", p."Name",
+               a.duration_hours, coalesce(k."AdditionalHoursStatus" = 'Aprobado', false)
+        {_SNAPSHOT_ACTIVITIES}
+        {where}
+        ORDER BY a."internalId"
+    """, params)
+
+    return [
+        GlobalActivityDetail(
+            activity_id=activity_id,
+            activity_date=activity_date,
+            consultant=consultant,
+            client_name=client_name,
+            ticket_id=ticket_id,
+            project_name=project_name,
+            duration_hours=duration_hours,
+            is_additional=additional
+        )
+        for (activity_id, activity_date, consultant, client_name, ticket_id, project_name,
+             duration_hours, additional) in rows
+    ]
+
+
+@router.get("/analytics/hours_summary", response_model=List[HoursSummaryRow])
+def get_hours_summary(
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    client_id: Optional[int] = None,
+    user_id: Optional[str] = None,
+    group_by: Literal["month", "year"] = "month"
+):
+    """
+    Hours per period, client and consultant over any date range, from the
+    analytics snapshot. Never touches the live database.
+    """
+    where, params = _snapshot_filters(start_date, end_date, client_id, user_id)
+    period_format = "%Y-%m" if group_by == "month" else "%Y"
+    rows = _query_snapshot(f"""
+        SELECT strftime(a."TransDate", '{period_format}') AS period, a."CustCode", c."Name", a."User",
+               count(*), round(sum(a.duration_hours), 2),
+               round(sum(CASE WHEN k."AdditionalHoursStatus" = 'Aprobado' THEN a.duration_hours ELSE 0 END), 2)
+        {_SNAPSHOT_ACTIVITIES}
+        {where}
+        GROUP BY period, a."CustCode", c."Name", a."User"
+        ORDER BY period, c."Name", a."User"
+    """, params)
+
+    return [
+        HoursSummaryRow(
+            period=period or "N/A",
+            client_id=cliente_id,
+            client_name=client_name,
+            consultant=consultant,
+            activity_count=activity_count,
+            total_hours=total_hours or 0.0,
+            additional_hours=additional_hours or 0.0
+        )
+        for (period, cliente_id, client_name, consultant, activity_count, total_hours, additional_hours) in rows
+    ]
+
+
+@router.get("/analytics/snapshot", response_model=SnapshotStatus)
+def get_snapshot_status():
+    """When the analytics snapshot was taken and its row counts."""
+    try:
+        return analytics.snapshot_status()
+    except analytics.SnapshotUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
@@ -1,37 +1,118 @@
 # backend/api/users_api.py
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from jose import JWTError, jwt
+from datetime import datetime
 
-from backend.database import get_db
+from backend.database import get_db, get_async_db
 from backend.models import PersonOfCustomer, Cliente
 from backend import models
-from backend.api.auth_api import oauth2_scheme, SECRET_KEY, ALGORITHM
+from backend.api.auth_api import oauth2_scheme, SECRET_KEY, ALGORITHM, TOKEN_MAX_LIFETIME, Principal
+from backend.core import queries, principal_cache, revocation
 
 router = APIRouter(
     prefix="/api/users",
     tags=["Users"]
 )
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+async def _cached_principal(username: str, db: AsyncSession):
+    """The user's Principal from the principal cache, or read with one query and cached. None if the user is gone."""
+    principal, generation = principal_cache.cache.lookup(username)
+    if principal is not None:
+        return principal
+    result = await db.execute(queries.PRINCIPAL_BY_USERNAME, {"username": username})
+    row = result.first()
+    if row is None:
+        return None
+    principal = Principal.from_user(*row)
+    principal_cache.cache.store(username, principal, generation)
+    return principal
+
+async def _token_state(payload: dict, db: AsyncSession):
+    """(the user's token_version now, or None if the user is gone; the Revocations that apply)."""
+    username = payload["sub"]
+    if principal_cache.cache.ttl_seconds <= 0:
+        # Cache off: the version and the revocations that can cover this token in one query
+        result = await db.execute(queries.TOKEN_STATE_BY_USERNAME, {
+            "username": username, "session_id": payload.get("sid"), "now": datetime.utcnow()
+        })
+        rows = result.all()
+        if not rows:
+            return None, revocation.Revocations()
+        return rows[0][0], revocation.Revocations(row[1:] for row in rows if row[2] is not None)
+    # The cached user carries its token_version, so the check reads no table-wide state
+    principal = await _cached_principal(username, db)
+    if principal is None:
+        return None, revocation.Revocations()
+    return principal.token_version, await revocation.current_revocations(db)
+
+async def resolve_token_user(token: str, db: AsyncSession):
+    """
+    The Principal a bearer token belongs to, or None when the token is invalid
+    or revoked, the user is gone or the token predates a change to the user's claims.
+    """
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
     except JWTError:
-        raise credentials_exception
-    
-    user = db.query(PersonOfCustomer).filter(PersonOfCustomer.user == username).first()
+        return None
+    username: str = payload.get("sub")
+    if username is None:
+        return None
+    token_type = payload.get("typ")
+    if token_type == "access":
+        current_version, revocations = await _token_state(payload, db)
+        if current_version is None or current_version != payload.get("ver") or revocations.revokes(payload):
+            return None
+        return Principal.from_claims(payload)
+    if token_type is not None:
+        return None # Refresh tokens only work on /api/token/refresh
+
+    # Tokens issued before the claims were added: resolve the user from the database
+    if (await revocation.current_revocations(db)).revokes(payload):
+        return None
+    return await _cached_principal(username, db)
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
+    user = await resolve_token_user(token, db)
     if user is None:
-        raise credentials_exception
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     return user
 
+@router.post("/me/logout")
+def logout(current_user: PersonOfCustomer = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Revokes the access and refresh tokens of the caller's login."""
+    if current_user.session_id:
+        revocation.revoke_session(db, current_user.user, current_user.session_id, TOKEN_MAX_LIFETIME)
+    else:
+        # Tokens from before sessions existed cannot be told apart
+        revocation.revoke_user(db, current_user.user, TOKEN_MAX_LIFETIME)
+    db.commit()
+    return {"message": "Logged out"}
+
+@router.post("/me/logout-all")
+def logout_all_sessions(current_user: PersonOfCustomer = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Revokes every token of the caller, on every device."""
+    revocation.revoke_user(db, current_user.user, TOKEN_MAX_LIFETIME)
+    db.commit()
+    return {"message": "Logged out of all sessions"}
+
+@router.delete("/{person_id}/sessions")
+def revoke_user_sessions(person_id: int, current_user: PersonOfCustomer = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Admin: logs a user out everywhere."""
+    if current_user.roll != '1':
+        raise HTTPException(status_code=403, detail="Not authorized")
+    db_person = db.query(PersonOfCustomer).filter(PersonOfCustomer.id == person_id).first()
+    if db_person is None:
+        raise HTTPException(status_code=404, detail="Person not found")
+    revocation.revoke_user(db, db_person.user, TOKEN_MAX_LIFETIME)
+    db.commit()
+    return {"message": f"Sessions of {db_person.user} revoked"}
+
 @router.get("/me")
 async def read_users_me(current_user: PersonOfCustomer = Depends(get_current_user), db: Session = Depends(get_db)):
     customer_code = None
@@ -43,18 +124,19 @@ async def read_users_me(current_user: PersonOfCustomer = Depends(get_current_use
     company_encargados = []
     if customer_code and customer.encargados:
         encargados_list = [name.strip() for name in customer.encargados.split(',') if name.strip()]
+        # Users and their departments for all the names at once
+        user_ids = dict(
+            db.query(PersonOfCustomer.user, PersonOfCustomer.id).filter(PersonOfCustomer.user.in_(encargados_list)).all()
+        )
+        departments = {}
+        if user_ids:
+            dept_rows = db.query(models.DepartmentManagerRow.in_charge_id, models.DepartmentManagerRow.department).filter(
+                models.DepartmentManagerRow.in_charge_id.in_(list(user_ids.values()))
+            ).order_by(models.DepartmentManagerRow.id).all()
+            for in_charge_id, department in dept_rows:
+                departments.setdefault(in_charge_id, department) # First row of each user, as before
         for encargado_name in encargados_list:
-            # Find the user to get their ID
-            encargado_user = db.query(PersonOfCustomer).filter(PersonOfCustomer.user == encargado_name).first()
-            department_name = "General"
-            if encargado_user:
-                # Find their department
-                dept_row = db.query(models.DepartmentManagerRow).filter(
-                    models.DepartmentManagerRow.in_charge_id == encargado_user.id
-                ).first()
-                if dept_row:
-                    department_name = dept_row.department
-            
+            department_name = departments.get(user_ids.get(encargado_name), "General")
             company_encargados.append({
                 "username": encargado_name,
                 "department": department_name,
@@ -0,0 +1,173 @@
+"""
+Columnar snapshot of activities, tickets, customers and projects for analytics.
+
+export_snapshot copies the four tables into a DuckDB file (and optionally
+Parquet files) that the analytics mode of reports_api queries instead of the
+live database, so multi-year analyses never touch the tables we share with
+the ERP. The export runs nightly from automatizaciones/export_analytics_snapshot.py.
+"""
+import csv
+import os
+import tempfile
+from datetime import date, datetime, time
+
+from sqlalchemy import select
+
+from .. import models
+
+ANALYTICS_SNAPSHOT_PATH = os.getenv("ANALYTICS_SNAPSHOT_PATH", os.path.join("analytics", "flowdesk.duckdb"))
+
+# Snapshot table name -> source table. Columns keep their database names.
+SNAPSHOT_TABLES = {
+    "activities": models.Actividad.__table__,
+    "cards": models.Card.__table__,
+    "customers": models.Cliente.__table__,
+    "projects": models.Proyecto.__table__,
+}
+
+# Columns computed once at export time, so queries do not repeat the work.
+# duration_hours follows reports_api.calculate_duration: rounded per activity,
+# crossing midnight when the end is before the start, 0 when a time is missing.
+DERIVED_COLUMNS = {
+    "activities": {
+        "duration_hours": """
+            CASE WHEN "StartTime" IS NULL OR "EndTime" IS NULL THEN 0.0
+            ELSE round((epoch("EndTime") - epoch("StartTime")
+                        + CASE WHEN "EndTime" < "StartTime" THEN 86400 ELSE 0 END) / 3600, 2)
+            END
+        """,
+    },
+}
+
+_DUCKDB_TYPES = {
+    bool: "BOOLEAN",
+    int: "BIGINT",
+    float: "DOUBLE",
+    str: "VARCHAR",
+    date: "DATE",
+    time: "TIME",
+    datetime: "TIMESTAMP",
+}
+
+_NULL = "\\N"
+
+
+class SnapshotUnavailable(Exception):
+    """Raised when the snapshot cannot be read: duckdb missing or no export yet."""
+
+
+def _duckdb(reason):
+    # Imported on first use: only analytics mode needs it, and it would add
+    # tens of milliseconds to every API worker start
+    try:
+        import duckdb
+    except ImportError:
+        raise SnapshotUnavailable(reason) from None
+    return duckdb
+
+
+def _duckdb_type(column):
+    try:
+        return _DUCKDB_TYPES.get(column.type.python_type, "VARCHAR")
+    except NotImplementedError:
+        return "VARCHAR"
+
+
+def _csv_value(value):
+    if value is None:
+        return _NULL
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return value
+
+
+def _dump_table(connection, table, path, batch_size):
+    """Writes the table to a CSV file in primary key order, one batch per query. Returns the row count."""
+    pk = next(iter(table.primary_key.columns))
+    last_pk = None
+    rows = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f, lineterminator="\n")
+        while True:
+            # Keyset pagination: every batch is an index range read on the primary key
+            statement = select(table).order_by(pk).limit(batch_size)
+            if last_pk is not None:
+                statement = statement.where(pk > last_pk)
+            batch = connection.execute(statement).all()
+            if not batch:
+                break
+            writer.writerows([_csv_value(value) for value in row] for row in batch)
+            rows += len(batch)
+            last_pk = batch[-1]._mapping[pk]
+    return rows
+
+
+def _load_table(duck, name, table, csv_path):
+    columns = {column.name: _duckdb_type(column) for column in table.columns}
+    derived = "".join(
+        f", {expression} AS {column}" for column, expression in DERIVED_COLUMNS.get(name, {}).items()
+    )
+    duck.execute(
+        f"CREATE TABLE {name} AS SELECT *{derived} FROM read_csv(?, header = false, columns = ?, "
+        f"nullstr = ?, delim = ',', quote = '\"', escape = '\"', auto_detect = false)",
+        [csv_path, columns, _NULL]
+    )
+
+
+def export_snapshot(db_engine, path=ANALYTICS_SNAPSHOT_PATH, batch_size=5000, parquet_dir=None):
+    """
+    Copies the snapshot tables from db_engine into a new DuckDB file and swaps
+    it in place of path, so readers never see a half-written snapshot.
+    Returns the row count of each table.
+    """
+    duckdb = _duckdb("duckdb is not installed")
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    counts = {}
+    taken_at = datetime.utcnow()
+    duck = duckdb.connect(tmp_path)
+    try:
+        with tempfile.TemporaryDirectory() as staging, db_engine.connect() as connection:
+            for name, table in SNAPSHOT_TABLES.items():
+                csv_path = os.path.join(staging, f"{name}.csv")
+                counts[name] = _dump_table(connection, table, csv_path, batch_size)
+                _load_table(duck, name, table, csv_path)
+
+        duck.execute("CREATE TABLE snapshot_info (taken_at TIMESTAMP, source VARCHAR)")
+        duck.execute("INSERT INTO snapshot_info VALUES (?, ?)", [taken_at, db_engine.dialect.name])
+
+        if parquet_dir:
+            os.makedirs(parquet_dir, exist_ok=True)
+            for name in SNAPSHOT_TABLES:
+                duck.execute(f"COPY {name} TO '{os.path.join(parquet_dir, name + '.parquet')}' (FORMAT PARQUET)")
+    finally:
+        duck.close()
+
+    os.replace(tmp_path, path)
+    return counts
+
+
+def open_snapshot(path=ANALYTICS_SNAPSHOT_PATH):
+    """Read-only connection to the latest snapshot. Close it when done."""
+    duckdb = _duckdb("Analytics mode requires duckdb")
+    if not os.path.exists(path):
+        raise SnapshotUnavailable("No analytics snapshot has been exported yet")
+    return duckdb.connect(path, read_only=True)
+
+
+def snapshot_status(path=ANALYTICS_SNAPSHOT_PATH):
+    """When the snapshot was taken and how many rows each table holds."""
+    duck = open_snapshot(path)
+    try:
+        taken_at, source = duck.execute("SELECT taken_at, source FROM snapshot_info").fetchone()
+        tables = {
+            name: duck.execute(f"SELECT count(*) FROM {name}").fetchone()[0]
+            for name in SNAPSHOT_TABLES
+        }
+    finally:
+        duck.close()
+    return {"path": path, "taken_at": taken_at, "source": source, "tables": tables}
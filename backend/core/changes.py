@@ -0,0 +1,113 @@
+"""
+Change data capture for the tables integrations sync from.
+
+Session listeners write one ChangeLog row per inserted, updated or deleted
+Card, Activity, CardsEventRow or Customer, in the same transaction as the
+change itself: a rolled back change leaves no entry and a committed one always
+has its entry. GET /api/changes reads the log by cursor (the ChangeLog id).
+
+Entries are described after each flush, while the attribute history still
+says what changed, and written just before the transaction commits. The
+write starts by bumping the single ChangeLogSequence row, whose lock is held
+until the commit, so transactions write their entries one after another in
+commit order. The ids therefore grow in commit order: once an id is visible,
+no entry with a smaller id can appear later, however long the transaction
+took between its flushes and its commit.
+"""
+import json
+from datetime import date, datetime, time
+
+from sqlalchemy import event, inspect, insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .. import models
+
+TRACKED_MODELS = (models.Card, models.Actividad, models.CardsEventRow, models.Cliente)
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime, time)):
+        return value.isoformat()
+    return str(value)
+
+
+def _row_data(state):
+    """Column values already loaded on the instance, keyed by database column name. Never emits SQL."""
+    return {
+        attr.columns[0].name: state.dict[attr.key]
+        for attr in state.mapper.column_attrs
+        if attr.key in state.dict
+    }
+
+
+def _changed_columns(state):
+    return [
+        attr.columns[0].name
+        for attr in state.mapper.column_attrs
+        if state.attrs[attr.key].history.has_changes()
+    ]
+
+
+def _entry(obj, operation):
+    state = inspect(obj)
+    pk_key = state.mapper.get_property_by_column(state.mapper.primary_key[0]).key
+    data = _row_data(state)
+    changed = _changed_columns(state) if operation == "update" else None
+    if operation == "update" and not changed:
+        return None
+    # Keyed by ChangeLog column name, for the Core insert below
+    return {
+        "TableName": state.mapper.local_table.name,
+        "RowId": state.dict.get(pk_key),
+        "Operation": operation,
+        "ChangedColumns": json.dumps(changed) if changed else None,
+        "Data": json.dumps(data, default=_json_default),
+    }
+
+
+@event.listens_for(Session, "after_flush")
+def record_changes(session, flush_context):
+    # new, dirty, deleted and attribute history still describe this flush here;
+    # changed_at is stamped when the entries are written at commit
+    entries = session.info.setdefault("pending_changes", [])
+    for operation, objects in (("insert", session.new), ("update", session.dirty), ("delete", session.deleted)):
+        for obj in objects:
+            if isinstance(obj, TRACKED_MODELS):
+                entry = _entry(obj, operation)
+                if entry is not None:
+                    entries.append(entry)
+
+
+def _lock_sequence(connection):
+    """Bumps the ChangeLogSequence row; its lock is held until the transaction ends."""
+    sequence = models.ChangeLogSequence.__table__
+    bump = update(sequence).where(sequence.c.id == 1).values(value=sequence.c.value + 1)
+    if connection.execute(bump).rowcount:
+        return
+    try:
+        connection.execute(insert(sequence).values(id=1, value=1))
+    except IntegrityError:
+        # Another transaction created the row first; wait for its lock like everyone else
+        connection.execute(bump)
+
+
+@event.listens_for(Session, "before_commit")
+def write_changes(session):
+    # commit() flushes after this event; flush first so those changes are described too
+    session.flush()
+    entries = session.info.pop("pending_changes", None)
+    if not entries:
+        return
+    connection = session.connection()
+    _lock_sequence(connection)
+    changed_at = datetime.utcnow()
+    for entry in entries:
+        entry["ChangedAt"] = changed_at
+    # Core insert: the session is about to commit and must not get new objects
+    connection.execute(insert(models.ChangeLog.__table__), entries)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def discard_changes(session, previous_transaction):
+    session.info.pop("pending_changes", None)
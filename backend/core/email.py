@@ -1,17 +1,24 @@
+import logging
 import smtplib
+import time
 from email.mime.text import MIMEText
 from email.utils import formataddr
 from sqlalchemy.orm import Session
 
 from .. import models
 from ..database import SessionLocal
+from .metrics import SMTP_EMAILS, SMTP_SEND_DURATION
+from .tracing import span
+
+logger = logging.getLogger(__name__)
 
 def send_email(to_email: str, subject: str, body: str):
     db = SessionLocal()
     try:
         smtp_settings = db.query(models.SmtpSettings).first()
         if not smtp_settings:
-            print("ERROR: SMTP settings not found in database. Cannot send email.")
+            logger.error("SMTP settings not found in database. Cannot send email.")
+            SMTP_EMAILS.labels("not_configured").inc()
             return False
 
         msg = MIMEText(body, 'html') # Assuming HTML content for now
@@ -19,21 +26,30 @@ def send_email(to_email: str, subject: str, body: str):
         msg['From'] = formataddr(('Innova Tickets', smtp_settings.username))
         msg['To'] = to_email
 
+        started = time.perf_counter()
         try:
-            if smtp_settings.use_ssl:
-                server = smtplib.SMTP_SSL(smtp_settings.host, smtp_settings.port)
-            else:
-                server = smtplib.SMTP(smtp_settings.host, smtp_settings.port)
-                if smtp_settings.use_tls:
-                    server.starttls()
-            
-            server.login(smtp_settings.username, smtp_settings.password)
-            server.sendmail(smtp_settings.username, to_email, msg.as_string())
-            server.quit()
-            print(f"Email sent successfully to {to_email}")
+            with span("smtp.send", attributes={"smtp.host": smtp_settings.host, "smtp.port": smtp_settings.port}):
+                with span("smtp.connect"):
+                    if smtp_settings.use_ssl:
+                        server = smtplib.SMTP_SSL(smtp_settings.host, smtp_settings.port)
+                    else:
+                        server = smtplib.SMTP(smtp_settings.host, smtp_settings.port)
+                        if smtp_settings.use_tls:
+                            server.starttls()
+
+                with span("smtp.login"):
+                    server.login(smtp_settings.username, smtp_settings.password)
+                with span("smtp.sendmail"):
+                    server.sendmail(smtp_settings.username, to_email, msg.as_string())
+                    server.quit()
+            logger.info("Email sent successfully to %s", to_email)
+            SMTP_SEND_DURATION.labels("sent").observe(time.perf_counter() - started)
+            SMTP_EMAILS.labels("sent").inc()
             return True
         except Exception as e:
-            print(f"ERROR sending email to {to_email}: {e}")
+            logger.error("Error sending email to %s: %s", to_email, e)
+            SMTP_SEND_DURATION.labels("failed").observe(time.perf_counter() - started)
+            SMTP_EMAILS.labels("failed").inc()
             return False
     finally:
         db.close()
\ No newline at end of file
@@ -0,0 +1,174 @@
+"""
+Application logging: JSON lines written by a background thread.
+
+Loggers under "backend" hand their records to a QueueHandler, which only puts
+them on an in-memory queue; a QueueListener thread formats and writes them.
+A request never waits on stdout or a log file. If the writer falls behind and
+the queue fills up, new records are dropped and counted instead of blocking.
+
+Settings:
+    LOG_LEVEL                default level (INFO)
+    LOG_LEVELS               per-module levels, e.g. "backend.api.actividades_api=DEBUG,backend.core.email=WARNING"
+    LOG_FORMAT               json (default) or text
+    LOG_FILE                 also write to this rotating file
+    LOG_QUEUE_SIZE           records waiting to be written before new ones are dropped
+    LOG_DEBUG_SAMPLE_RATE    fraction of DEBUG records kept from loggers LOG_LEVELS does not name (1 keeps all)
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from .slow_queries import query_origin
+from .tracing import current_trace_id
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").strip().lower()
+LOG_FILE = os.getenv("LOG_FILE") or None
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", 0.01))
+
+APP_LOGGER = "backend"
+
+# Attributes every LogRecord has; anything else came in through extra={...}
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName", "origin", "trace_id"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "origin", None):
+            entry["origin"] = record.origin
+        if getattr(record, "trace_id", None):
+            entry["trace_id"] = record.trace_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+
+class DebugSampler(logging.Filter):
+    """
+    Keeps a fraction of DEBUG records; INFO and above always pass, and so do
+    the records of the exempt loggers and their children (those LOG_LEVELS
+    sets on purpose).
+    """
+
+    def __init__(self, rate, exempt=()):
+        super().__init__()
+        self.rate = rate
+        self.exempt = tuple(exempt)
+        self._exempt_names = {} # logger name -> exempt, filled as records come in
+
+    def _is_exempt(self, name):
+        exempt = self._exempt_names.get(name)
+        if exempt is None:
+            exempt = any(name == prefix or name.startswith(prefix + ".") for prefix in self.exempt)
+            self._exempt_names[name] = exempt
+        return exempt
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.rate >= 1:
+            return True
+        return self._is_exempt(record.name) or random.random() < self.rate
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler that drops records when the queue is full and keeps exceptions apart from the message."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Runs in the request thread: render what cannot cross to the listener
+        # (args, exc_info) and capture the request origin and trace while they are known.
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.origin = query_origin()
+        record.trace_id = current_trace_id()
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_listener = None
+_queue_handler = None
+
+
+def _parse_levels(text):
+    levels = {}
+    for part in text.split(","):
+        name, _, level = part.strip().partition("=")
+        if name and level:
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging():
+    """Configures the "backend" loggers once per process; later calls do nothing."""
+    global _listener, _queue_handler
+    if _queue_handler is not None:
+        return
+
+    formatter = TextFormatter() if LOG_FORMAT == "text" else JsonFormatter()
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if LOG_FILE:
+        os.makedirs(os.path.dirname(os.path.abspath(LOG_FILE)), exist_ok=True)
+        handlers.append(RotatingFileHandler(LOG_FILE, maxBytes=20 * 1024 * 1024, backupCount=5, encoding="utf-8"))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    _queue_handler = NonBlockingQueueHandler(log_queue)
+    levels = _parse_levels(LOG_LEVELS)
+    # Modules raised to DEBUG through LOG_LEVELS keep every record
+    _queue_handler.addFilter(DebugSampler(LOG_DEBUG_SAMPLE_RATE, exempt=levels))
+
+    app_logger = logging.getLogger(APP_LOGGER)
+    app_logger.setLevel(LOG_LEVEL)
+    app_logger.addHandler(_queue_handler)
+    app_logger.propagate = False
+    for name, level in levels.items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Writes out what is still queued and stops the listener thread."""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    _listener = None
+    if _queue_handler is not None and _queue_handler.dropped:
+        print(f"WARNING: {_queue_handler.dropped} log records were dropped because the log queue was full", file=sys.stderr)
@@ -0,0 +1,169 @@
+"""
+Memory snapshots for hunting leaks and heavy allocations.
+
+tracemalloc records where each live Python block was allocated. Snapshots
+are kept in the process that took them, so two snapshots a few hours apart
+show which lines have kept memory since. Tracing slows allocations down and
+adds memory of its own, so it is only on while someone is looking: started
+and stopped through /api/monitoring/memory/* or --memory on the scripts.
+
+With several API workers each one has its own tracing and snapshots; every
+response carries the pid so calls that landed on another worker stand out.
+
+Settings:
+    MEMORY_TRACE_FRAMES       frames stored per allocation (10)
+    MEMORY_SNAPSHOTS_KEPT     snapshots kept per process; the oldest is dropped (5)
+"""
+import os
+import sys
+import threading
+import tracemalloc
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+MEMORY_TRACE_FRAMES = int(os.getenv("MEMORY_TRACE_FRAMES", 10))
+MEMORY_SNAPSHOTS_KEPT = int(os.getenv("MEMORY_SNAPSHOTS_KEPT", 5))
+
+# Allocations of the tracing machinery itself are left out of the reports
+_IGNORED = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+_snapshots = OrderedDict()
+_next_id = 1
+_lock = threading.Lock()
+
+
+def _proc_status_kb(field):
+    """A memory figure from /proc/self/status in KB (Linux only; None elsewhere)."""
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def peak_rss_kb():
+    """Highest resident set size of this process so far, in KB (None where unknown)."""
+    # VmHWM starts over in a new program; ru_maxrss keeps the parent's peak
+    # across fork and exec, so it is only the fallback
+    peak = _proc_status_kb("VmHWM")
+    if peak is not None or resource is None:
+        return peak
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak # macOS reports bytes
+
+
+def current_rss_kb():
+    """Resident set size right now, in KB (Linux only; None elsewhere)."""
+    return _proc_status_kb("VmRSS")
+
+
+def status():
+    current, peak = tracemalloc.get_traced_memory()
+    return {
+        "pid": os.getpid(),
+        "tracing": tracemalloc.is_tracing(),
+        "frames": tracemalloc.get_traceback_limit() if tracemalloc.is_tracing() else None,
+        "traced_kb": round(current / 1024, 1),
+        "traced_peak_kb": round(peak / 1024, 1),
+        "rss_kb": current_rss_kb(),
+        "peak_rss_kb": peak_rss_kb(),
+        "snapshots": [
+            {"id": snapshot_id, "label": label, "taken_at": taken_at}
+            for snapshot_id, (label, taken_at, _) in _snapshots.items()
+        ],
+    }
+
+
+def start_tracing(frames=MEMORY_TRACE_FRAMES):
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+
+
+def stop_tracing():
+    """Stops tracing and drops the snapshots, which cannot be compared with later ones."""
+    with _lock:
+        _snapshots.clear()
+    tracemalloc.stop()
+
+
+def take_snapshot(label=None):
+    """Stores a snapshot and returns its id. Tracing must be on."""
+    global _next_id
+    snapshot = tracemalloc.take_snapshot().filter_traces(_IGNORED)
+    with _lock:
+        snapshot_id = _next_id
+        _next_id += 1
+        _snapshots[snapshot_id] = (label, datetime.now(timezone.utc).isoformat(timespec="seconds"), snapshot)
+        while len(_snapshots) > MEMORY_SNAPSHOTS_KEPT:
+            _snapshots.popitem(last=False)
+    return snapshot_id
+
+
+def get_snapshot(snapshot_id):
+    entry = _snapshots.get(snapshot_id)
+    return entry[2] if entry else None
+
+
+def _location(traceback, group_by):
+    if group_by == "traceback":
+        return [f"{frame.filename}:{frame.lineno}" for frame in traceback]
+    frame = traceback[0]
+    return f"{frame.filename}:{frame.lineno}"
+
+
+def compare(first, second, group_by="lineno", limit=25):
+    """Top differences from snapshot first to snapshot second, biggest growth first."""
+    differences = second.compare_to(first, group_by)
+    return {
+        "size_diff_kb": round(sum(stat.size_diff for stat in differences) / 1024, 1),
+        "top": [
+            {
+                "location": _location(stat.traceback, group_by),
+                "size_diff_kb": round(stat.size_diff / 1024, 1),
+                "count_diff": stat.count_diff,
+                "size_kb": round(stat.size / 1024, 1),
+                "count": stat.count,
+            }
+            for stat in differences[:limit]
+        ],
+    }
+
+
+def add_memory_argument(parser):
+    parser.add_argument(
+        "--memory", action="store_true",
+        help="trace allocations during the run and print its peak and the lines still holding memory at the end"
+    )
+
+
+def run_traced(function, enabled=True, limit=25):
+    """Runs function with tracemalloc on and prints its peak and what it left allocated."""
+    if not enabled:
+        return function()
+    start_tracing()
+    before = tracemalloc.take_snapshot().filter_traces(_IGNORED)
+    tracemalloc.reset_peak()
+    try:
+        return function()
+    finally:
+        after = tracemalloc.take_snapshot().filter_traces(_IGNORED)
+        _, traced_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        report = compare(before, after, limit=limit)
+        print(f"\nMemory: traced peak {traced_peak / 1024 / 1024:.1f} MB, peak RSS {(peak_rss_kb() or 0) / 1024:.1f} MB, "
+              f"{report['size_diff_kb'] / 1024:+.1f} MB still allocated at the end")
+        for row in report["top"]:
+            print(f"  {row['size_diff_kb']:+10.1f} KB {row['count_diff']:+8} blocks  {row['location']}")
@@ -0,0 +1,135 @@
+"""
+Prometheus metrics for the API, the email sender and the automation scripts.
+
+With several uvicorn workers, set PROMETHEUS_MULTIPROC_DIR to an empty
+directory shared by every worker and by the automatizaciones scripts, and
+clear it before the API starts. Each process writes its samples there and
+/metrics aggregates all of them. Without it, /metrics serves the current
+process only, and script counters are lost when the script exits.
+"""
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+)
+
+from ..database import engine, read_engine, report_engine, async_engine, get_pool_status
+
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+# --- API requests ---
+HTTP_REQUEST_DURATION = Histogram(
+    "flowdesk_http_request_duration_seconds", "Request latency by route",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "flowdesk_http_requests_in_progress", "Requests being served",
+    ["method"], multiprocess_mode="livesum"
+)
+
+# --- Connection pools (refreshed after every request) ---
+DB_POOL_CHECKED_OUT = Gauge(
+    "flowdesk_db_pool_checked_out", "Connections in use", ["pool"], multiprocess_mode="livesum"
+)
+DB_POOL_OVERFLOW = Gauge(
+    "flowdesk_db_pool_overflow", "Overflow connections in use", ["pool"], multiprocess_mode="livesum"
+)
+DB_POOL_SIZE = Gauge(
+    "flowdesk_db_pool_size", "Configured base pool size", ["pool"], multiprocess_mode="livesum"
+)
+DB_POOL_CHECKOUTS = Counter("flowdesk_db_pool_checkouts", "Connections handed out", ["pool"])
+DB_POOL_CHECKOUT_TIMEOUTS = Counter(
+    "flowdesk_db_pool_checkout_timeouts", "Checkouts that gave up waiting for a connection", ["pool"]
+)
+DB_POOL_WAIT_SECONDS = Counter(
+    "flowdesk_db_pool_checkout_wait_seconds", "Time spent waiting for a connection", ["pool"]
+)
+
+# --- Email ---
+SMTP_EMAILS = Counter("flowdesk_smtp_emails", "Emails by outcome: sent, failed, not_configured", ["result"])
+SMTP_SEND_DURATION = Histogram(
+    "flowdesk_smtp_send_duration_seconds", "SMTP connect, login and send time", ["result"],
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+)
+
+# --- Passwords ---
+PASSWORD_HASH_DURATION = Histogram(
+    "flowdesk_password_hash_duration_seconds", "Time hashing or verifying a password on the pool", ["operation"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+PASSWORD_HASH_WAIT = Histogram(
+    "flowdesk_password_hash_wait_seconds", "Time a password operation waited for a free pool worker", ["operation"],
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+LEGACY_PASSWORDS_REHASHED = Counter(
+    "flowdesk_legacy_passwords_rehashed", "SHA-256 passwords moved to the current scheme at login"
+)
+
+# --- Automation scripts ---
+AUTOMATION_RUNS = Counter("flowdesk_automation_runs", "Script runs by outcome", ["script", "result"])
+AUTOMATION_LAST_SUCCESS = Gauge(
+    "flowdesk_automation_last_success_timestamp_seconds", "Unix time of the last successful run",
+    ["script"], multiprocess_mode="max"
+)
+TICKETS_ESCALATED = Counter(
+    "flowdesk_tickets_escalated", "Escalation emails sent by check_escalations", ["target"]
+)
+TRELLO_CARDS_CREATED = Counter("flowdesk_trello_cards_created", "Tickets created by the Trello sync")
+CLIENTS_ALERTED = Counter(
+    "flowdesk_support_hours_clients_alerted", "Clients notified by check_support_hours"
+)
+
+
+def _pools():
+    pools = {"sync": engine, "async": async_engine, "reporting": report_engine}
+    if read_engine is not engine:
+        pools["replica"] = read_engine
+    return pools
+
+
+# Last cumulative wait stats seen per pool, to turn them into counter increments
+_last_wait_stats = {}
+
+
+def update_pool_metrics():
+    for name, db_engine in _pools().items():
+        status = get_pool_status(db_engine)
+        DB_POOL_CHECKED_OUT.labels(name).set(status["checked_out"] or 0)
+        DB_POOL_OVERFLOW.labels(name).set(status["overflow"] or 0)
+        DB_POOL_SIZE.labels(name).set(status["pool_size"] or 0)
+
+        if "checkouts_total" not in status:
+            continue
+        last = _last_wait_stats.get(name, {})
+        DB_POOL_CHECKOUTS.labels(name).inc(status["checkouts_total"] - last.get("checkouts_total", 0))
+        DB_POOL_CHECKOUT_TIMEOUTS.labels(name).inc(
+            status["checkout_timeouts_total"] - last.get("checkout_timeouts_total", 0)
+        )
+        DB_POOL_WAIT_SECONDS.labels(name).inc(
+            max(status["wait_seconds_total"] - last.get("wait_seconds_total", 0.0), 0.0)
+        )
+        _last_wait_stats[name] = status
+
+
+def record_automation_run(script, succeeded):
+    AUTOMATION_RUNS.labels(script, "success" if succeeded else "error").inc()
+    if succeeded:
+        AUTOMATION_LAST_SUCCESS.labels(script).set(time.time())
+
+
+def render_metrics():
+    """Returns the exposition body and its content type."""
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    update_pool_metrics()
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead():
+    """Drops the live gauges of this worker from the shared directory on shutdown."""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
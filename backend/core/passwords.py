@@ -0,0 +1,109 @@
+"""
+Password hashing and verification off the event loop.
+
+Werkzeug's hashes (scrypt by default) are slow on purpose, tens of
+milliseconds of CPU each. Run inside an async def route they stop every other
+request of the worker, so a burst of logins freezes the API. These helpers
+run them on a pool of PASSWORD_HASH_WORKERS instead; calls beyond that wait
+in the pool's queue, which also caps the CPU logins can take from the rest of
+the host.
+
+Threads are enough for the default scrypt and pbkdf2 methods, which release
+the GIL while hashing. PASSWORD_HASH_POOL=process moves the work to
+processes for methods that do not.
+
+Passwords from the old system are stored as a bare SHA-256 hex digest.
+verify_password() accepts them and reports that the hash should be replaced
+with hash_password(), which the login does right after a successful check.
+
+Settings:
+    PASSWORD_HASH_POOL       thread or process (thread)
+    PASSWORD_HASH_WORKERS    hashes computed at the same time per API worker (2)
+"""
+import asyncio
+import hashlib
+import hmac
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from .metrics import PASSWORD_HASH_DURATION, PASSWORD_HASH_WAIT
+
+PASSWORD_HASH_POOL = os.getenv("PASSWORD_HASH_POOL", "thread").strip().lower()
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                if PASSWORD_HASH_POOL == "process":
+                    _executor = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS)
+                else:
+                    _executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+    return _executor
+
+
+def shutdown():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def is_legacy_hash(hashed_password):
+    """A bare SHA-256 hex digest, as the old system stored passwords."""
+    return len(hashed_password) == 64 and "$" not in hashed_password
+
+
+def verify_password_sync(plain_password, hashed_password):
+    """(matches, needs_rehash). needs_rehash is True for a matching legacy SHA-256 hash."""
+    if is_legacy_hash(hashed_password):
+        digest = hashlib.sha256(plain_password.encode("utf-8")).hexdigest()
+        matches = hmac.compare_digest(digest, hashed_password)
+        return matches, matches
+    # Imported on first use: werkzeug.security loads the whole werkzeug
+    # package, which every worker start would otherwise pay for
+    from werkzeug.security import check_password_hash
+    try:
+        return check_password_hash(hashed_password, plain_password), False
+    except ValueError:
+        # Unknown hash method (e.g. an imported bcrypt "$2b$" hash): a failed login, not a 500
+        return False, False
+
+
+def hash_password_sync(plain_password):
+    """A new hash with Werkzeug's default method."""
+    from werkzeug.security import generate_password_hash
+    return generate_password_hash(plain_password)
+
+
+def _timed(function, submitted, *args):
+    # Runs on the pool; returns how long the call queued and ran along with its result
+    started = time.time()
+    result = function(*args)
+    return result, started - submitted, time.time() - started
+
+
+async def _run(operation, function, *args):
+    loop = asyncio.get_running_loop()
+    result, waited, took = await loop.run_in_executor(_get_executor(), _timed, function, time.time(), *args)
+    PASSWORD_HASH_WAIT.labels(operation).observe(max(waited, 0))
+    PASSWORD_HASH_DURATION.labels(operation).observe(took)
+    return result
+
+
+async def verify_password(plain_password, hashed_password):
+    """(matches, needs_rehash), computed on the pool."""
+    return await _run("verify", verify_password_sync, plain_password, hashed_password)
+
+
+async def hash_password(plain_password):
+    """A new hash with Werkzeug's default method, computed on the pool."""
+    return await _run("hash", hash_password_sync, plain_password)
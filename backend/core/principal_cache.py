@@ -0,0 +1,236 @@
+"""
+In-process cache of the users behind bearer tokens.
+
+Access tokens carry the user's claims (see auth_api.Principal), so
+get_current_user builds the caller from them. It checks that the token's
+token_version is still the user's current one and that the token is not
+revoked (see core.revocation). The version comes from the user's principal,
+read from the database once and kept in a bounded LRU keyed by the token
+subject (the username) for up to AUTH_CACHE_TTL_SECONDS; tokens issued before
+the claims existed are resolved from the same entries. The revocations in
+force are a table-wide snapshot kept here per worker (snapshot()), loaded with
+one query and reused for the same time.
+
+Versions: changing a claim of a PersonOfCustomer (user, gmail, roll,
+cliente_id, status, is_verified) bumps its token_version in the same flush, and
+renaming a client's code bumps the version of all its users. Their tokens are
+then refused until renewed through /api/token/refresh.
+
+Invalidation: a session listener notes every PersonOfCustomer that a
+transaction adds or deletes or whose claims or token_version it changes (not,
+say, a password reset token), and every new RevokedToken, and when the
+transaction commits evicts those users and drops the snapshots. The same
+commit replaces a small generation file shared by the workers on the host.
+Every lookup stats that file, one system call and no database, and a worker
+that sees a new generation empties its cache. Changes made outside the
+application (SQL by hand, another host) are picked up when the TTL runs out.
+
+Settings:
+    AUTH_CACHE_TTL_SECONDS        how long snapshots and resolved users are reused (30; 0 disables the cache)
+    AUTH_CACHE_MAX_ENTRIES        users kept per worker; the least recently used goes first (10000)
+    AUTH_CACHE_GENERATION_FILE    file the workers of a host share (in the temp directory by default)
+"""
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from sqlalchemy import event, inspect, update
+from sqlalchemy.orm import Session
+
+from .. import models
+
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", 30))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", 10000))
+AUTH_CACHE_GENERATION_FILE = os.getenv("AUTH_CACHE_GENERATION_FILE") or os.path.join(
+    tempfile.gettempdir(), "flowdesk-principal-cache.generation"
+)
+
+
+class PrincipalCache:
+    def __init__(self, ttl_seconds, max_entries, generation_file):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.generation_file = generation_file
+        self._entries = OrderedDict() # username -> (expires at, principal)
+        self._snapshots = {} # name -> (expires at, value), see snapshot()
+        self._lock = threading.Lock()
+        self._local_generation = 0
+        self._shared_generation = self._read_shared_generation()
+
+    def _read_shared_generation(self):
+        # Each bump replaces the file, so inode and mtime together identify a generation
+        try:
+            stat = os.stat(self.generation_file)
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _sync(self):
+        """Empties the cache when another worker bumped the generation. Call with the lock held."""
+        shared = self._read_shared_generation()
+        if shared != self._shared_generation:
+            self._shared_generation = shared
+            self._local_generation += 1
+            self._entries.clear()
+            self._snapshots.clear()
+
+    def lookup(self, username):
+        """
+        (user, generation). user is None on a miss; pass generation back to
+        store() so a user read before an invalidation is not cached after it.
+        """
+        if self.ttl_seconds <= 0:
+            return None, None
+        with self._lock:
+            self._sync()
+            entry = self._entries.get(username)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(username)
+                    return entry[1], self._local_generation
+                del self._entries[username]
+            return None, self._local_generation
+
+    def store(self, username, user, generation):
+        if self.ttl_seconds <= 0 or generation is None:
+            return
+        with self._lock:
+            self._sync()
+            if generation != self._local_generation:
+                return
+            self._entries[username] = (time.monotonic() + self.ttl_seconds, user)
+            self._entries.move_to_end(username)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def snapshot(self, name):
+        """
+        (value, generation) for a table-wide snapshot kept next to the users,
+        such as the token versions of every user. value is None when it has to
+        be loaded and given to store_snapshot() with generation.
+        """
+        if self.ttl_seconds <= 0:
+            return None, None
+        with self._lock:
+            self._sync()
+            entry = self._snapshots.get(name)
+            if entry is not None and entry[0] > time.monotonic():
+                return entry[1], self._local_generation
+            return None, self._local_generation
+
+    def store_snapshot(self, name, value, generation):
+        if self.ttl_seconds <= 0 or generation is None:
+            return
+        with self._lock:
+            self._sync()
+            if generation != self._local_generation:
+                return
+            self._snapshots[name] = (time.monotonic() + self.ttl_seconds, value)
+
+    def invalidate(self, usernames):
+        """Evicts the users here (all of them for None) and tells the other workers to empty their caches."""
+        with self._lock:
+            if usernames is None:
+                self._entries.clear()
+            for username in usernames or ():
+                self._entries.pop(username, None)
+            self._snapshots.clear()
+            self._local_generation += 1
+            self._bump_shared_generation()
+            self._shared_generation = self._read_shared_generation()
+
+    def _bump_shared_generation(self):
+        directory = os.path.dirname(os.path.abspath(self.generation_file))
+        temporary = os.path.join(directory, f".{os.path.basename(self.generation_file)}.{uuid.uuid4().hex}")
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with open(temporary, "w", encoding="ascii") as f:
+                f.write(uuid.uuid4().hex)
+            os.replace(temporary, self.generation_file)
+        except OSError:
+            # Other workers then rely on the TTL; never fail the write that triggered this
+            pass
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._snapshots.clear()
+            self._local_generation += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+
+cache = PrincipalCache(AUTH_CACHE_TTL_SECONDS, AUTH_CACHE_MAX_ENTRIES, AUTH_CACHE_GENERATION_FILE)
+
+
+# Fields carried in the access token claims
+_CLAIM_ATTRIBUTES = ("user", "gmail", "roll", "cliente_id", "status", "is_verified")
+
+
+def _principal_changed(obj):
+    """Whether a flushed update touched what a cached principal holds."""
+    state = inspect(obj)
+    return any(state.attrs[name].history.has_changes() for name in _CLAIM_ATTRIBUTES + ("token_version",))
+
+
+def _changed_usernames(obj):
+    state = inspect(obj)
+    usernames = {obj.user}
+    # A renamed user is also cached under the old name
+    usernames.update(state.attrs.user.history.deleted or ())
+    return {username for username in usernames if username}
+
+
+@event.listens_for(Session, "before_flush")
+def _bump_token_versions(session, flush_context, instances):
+    for obj in session.dirty:
+        if isinstance(obj, models.PersonOfCustomer):
+            state = inspect(obj)
+            if any(state.attrs[name].history.has_changes() for name in _CLAIM_ATTRIBUTES):
+                obj.token_version = (obj.token_version or 0) + 1
+        elif isinstance(obj, models.Cliente) and inspect(obj).attrs.code.history.has_changes():
+            session.info.setdefault("renamed_clients", set()).add(obj.id)
+
+
+@event.listens_for(Session, "after_flush")
+def _note_changed_users(session, flush_context):
+    changed = session.info.setdefault("changed_principals", set())
+    for obj in session.dirty:
+        # Password, reset token or verification code updates change nothing cached
+        if isinstance(obj, models.PersonOfCustomer) and _principal_changed(obj):
+            changed.update(_changed_usernames(obj))
+    for obj in list(session.new) + list(session.deleted):
+        if isinstance(obj, models.PersonOfCustomer):
+            changed.update(_changed_usernames(obj))
+        elif isinstance(obj, models.RevokedToken):
+            changed.add(obj.user)
+    renamed_clients = session.info.pop("renamed_clients", None)
+    if renamed_clients:
+        # The customer code is a claim of every user of the client
+        users = models.PersonOfCustomer.__table__.c
+        session.connection().execute(
+            update(models.PersonOfCustomer.__table__)
+            .where(users.cliente_id.in_(renamed_clients))
+            .values(token_version=users.token_version + 1)
+        )
+        session.info["renamed_client_users"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _evict_changed_users(session):
+    changed = session.info.pop("changed_principals", None)
+    if session.info.pop("renamed_client_users", False):
+        cache.invalidate(None)
+    elif changed:
+        cache.invalidate(changed)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _forget_changed_users(session, previous_transaction):
+    session.info.pop("changed_principals", None)
+    session.info.pop("renamed_clients", None)
+    session.info.pop("renamed_client_users", None)
@@ -0,0 +1,302 @@
+"""
+On-demand CPU profiling of single API requests and of the automation scripts.
+
+An admin adds ?profile=1 (or the header X-Profile: 1) to any API call and gets
+the profile of that request back in place of its body: the functions that
+took the most samples, by self time and by total time. ?profile=folded returns
+the stacks in the folded format that flamegraph.pl and speedscope read. The
+status the route answered with is kept in the X-Profiled-Status header.
+
+The profiler is a sampler: a thread reads the stacks of the other threads
+every PROFILE_INTERVAL_MS. A profiler hooked into the event loop thread
+(cProfile, pyinstrument) would miss the sync routes, which FastAPI runs on
+worker threads. Worker threads count only while they run a call of the
+profiled request; the event loop thread counts whenever it is busy, so other
+requests' async work on the same worker can show up in the profile.
+
+The scripts take --profile [FILE]: the report is printed at the end and, with
+FILE, the folded stacks are written there as well.
+
+Settings:
+    PROFILING_ENABLED       allow ?profile on the API (true)
+    PROFILE_INTERVAL_MS     time between samples (1)
+    PROFILE_TOP             functions listed in the report (30)
+"""
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from urllib.parse import parse_qs
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "true").strip().lower() in ("1", "true", "yes", "on")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", 1))
+PROFILE_TOP = int(os.getenv("PROFILE_TOP", 30))
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Leaf functions of a thread that is waiting, not working
+_IDLE_FUNCTIONS = {
+    ("threading.py", "wait"), ("threading.py", "_wait_for_tstate_lock"), ("queue.py", "get"),
+    ("selectors.py", "select"), ("socket.py", "accept"),
+}
+
+# The switch interval is process-wide: lowered by the first sampler to start and
+# restored by the last one to stop, so overlapping profiles do not leave it low
+_switch_lock = threading.Lock()
+_active_samplers = 0
+_original_switch_interval = None
+
+
+def _lower_switch_interval(interval):
+    global _active_samplers, _original_switch_interval
+    with _switch_lock:
+        if _active_samplers == 0:
+            _original_switch_interval = sys.getswitchinterval()
+        _active_samplers += 1
+        sys.setswitchinterval(min(sys.getswitchinterval(), interval))
+
+
+def _restore_switch_interval():
+    global _active_samplers
+    with _switch_lock:
+        _active_samplers -= 1
+        if _active_samplers == 0:
+            sys.setswitchinterval(_original_switch_interval)
+
+
+# Set while a request is profiled; worker threads see it through the context FastAPI copies to them
+_current_profile = contextvars.ContextVar("current_profile", default=None)
+
+
+def _frame_label(code):
+    path = code.co_filename
+    if path.startswith(_PROJECT_ROOT):
+        path = os.path.relpath(path, _PROJECT_ROOT)
+    elif "site-packages" in path:
+        path = path.split("site-packages" + os.sep, 1)[1]
+    else:
+        path = os.path.basename(path)
+    return f"{code.co_name} ({path}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """
+    Counts the stacks of busy threads until stopped. thread_filter(thread_id,
+    frame) picks the threads that belong to what is profiled; by default all do.
+    """
+
+    def __init__(self, interval_ms=PROFILE_INTERVAL_MS, thread_filter=None):
+        self.interval = interval_ms / 1000
+        self.thread_filter = thread_filter
+        self.stacks = Counter()
+        self.samples = 0
+        self._labels = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self.started = self.duration = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        # A busy thread keeps the GIL for up to the switch interval (5 ms by
+        # default); shorten it so the sampler gets to run at its own pace
+        _lower_switch_interval(self.interval)
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self.started
+        _restore_switch_interval()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in _IDLE_FUNCTIONS:
+                    continue
+                if self.thread_filter is not None and not self.thread_filter(thread_id, frame):
+                    continue
+                self.stacks[self._stack(frame)] += 1
+            self.samples += 1
+
+    def _stack(self, frame):
+        labels = []
+        while frame is not None:
+            code = frame.f_code
+            label = self._labels.get(code)
+            if label is None:
+                label = self._labels[code] = _frame_label(code)
+            labels.append(label)
+            frame = frame.f_back
+        return tuple(reversed(labels))
+
+    def folded(self):
+        """One "root;...;leaf count" line per distinct stack."""
+        return "\n".join(f"{';'.join(stack)} {count}" for stack, count in self.stacks.most_common())
+
+    def top(self, limit=PROFILE_TOP):
+        """Functions by self samples (running at the leaf) and by total samples (anywhere on the stack)."""
+        own, total = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for label in set(stack):
+                total[label] += count
+        busy = sum(self.stacks.values()) or 1
+
+        def rows(counter):
+            return [
+                {"function": label, "samples": count, "percent": round(count * 100 / busy, 1)}
+                for label, count in counter.most_common(limit)
+            ]
+        return {"self": rows(own), "total": rows(total)}
+
+    def report(self, limit=PROFILE_TOP):
+        return {
+            "duration_ms": round(self.duration * 1000, 1),
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "busy_samples": sum(self.stacks.values()),
+            "top": self.top(limit),
+        }
+
+    def report_text(self, limit=PROFILE_TOP):
+        report = self.report(limit)
+        lines = [
+            f"Profile: {report['duration_ms']} ms, {report['busy_samples']} busy samples "
+            f"every {report['interval_ms']} ms"
+        ]
+        for title, key in (("self", "self"), ("total (including callees)", "total")):
+            lines.append(f"\nTop functions by {title}:")
+            lines.extend(f"  {row['percent']:5.1f}%  {row['samples']:6}  {row['function']}" for row in report["top"][key])
+        return "\n".join(lines)
+
+
+def _runs_for(profile, frame):
+    """Whether a worker thread is running a call made by the profiled request."""
+    # anyio worker threads call context.run(func, *args) with the context copied
+    # from the request's task; that frame's locals hold the context
+    while frame is not None:
+        if frame.f_code.co_name == "run":
+            context = frame.f_locals.get("context")
+            if isinstance(context, contextvars.Context):
+                return context.get(_current_profile) is profile
+        frame = frame.f_back
+    return False
+
+
+def add_profile_argument(parser):
+    parser.add_argument(
+        "--profile", nargs="?", const="-", metavar="FILE",
+        help="sample the run and print where the time went; with FILE also write the folded stacks there"
+    )
+
+
+def run_profiled(function, output=None):
+    """Runs function, sampling it when output is given ("-" prints the report only)."""
+    if output is None:
+        return function()
+    with StackSampler() as sampler:
+        result = function()
+    print(sampler.report_text())
+    if output != "-":
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(sampler.folded() + "\n")
+        print(f"Folded stacks written to {output}")
+    return result
+
+
+def _requested_format(scope):
+    """None, "top" or "folded", from ?profile= or the X-Profile header."""
+    value = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("profile", [None])[0]
+    if value is None:
+        for name, header in scope["headers"]:
+            if name == b"x-profile":
+                value = header.decode("latin-1")
+                break
+    if value is None or value.strip().lower() in ("", "0", "false", "no", "off"):
+        return None
+    return "folded" if value.strip().lower() == "folded" else "top"
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware that profiles the requests that ask for it. authorize is an
+    async callable that gets the bearer token and tells whether its user may profile.
+    """
+
+    def __init__(self, app, authorize):
+        self.app = app
+        self.authorize = authorize
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not PROFILING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        output = _requested_format(scope)
+        if output is None:
+            await self.app(scope, receive, send)
+            return
+
+        authorization = dict(scope["headers"]).get(b"authorization", b"").decode("latin-1")
+        scheme, _, token = authorization.partition(" ")
+        if scheme.lower() != "bearer" or not token or not await self.authorize(token):
+            await self._respond(send, 403, "application/json", json.dumps({"detail": "Only administrators can profile requests"}))
+            return
+
+        profile = object()
+        loop_thread = threading.get_ident()
+        response = {"status": 500, "body": []}
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                response["body"].append(message.get("body", b""))
+
+        def belongs_to_request(thread_id, frame):
+            return thread_id == loop_thread or _runs_for(profile, frame)
+
+        token = _current_profile.set(profile)
+        sampler = StackSampler(thread_filter=belongs_to_request)
+        sampler.start()
+        try:
+            await self.app(scope, receive, capture)
+        finally:
+            sampler.stop()
+            _current_profile.reset(token)
+
+        headers = [(b"x-profiled-status", str(response["status"]).encode())]
+        if output == "folded":
+            await self._respond(send, 200, "text/plain; charset=utf-8", sampler.folded(), headers)
+            return
+        report = sampler.report()
+        report.update({
+            "request": f"{scope['method']} {scope['path']}",
+            "status": response["status"],
+            "response_bytes": sum(len(chunk) for chunk in response["body"]),
+        })
+        await self._respond(send, 200, "application/json", json.dumps(report), headers)
+
+    @staticmethod
+    async def _respond(send, status, content_type, body, headers=()):
+        body = body.encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", content_type.encode()), (b"content-length", str(len(body)).encode()), *headers],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,75 @@
+"""
+Prebuilt statements for the queries that run on almost every request.
+
+Each statement is built once at import time with named bind parameters, so a
+request only supplies the values: session.execute(CARD_BY_ID, {"card_id": 5}).
+Building a fresh db.query(...).filter(...) on every call costs more Python time
+than the query itself on small lookups; reusing the same statement object also
+reuses its cache key and the compiled SQL. Works with sync and async sessions.
+"""
+from sqlalchemy import and_, bindparam, or_, select
+from sqlalchemy.orm import joinedload
+
+from .. import models
+
+# A PersonOfCustomer by username. Params: username
+PERSON_BY_USERNAME = select(models.PersonOfCustomer)\
+    .where(models.PersonOfCustomer.user == bindparam("username"))\
+    .limit(1)
+
+# Token issue and refresh: the user with the code of their client. Params: username
+PRINCIPAL_BY_USERNAME = select(models.PersonOfCustomer, models.Cliente.code)\
+    .outerjoin(models.Cliente, models.Cliente.id == models.PersonOfCustomer.cliente_id)\
+    .where(models.PersonOfCustomer.user == bindparam("username"))\
+    .limit(1)
+
+# get_current_user with the principal cache off: the current token version, one row per
+# revocation that can cover the token (none: NULLs). Params: username, session_id, now
+TOKEN_STATE_BY_USERNAME = select(
+        models.PersonOfCustomer.token_version,
+        models.RevokedToken.session_id, models.RevokedToken.user, models.RevokedToken.revoked_at,
+        models.RevokedToken.revoked_at_ms
+    )\
+    .outerjoin(models.RevokedToken, and_(
+        models.RevokedToken.expires_at > bindparam("now"),
+        or_(
+            models.RevokedToken.session_id == bindparam("session_id"),
+            and_(models.RevokedToken.user == models.PersonOfCustomer.user, models.RevokedToken.session_id.is_(None))
+        )
+    ))\
+    .where(models.PersonOfCustomer.user == bindparam("username"))
+
+# get_current_user: the revocations still in force. Params: now
+REVOKED_TOKENS = select(
+        models.RevokedToken.session_id, models.RevokedToken.user, models.RevokedToken.revoked_at,
+        models.RevokedToken.revoked_at_ms
+    )\
+    .where(models.RevokedToken.expires_at > bindparam("now"))
+
+# Card routes: one ticket by internalId. Params: card_id
+CARD_BY_ID = select(models.Card)\
+    .where(models.Card.internalId == bindparam("card_id"))\
+    .limit(1)
+
+# read_card: one ticket with its client loaded in the same query. Params: card_id
+CARD_WITH_CLIENTE_BY_ID = select(models.Card)\
+    .options(joinedload(models.Card.cliente))\
+    .where(models.Card.internalId == bindparam("card_id"))\
+    .limit(1)
+
+# create_actividad: client lookup by internalId. Params: cliente_id
+CLIENTE_BY_ID = select(models.Cliente)\
+    .where(models.Cliente.id == bindparam("cliente_id"))\
+    .limit(1)
+
+# create_actividad: fallback client lookup by Code. Params: code
+CLIENTE_BY_CODE = select(models.Cliente)\
+    .where(models.Cliente.code == bindparam("code"))\
+    .limit(1)
+
+# create_actividad: same-day activities of a user for the overlap check. Params: username, day
+ACTIVITIES_OF_USER_ON = select(models.Actividad)\
+    .where(
+        models.Actividad.user == bindparam("username"),
+        models.Actividad.fecha_creacion == bindparam("day")
+    )
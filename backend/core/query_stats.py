@@ -0,0 +1,75 @@
+"""
+Per-request SQL statistics: statement count, database time and repeated
+statement shapes.
+
+Cursor events on every Engine add each statement to the QueryStats of the
+current context, if one is active. The middleware in main.py opens one per
+request; scripts and benchmarks can use track_queries() the same way.
+"""
+import os
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DB_QUERY_STATS = os.getenv("DB_QUERY_STATS", "true").strip().lower() in ("1", "true", "yes", "on")
+# Same statement run more than this many times in one request is reported as a likely N+1
+DB_N_PLUS_ONE_THRESHOLD = int(os.getenv("DB_N_PLUS_ONE_THRESHOLD", 5))
+
+_current_stats = ContextVar("query_stats", default=None)
+
+
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter() # SQL text with placeholders -> executions
+
+    def record(self, statement, seconds):
+        self.count += 1
+        self.duration += seconds
+        self.shapes[statement] += 1
+
+    def repeated(self, threshold=DB_N_PLUS_ONE_THRESHOLD):
+        """Statement shapes run more than threshold times, most frequent first."""
+        return [(shape, runs) for shape, runs in self.shapes.most_common() if runs > threshold]
+
+    def server_timing(self):
+        return f'db;dur={self.duration * 1000:.1f};desc="{self.count} queries"'
+
+
+@contextmanager
+def track_queries():
+    """Collects the statements run in this context (and the tasks and threads it starts)."""
+    stats = QueryStats()
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_timer(conn, cursor, statement, parameters, context, executemany):
+    if _current_stats.get() is not None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _record_query(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_stats.get()
+    started = conn.info.get("query_started")
+    if stats is not None and started:
+        stats.record(statement, time.perf_counter() - started.pop())
+
+
+@event.listens_for(Engine, "handle_error")
+def _drop_timer(exception_context):
+    # A failed statement never reaches after_cursor_execute
+    conn = exception_context.connection
+    started = conn.info.get("query_started") if conn is not None else None
+    if started:
+        started.pop()
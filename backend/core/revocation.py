@@ -0,0 +1,121 @@
+"""
+Token revocation: logout, "log out all sessions" and deactivated users.
+
+Every token of one login shares a session id, the sid claim, kept when the
+refresh token is rotated. Logging out stores that sid in RevokedTokens;
+logging out everywhere, or an admin deactivating or deleting the user, stores
+a row without sid that refuses every token of the user issued up to then
+(by the iat_ms claim, the issue time in milliseconds: iat has whole seconds,
+too coarse to tell a new login from the tokens revoked in the same second). Each row expires with the last token it can cover, the
+refresh token lifetime, and expired rows are deleted as new ones are added.
+
+get_current_user and /api/token/refresh check the current rows through a
+Revocations snapshot: a set of sids and a dict of per-user cutoffs, so a check
+is two hash lookups. The snapshot is kept per worker by the principal cache,
+loaded with one query and dropped on every worker when a revocation commits.
+"""
+import calendar
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .. import models
+from . import principal_cache, queries
+
+
+class Revocations:
+    """The revocations in force, loaded from the RevokedTokens rows."""
+    __slots__ = ("sessions", "users")
+
+    def __init__(self, rows=()):
+        self.sessions = set()
+        self.users = {} # username -> newest cutoff, as a Unix timestamp in milliseconds
+        for session_id, username, revoked_at, revoked_at_ms in rows:
+            if session_id:
+                self.sessions.add(session_id)
+            else:
+                # Rows from before revoked_at_ms cover their whole second
+                cutoff = revoked_at_ms if revoked_at_ms is not None else to_ms(revoked_at.replace(microsecond=999000))
+                self.users[username] = max(cutoff, self.users.get(username, cutoff))
+
+    def revokes(self, claims):
+        """Whether the token with these claims has been revoked."""
+        if claims.get("sid") in self.sessions:
+            return True
+        cutoff = self.users.get(claims.get("sub"))
+        if cutoff is None:
+            return False
+        issued_ms = claims.get("iat_ms")
+        if issued_ms is None:
+            # Tokens without iat_ms have whole-second iat; without iat, they predate revocation
+            issued_ms = claims.get("iat", 0) * 1000
+        return issued_ms <= cutoff
+
+
+def to_ms(moment):
+    """A naive UTC datetime as milliseconds since the epoch."""
+    return calendar.timegm(moment.utctimetuple()) * 1000 + moment.microsecond // 1000
+
+
+async def current_revocations(db: AsyncSession):
+    """The Revocations in force, from the principal cache or loaded with one query."""
+    revocations, generation = principal_cache.cache.snapshot("revocations")
+    if revocations is None:
+        result = await db.execute(queries.REVOKED_TOKENS, {"now": datetime.utcnow()})
+        revocations = Revocations(result.all())
+        principal_cache.cache.store_snapshot("revocations", revocations, generation)
+    return revocations
+
+
+def _prune(db, now):
+    db.execute(delete(models.RevokedToken).where(models.RevokedToken.expires_at <= now))
+
+
+def revoke_session(db: Session, username, session_id, lifetime: timedelta):
+    """Revokes the tokens of one login. The caller commits."""
+    now = datetime.utcnow()
+    _prune(db, now)
+    if db.query(models.RevokedToken.id).filter(models.RevokedToken.session_id == session_id).first() is None:
+        db.add(models.RevokedToken(session_id=session_id, user=username, revoked_at=now, expires_at=now + lifetime))
+
+
+def revoke_user(db: Session, username, lifetime: timedelta):
+    """Revokes every token of the user issued until now. The caller commits."""
+    now = datetime.utcnow()
+    _prune(db, now)
+    db.add(models.RevokedToken(user=username, revoked_at=now, revoked_at_ms=to_ms(now), expires_at=now + lifetime))
+
+
+async def use_refresh_token(db: AsyncSession, claims, lifetime: timedelta, grace: timedelta):
+    """
+    Records the refresh token with these claims as used. Returns whether it
+    may be traded: a token used before is accepted again within grace of its
+    first use (two requests of one client refreshing at once), and past that
+    its login session is revoked. The caller commits.
+    """
+    now = datetime.utcnow()
+    await db.execute(delete(models.UsedRefreshToken).where(models.UsedRefreshToken.expires_at <= now))
+    try:
+        # The primary key makes two concurrent uses of one token collide here
+        await db.execute(insert(models.UsedRefreshToken).values(
+            jti=claims["jti"], session_id=claims.get("sid"), used_at=now,
+            expires_at=datetime.utcfromtimestamp(claims["exp"])
+        ))
+    except IntegrityError:
+        # A new transaction, so the first use is visible once it has committed
+        await db.rollback()
+        result = await db.execute(
+            select(models.UsedRefreshToken.used_at).where(models.UsedRefreshToken.jti == claims["jti"])
+        )
+        used_at = result.scalar()
+        if used_at is not None and now - used_at <= grace:
+            return True
+        if claims.get("sid"):
+            await db.run_sync(revoke_session, claims["sub"], claims["sid"], lifetime)
+        else:
+            await db.run_sync(revoke_user, claims["sub"], lifetime)
+        return False
+    return True
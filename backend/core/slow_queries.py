@@ -0,0 +1,125 @@
+"""
+Slow-query log.
+
+Every statement that runs longer than DB_SLOW_QUERY_MS, on any engine, is
+written to a rotating file (one JSON object per line) with its parameters,
+duration, the route or script that ran it and the plan the database reports
+for it right then (EXPLAIN on MySQL, EXPLAIN QUERY PLAN on SQLite).
+"""
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", 500)) # 0 disables the log
+DB_SLOW_QUERY_LOG = os.getenv("DB_SLOW_QUERY_LOG", os.path.join("logs", "slow_queries.log"))
+DB_SLOW_QUERY_LOG_MAX_BYTES = int(os.getenv("DB_SLOW_QUERY_LOG_MAX_BYTES", 10 * 1024 * 1024))
+DB_SLOW_QUERY_LOG_BACKUPS = int(os.getenv("DB_SLOW_QUERY_LOG_BACKUPS", 5))
+DB_SLOW_QUERY_EXPLAIN = os.getenv("DB_SLOW_QUERY_EXPLAIN", "true").strip().lower() in ("1", "true", "yes", "on")
+
+# Route ("GET /api/cards/") or script name that issued the statements of this context
+_query_origin = ContextVar("query_origin", default=None)
+
+_logger = None
+_logger_lock = threading.Lock()
+
+
+def _get_logger():
+    """The file handler is opened on the first slow query, not at import."""
+    global _logger
+    with _logger_lock:
+        if _logger is not None:
+            return _logger
+        os.makedirs(os.path.dirname(os.path.abspath(DB_SLOW_QUERY_LOG)), exist_ok=True)
+        handler = RotatingFileHandler(
+            DB_SLOW_QUERY_LOG, maxBytes=DB_SLOW_QUERY_LOG_MAX_BYTES, backupCount=DB_SLOW_QUERY_LOG_BACKUPS, encoding="utf-8"
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger = logging.getLogger("flowdesk.slow_queries")
+        logger.setLevel(logging.INFO)
+        logger.addHandler(handler)
+        logger.propagate = False
+        _logger = logger
+        return _logger
+
+
+def query_origin():
+    return _query_origin.get() or os.path.basename(sys.argv[0]) or "python"
+
+
+class QueryOriginMiddleware:
+    """ASGI middleware that tags the statements of each request with its method and path."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = _query_origin.set(f"{scope['method']} {scope['path']}")
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _query_origin.reset(token)
+
+
+def _explain(conn, statement, parameters):
+    """Plan of the statement on the same connection. Only SELECTs are explained."""
+    if not statement.lstrip().upper().startswith(("SELECT", "WITH")):
+        return None
+    prefix = "EXPLAIN QUERY PLAN" if conn.dialect.name == "sqlite" else "EXPLAIN"
+    explain_cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        explain_cursor.execute(f"{prefix} {statement}", parameters)
+        columns = [column[0] for column in explain_cursor.description]
+        return [dict(zip(columns, row)) for row in explain_cursor.fetchall()]
+    except Exception as e:
+        return f"EXPLAIN failed: {e}"
+    finally:
+        explain_cursor.close()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_timer(conn, cursor, statement, parameters, context, executemany):
+    if DB_SLOW_QUERY_MS > 0:
+        conn.info.setdefault("slow_query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _log_if_slow(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("slow_query_started")
+    if not started:
+        return
+    duration_ms = (time.perf_counter() - started.pop()) * 1000
+    if duration_ms < DB_SLOW_QUERY_MS:
+        return
+
+    entry = {
+        "timestamp": datetime.utcnow().isoformat(),
+        "duration_ms": round(duration_ms, 1),
+        "origin": query_origin(),
+        "database": conn.dialect.name,
+        "statement": statement,
+        "parameters": repr(parameters)[:2000],
+        "executemany": executemany,
+    }
+    if DB_SLOW_QUERY_EXPLAIN and not executemany:
+        entry["plan"] = _explain(conn, statement, parameters)
+    _get_logger().info(json.dumps(entry, default=str))
+
+
+@event.listens_for(Engine, "handle_error")
+def _drop_timer(exception_context):
+    conn = exception_context.connection
+    started = conn.info.get("slow_query_started") if conn is not None else None
+    if started:
+        started.pop()
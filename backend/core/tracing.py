@@ -0,0 +1,291 @@
+"""
+Request tracing with OpenTelemetry.
+
+Each API request becomes a trace: a server span named after the route
+template, with a child span per SQL statement and per step of an SMTP send,
+so the time of a slow request can be split between the database, the mail
+server and Python. The automation scripts open one root span per run and the
+Flask frontend forwards its trace to the API in the W3C traceparent header.
+
+Spans are written as JSON lines to a local file by default; no collector is
+needed. TRACING_EXPORTER=otlp sends them to a local OpenTelemetry collector
+instead (OTEL_EXPORTER_OTLP_ENDPOINT, http://localhost:4318 by default),
+which needs opentelemetry-exporter-otlp-proto-http.
+
+OpenTelemetry is optional: without opentelemetry-sdk, or with
+TRACING_ENABLED off (the default), every helper here does nothing.
+
+Settings:
+    TRACING_ENABLED        turn tracing on (false)
+    TRACING_EXPORTER       file (default) or otlp
+    TRACING_FILE           JSON lines file for the file exporter (logs/traces.jsonl)
+    TRACING_SAMPLE_RATIO   fraction of new traces recorded; a sampled parent is always followed (1.0)
+    TRACING_SQL            a span per SQL statement (true)
+"""
+import contextlib
+import inspect
+import json
+import logging
+import os
+import threading
+from functools import wraps
+
+try:
+    from opentelemetry import context as otel_context, propagate, trace
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, SpanExporter, SpanExportResult
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+    from opentelemetry.trace import SpanKind, Status, StatusCode
+except ImportError: # The API and the scripts run the same without tracing
+    trace = None
+    SpanExporter = object
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "false").strip().lower() in ("1", "true", "yes", "on")
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "file").strip().lower()
+TRACING_FILE = os.getenv("TRACING_FILE", os.path.join("logs", "traces.jsonl"))
+TRACING_SAMPLE_RATIO = float(os.getenv("TRACING_SAMPLE_RATIO", 1.0))
+TRACING_SQL = os.getenv("TRACING_SQL", "true").strip().lower() in ("1", "true", "yes", "on")
+
+# SQL text stored on a span is cut to this length
+MAX_STATEMENT_LENGTH = 2000
+
+logger = logging.getLogger(__name__)
+
+_tracer = None
+_setup_lock = threading.Lock()
+
+
+class JsonLinesSpanExporter(SpanExporter):
+    """Appends each finished span as one JSON object per line."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def export(self, spans):
+        lines = [json.dumps(span_to_dict(span), default=str, ensure_ascii=False) for span in spans]
+        try:
+            with self._lock, open(self.path, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+        except OSError:
+            return SpanExportResult.FAILURE
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        pass
+
+
+def span_to_dict(span):
+    context = span.get_span_context()
+    return {
+        "trace_id": format(context.trace_id, "032x"),
+        "span_id": format(context.span_id, "016x"),
+        "parent_id": format(span.parent.span_id, "016x") if span.parent else None,
+        "name": span.name,
+        "kind": span.kind.name,
+        "service": span.resource.attributes.get("service.name"),
+        "start_ns": span.start_time,
+        "duration_ms": round((span.end_time - span.start_time) / 1e6, 3),
+        "status": span.status.status_code.name,
+        "attributes": dict(span.attributes or {}),
+        "events": [{"name": event.name, "attributes": dict(event.attributes or {})} for event in span.events],
+    }
+
+
+def _build_exporter():
+    if TRACING_EXPORTER == "otlp":
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        except ImportError:
+            logger.warning("TRACING_EXPORTER=otlp needs opentelemetry-exporter-otlp-proto-http; writing to %s", TRACING_FILE)
+        else:
+            return OTLPSpanExporter()
+    return JsonLinesSpanExporter(TRACING_FILE)
+
+
+def setup_tracing(service_name, sql=True):
+    """
+    Installs the tracer provider once per process; later calls do nothing. With
+    sql=False no SQLAlchemy listeners are registered (the Flask frontend has no database).
+    Returns whether tracing is on.
+    """
+    global _tracer
+    if not TRACING_ENABLED or trace is None:
+        return False
+    with _setup_lock:
+        if _tracer is not None:
+            return True
+        provider = TracerProvider(
+            resource=Resource.create({"service.name": service_name}),
+            sampler=ParentBased(TraceIdRatioBased(TRACING_SAMPLE_RATIO)),
+        )
+        provider.add_span_processor(BatchSpanProcessor(_build_exporter()))
+        trace.set_tracer_provider(provider)
+        _tracer = trace.get_tracer("flowdesk")
+        if sql and TRACING_SQL:
+            _instrument_sqlalchemy()
+    return True
+
+
+def current_trace_id():
+    """Hex id of the trace in progress, or None; used to tie log lines to traces."""
+    if _tracer is None:
+        return None
+    context = trace.get_current_span().get_span_context()
+    return format(context.trace_id, "032x") if context.is_valid else None
+
+
+@contextlib.contextmanager
+def span(name, kind=None, attributes=None):
+    """Child span of the current one (or a new trace). Yields None when tracing is off."""
+    if _tracer is None:
+        yield None
+        return
+    with _tracer.start_as_current_span(name, kind=kind or SpanKind.INTERNAL, attributes=attributes) as current:
+        yield current
+
+
+def traced_run(script):
+    """Decorator for the main function of an automation script: one trace per run."""
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            setup_tracing(f"flowdesk-{script}")
+            with span(f"automation {script}", attributes={"automation.script": script}):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def inject_headers(headers):
+    """Adds the traceparent of the current span to an outgoing request's headers."""
+    if _tracer is not None:
+        propagate.inject(headers)
+    return headers
+
+
+def start_server_span(name, headers, attributes=None):
+    """
+    Opens a server span that continues the trace in the incoming headers and
+    makes it current. For frameworks without an ASGI entry point (Flask);
+    close it with end_server_span. Returns None when tracing is off.
+    """
+    if _tracer is None:
+        return None
+    current = _tracer.start_span(
+        name, context=propagate.extract(headers), kind=SpanKind.SERVER, attributes=attributes
+    )
+    token = otel_context.attach(trace.set_span_in_context(current))
+    return current, token
+
+
+def end_server_span(handle, status_code=None, error=None):
+    if handle is None:
+        return
+    current, token = handle
+    if status_code is not None:
+        current.set_attribute("http.response.status_code", status_code)
+    if error is not None:
+        current.record_exception(error)
+        current.set_status(Status(StatusCode.ERROR, str(error)))
+    elif status_code is not None and status_code >= 500:
+        current.set_status(Status(StatusCode.ERROR))
+    otel_context.detach(token)
+    current.end()
+
+
+def fastapi_options(fastapi_class):
+    """
+    Keyword arguments for FastAPI(): releases with built-in OpenTelemetry would
+    open a second server span (and their own metrics and logs) next to
+    TracingMiddleware's, so theirs is turned off where the option exists.
+    """
+    if "telemetry" not in inspect.signature(fastapi_class).parameters:
+        return {}
+    return {"telemetry": {"tracing": False, "metrics": False, "logs": False, "operation_spans": False}}
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware that opens the server span of each request, continuing the
+    trace of the caller's traceparent header. The span is renamed to the route
+    template once routing has run, so /api/cards/1 and /api/cards/2 group together.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or _tracer is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = {name.decode("latin-1"): value.decode("latin-1") for name, value in scope["headers"]}
+        method = scope["method"]
+        attributes = {"http.request.method": method, "url.path": scope["path"]}
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        with _tracer.start_as_current_span(
+            f"{method} {scope['path']}", context=propagate.extract(headers), kind=SpanKind.SERVER,
+            attributes=attributes,
+        ) as current:
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                route = scope.get("route")
+                if route is not None:
+                    current.update_name(f"{method} {route.path}")
+                    current.set_attribute("http.route", route.path)
+                current.set_attribute("http.response.status_code", status_code)
+                if status_code >= 500:
+                    current.set_status(Status(StatusCode.ERROR))
+
+
+def _instrument_sqlalchemy():
+    """A client span per statement, only inside a trace so pool checks and stray queries add nothing."""
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    @event.listens_for(Engine, "before_cursor_execute")
+    def _start_sql_span(conn, cursor, statement, parameters, context, executemany):
+        if not trace.get_current_span().get_span_context().is_valid:
+            return
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "SQL"
+        sql_span = _tracer.start_span(
+            f"{operation} {conn.dialect.name}", kind=SpanKind.CLIENT,
+            attributes={
+                "db.system": conn.dialect.name,
+                "db.operation": operation,
+                "db.statement": statement[:MAX_STATEMENT_LENGTH],
+                "db.executemany": executemany,
+            },
+        )
+        conn.info.setdefault("trace_spans", []).append(sql_span)
+
+    @event.listens_for(Engine, "after_cursor_execute")
+    def _end_sql_span(conn, cursor, statement, parameters, context, executemany):
+        spans = conn.info.get("trace_spans")
+        if spans:
+            sql_span = spans.pop()
+            if cursor.rowcount is not None and cursor.rowcount >= 0:
+                sql_span.set_attribute("db.rowcount", cursor.rowcount)
+            sql_span.end()
+
+    @event.listens_for(Engine, "handle_error")
+    def _fail_sql_span(exception_context):
+        conn = exception_context.connection
+        spans = conn.info.get("trace_spans") if conn is not None else None
+        if spans:
+            sql_span = spans.pop()
+            sql_span.record_exception(exception_context.original_exception)
+            sql_span.set_status(Status(StatusCode.ERROR, str(exception_context.original_exception)))
+            sql_span.end()
+        return None
@@ -1,7 +1,12 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, make_url
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool, StaticPool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 import os # Import os to access environment variables
+import threading
+import time
 
 # Load environment variables from .env.local file if it exists (for local development)
 try:
@@ -17,9 +22,277 @@ DB_HOST = os.getenv("DB_HOST", "localhost")
 DB_PORT = int(os.getenv("DB_PORT", 3306)) # Ensure port is an integer
 DB_NAME = os.getenv("DB_NAME", "innovaweb")
 
-SQLALCHEMY_DATABASE_URL = f"mysql+mysqlconnector://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# A full URL in DATABASE_URL takes precedence over the DB_* settings. Use
+# sqlite:////var/lib/flowdesk/flowdesk.db to run on a single box without a
+# database server, or sqlite:// for an in-memory database (tests, benchmarks).
+DATABASE_URL = os.getenv("DATABASE_URL") or None
+SQLALCHEMY_DATABASE_URL = DATABASE_URL or f"mysql+mysqlconnector://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+# Non-blocking driver of each supported backend, used by the async def routes
+_ASYNC_DRIVERS = {"mysql": "aiomysql", "sqlite": "aiosqlite"}
+
+def _async_url(url):
+    """Same database as url through the non-blocking driver of its backend."""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    return url.set(drivername=f"{backend}+{_ASYNC_DRIVERS[backend]}").render_as_string(hide_password=False)
+
+ASYNC_SQLALCHEMY_DATABASE_URL = _async_url(SQLALCHEMY_DATABASE_URL)
+# Optional read replica for reports, list endpoints and the read phase of the
+# automation scripts. When unset, reads go to the primary.
+DB_REPLICA_URL = os.getenv("DB_REPLICA_URL") or None
+
+def _env_bool(name, default):
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+# Connection pool tuning. MySQL closes idle connections after wait_timeout
+# (8h by default), so connections are recycled well before that and pinged
+# on checkout to survive the overnight idle period.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30)) # Seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800)) # Seconds before a connection is replaced
+DB_POOL_PRE_PING = _env_bool("DB_POOL_PRE_PING", True)
+# Longest a single SELECT may run on interactive connections (0 disables).
+# Applied only in the API process (see enable_request_timeouts): the scripts in
+# automatizaciones/ share these engines and read whole tables.
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 10000))
+
+# Reporting traffic gets its own, smaller pool (a bulkhead) so slow reports
+# can never take the connections the ticket desk needs, and a longer budget.
+DB_REPORT_POOL_SIZE = int(os.getenv("DB_REPORT_POOL_SIZE", 3))
+DB_REPORT_MAX_OVERFLOW = int(os.getenv("DB_REPORT_MAX_OVERFLOW", 2))
+DB_REPORT_POOL_TIMEOUT = int(os.getenv("DB_REPORT_POOL_TIMEOUT", 5))
+DB_REPORT_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_REPORT_STATEMENT_TIMEOUT_MS", 30000))
+
+# SQLite tuning, applied to every new connection. WAL lets the API read while
+# a script writes; busy_timeout makes a writer wait for the lock instead of
+# failing at once with "database is locked".
+DB_SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("DB_SQLITE_BUSY_TIMEOUT_MS", 5000))
+DB_SQLITE_CACHE_KB = int(os.getenv("DB_SQLITE_CACHE_KB", 65536)) # Page cache per connection
+DB_SQLITE_MMAP_BYTES = int(os.getenv("DB_SQLITE_MMAP_BYTES", 268435456))
+
+# Server error codes for a SELECT cut off by the statement timeout
+_STATEMENT_TIMEOUT_ERRNOS = {
+    3024, # MySQL: maximum statement execution time exceeded
+    1969, # MariaDB: max_statement_time exceeded
+}
+
+
+class PoolWaitStats:
+    """Thread-safe counters for the time spent waiting on a pool checkout."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, seconds, timed_out=False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.total_wait += seconds
+            if seconds > self.max_wait:
+                self.max_wait = seconds
+
+    def snapshot(self):
+        with self._lock:
+            attempts = self.checkouts + self.timeouts
+            return {
+                "checkouts_total": self.checkouts,
+                "checkout_timeouts_total": self.timeouts,
+                "wait_seconds_total": round(self.total_wait, 6),
+                "wait_seconds_avg": round(self.total_wait / attempts, 6) if attempts else 0.0,
+                "wait_seconds_max": round(self.max_wait, 6),
+            }
+
+
+class _TimedPoolMixin:
+    """Records how long each checkout waited for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = PoolWaitStats()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except Exception:
+            self.wait_stats.record(time.perf_counter() - start, timed_out=True)
+            raise
+        self.wait_stats.record(time.perf_counter() - start)
+        return conn
+
+
+class TimedQueuePool(_TimedPoolMixin, QueuePool):
+    pass
+
+
+class TimedAsyncAdaptedQueuePool(_TimedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def _pool_options():
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+def is_sqlite(url):
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def _sqlite_memory_url(url):
+    """
+    In-memory SQLite URLs are rewritten to one named shared-cache database,
+    so the sync, async and reporting engines of the process see the same data
+    instead of a private empty database per connection.
+    """
+    url = make_url(url)
+    if url.get_backend_name() != "sqlite" or url.database not in (None, "", ":memory:"):
+        return url
+    return url.set(database="file:flowdesk_memory", query={"mode": "memory", "cache": "shared", "uri": "true"})
+
+
+def configure_sqlite(db_engine):
+    """Sets the WAL journal and the tuning pragmas on every new SQLite connection."""
+    sync_engine = getattr(db_engine, "sync_engine", db_engine)
+    in_memory = sync_engine.url.query.get("mode") == "memory"
+
+    @event.listens_for(sync_engine, "connect")
+    def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if not in_memory:
+            cursor.execute("PRAGMA journal_mode = WAL")
+            cursor.execute("PRAGMA synchronous = NORMAL") # Durable with WAL, without an fsync per commit
+            cursor.execute(f"PRAGMA mmap_size = {DB_SQLITE_MMAP_BYTES}")
+        cursor.execute(f"PRAGMA busy_timeout = {DB_SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA cache_size = -{DB_SQLITE_CACHE_KB}")
+        cursor.execute("PRAGMA temp_store = MEMORY")
+        cursor.execute("PRAGMA foreign_keys = ON") # Enforced like InnoDB does
+        cursor.close()
+
+
+def _engine_options(url, poolclass, overrides):
+    """
+    Pool settings for url, with overrides applied. An in-memory SQLite database
+    lives in one shared connection, so pool sizing does not apply to it.
+    """
+    if url.query.get("mode") == "memory":
+        return {"poolclass": StaticPool, "connect_args": {"check_same_thread": False}}
+    return {"poolclass": poolclass, **_pool_options(), **overrides}
+
+
+_request_timeouts_enabled = False
+
+
+def enable_request_timeouts():
+    """
+    Turns on DB_STATEMENT_TIMEOUT_MS for the connections the shared engines
+    open from now on. The API calls it before serving; the scripts do not, so
+    their long reads are never cut off.
+    """
+    global _request_timeouts_enabled
+    _request_timeouts_enabled = True
+
+
+def set_statement_timeout(db_engine, timeout_ms):
+    """
+    Caps SELECT execution time on every new connection of the engine. None
+    means the request timeout, DB_STATEMENT_TIMEOUT_MS, once
+    enable_request_timeouts() has been called.
+    MySQL/MariaDB only: SQLite has no server-side limit, so it is not applied there.
+    """
+    sync_engine = getattr(db_engine, "sync_engine", db_engine)
+    request_timeout = timeout_ms is None
+    if sync_engine.dialect.name != "mysql" or not (DB_STATEMENT_TIMEOUT_MS if request_timeout else timeout_ms):
+        return
+
+    @event.listens_for(sync_engine, "connect")
+    def _apply_statement_timeout(dbapi_connection, connection_record):
+        if request_timeout and not _request_timeouts_enabled:
+            return
+        timeout = DB_STATEMENT_TIMEOUT_MS if request_timeout else timeout_ms
+        cursor = dbapi_connection.cursor()
+        if sync_engine.dialect.is_mariadb:
+            cursor.execute(f"SET SESSION max_statement_time = {timeout / 1000:.3f}")
+        else:
+            cursor.execute(f"SET SESSION max_execution_time = {int(timeout)}")
+        cursor.close()
+
+
+def is_statement_timeout(exc):
+    """True if a database error was raised because the statement timeout cut the query off."""
+    orig = getattr(exc, "orig", exc)
+    errno = getattr(orig, "errno", None)
+    if errno is None and getattr(orig, "args", None):
+        errno = orig.args[0]
+    return errno in _STATEMENT_TIMEOUT_ERRNOS
+
+
+def create_db_engine(url=None, statement_timeout_ms=None, **overrides):
+    """
+    Builds an engine with the pool settings from the environment.
+    Used by the API and by the scripts in automatizaciones/ so every
+    process shares the same tuning. Keyword arguments override the defaults;
+    statement_timeout_ms=None is the API-only request timeout.
+    """
+    url = _sqlite_memory_url(url or SQLALCHEMY_DATABASE_URL)
+    options = _engine_options(url, TimedQueuePool, overrides)
+    db_engine = create_engine(url, **options)
+    if is_sqlite(url):
+        configure_sqlite(db_engine)
+    set_statement_timeout(db_engine, statement_timeout_ms)
+    return db_engine
+
+
+def create_async_db_engine(url=None, statement_timeout_ms=None, **overrides):
+    """Async counterpart of create_db_engine, with the same pool settings."""
+    url = _sqlite_memory_url(url or ASYNC_SQLALCHEMY_DATABASE_URL)
+    options = _engine_options(url, TimedAsyncAdaptedQueuePool, overrides)
+    db_engine = create_async_engine(url, **options)
+    if is_sqlite(url):
+        configure_sqlite(db_engine)
+    set_statement_timeout(db_engine, statement_timeout_ms)
+    return db_engine
+
+
+def get_pool_status(db_engine=None):
+    """Returns live usage figures for the connection pool of an engine."""
+    db_engine = db_engine or engine
+    # AsyncEngine keeps its pool on the wrapped sync engine
+    pool = getattr(db_engine, "sync_engine", db_engine).pool
+    status = {
+        "pool_class": type(pool).__name__,
+        "pool_size": pool.size() if hasattr(pool, "size") else None,
+        "checked_out": pool.checkedout() if hasattr(pool, "checkedout") else None,
+        "checked_in": pool.checkedin() if hasattr(pool, "checkedin") else None,
+        # QueuePool.overflow() is negative until the base pool is full
+        "overflow": max(pool.overflow(), 0) if hasattr(pool, "overflow") else None,
+        "max_overflow": getattr(pool, "_max_overflow", None),
+        "timeout": pool.timeout() if hasattr(pool, "timeout") else None,
+        "recycle": getattr(pool, "_recycle", None),
+        "pre_ping": getattr(pool, "_pre_ping", None),
+    }
+    wait_stats = getattr(pool, "wait_stats", None)
+    if wait_stats is not None:
+        status.update(wait_stats.snapshot())
+    return status
+
+
+engine = create_db_engine()
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -32,3 +305,72 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# Read replica routing. A ReadReplicaSession sends queries to the replica until
+# it writes something; from then on every statement goes to the primary, so a
+# request (or script) that writes and then reads sees its own changes.
+read_engine = create_db_engine(DB_REPLICA_URL) if DB_REPLICA_URL else engine
+
+
+class ReadReplicaSession(Session):
+    """Session that reads from the replica and switches to the primary once it writes."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.use_primary = read_engine is engine
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if isinstance(clause, UpdateBase):
+            self.use_primary = True
+        return engine if self.use_primary else read_engine
+
+
+@event.listens_for(ReadReplicaSession, "before_flush")
+def _route_to_primary_on_write(session, flush_context, instances):
+    session.use_primary = True
+
+
+ReadSessionLocal = sessionmaker(class_=ReadReplicaSession, autocommit=False, autoflush=False)
+
+# Reporting bulkhead: its own pool against the replica (or the primary when
+# there is no replica) with the longer reporting statement timeout.
+report_engine = create_db_engine(
+    DB_REPLICA_URL,
+    statement_timeout_ms=DB_REPORT_STATEMENT_TIMEOUT_MS,
+    pool_size=DB_REPORT_POOL_SIZE,
+    max_overflow=DB_REPORT_MAX_OVERFLOW,
+    pool_timeout=DB_REPORT_POOL_TIMEOUT,
+)
+
+ReportSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=report_engine)
+
+# Dependency to get a session that reads from the replica when one is configured
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+# Dependency to get a session from the reporting pool
+def get_report_db():
+    db = ReportSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+# Non-blocking engine for the async def routes. expire_on_commit is off so
+# objects stay readable after commit without another round trip.
+async_engine = create_async_db_engine()
+
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+# Dependency to get an async DB session
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# Statements slower than DB_SLOW_QUERY_MS on any engine, in the API and in the
+# automation scripts alike, are written to the slow-query log
+from .core import slow_queries # noqa: E402
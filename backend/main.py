@@ -1,8 +1,30 @@
-from fastapi import FastAPI
+import gc
+import time
+_import_started = time.perf_counter()
+# Importing the routers and models allocates hundreds of thousands of objects
+# that live as long as the worker; collecting garbage in the middle of that
+# only re-scans them (a fifth of the import time). Collection is turned back
+# on at the end of this module.
+gc.disable()
+
+import logging
+import threading
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy.exc import DBAPIError, TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import configure_mappers
 from starlette.middleware.sessions import SessionMiddleware # Import SessionMiddleware
 import os # Import os for secret key
-from .database import engine, Base
+from .database import engine, is_statement_timeout, enable_request_timeouts, AsyncSessionLocal
+from .migrate import create_schema, upgrade
+from .core.query_stats import track_queries, DB_QUERY_STATS, DB_N_PLUS_ONE_THRESHOLD
+from .core import metrics, passwords
+from .core.slow_queries import QueryOriginMiddleware
+from .core.logging_config import setup_logging
+from .core.tracing import setup_tracing, fastapi_options, TracingMiddleware
+from .core.profiling import ProfilingMiddleware
 from . import models
 from .api import (
     clientes_api, 
@@ -20,18 +42,74 @@ from .api import (
     department_manager_api, 
     attention_flow_api,
     boards_api,
-    reports_api
+    reports_api,
+    monitoring_api,
+    changes_api
 )
 
-# This line creates the database tables based on your models
-# It will run every time the application starts.
-# For a real application, you'd use a migration tool like Alembic.
-Base.metadata.create_all(bind=engine)
+setup_logging()
+setup_tracing("flowdesk-api")
+enable_request_timeouts() # Only the API's pools get DB_STATEMENT_TIMEOUT_MS
+logger = logging.getLogger(__name__)
+
+# Creating the tables and applying pending migrations on every start costs a
+# few round trips per table, so it can be turned off once the schema is managed
+# with `python -m backend.migrate`.
+DB_AUTO_CREATE_SCHEMA = os.getenv("DB_AUTO_CREATE_SCHEMA", "true").strip().lower() in ("1", "true", "yes", "on")
+
+def migrate_schema():
+    """
+    Creates the missing tables and applies the pending migrations: create_all
+    alone never adds the columns later migrations put on existing tables.
+    """
+    try:
+        create_schema(engine)
+        applied = upgrade(engine)
+    except DBAPIError:
+        # Workers starting together can apply the same migration at once; the
+        # second pass sees the other worker's work and has nothing left to do
+        logger.warning("Schema migration failed, retrying once", exc_info=True)
+        create_schema(engine)
+        applied = upgrade(engine)
+    if applied:
+        logger.info("Applied schema migrations %s", applied)
+
+def _warm_routers(app: FastAPI):
+    started = time.perf_counter()
+    app.openapi()
+    app.state.startup_timings["warm_routers_seconds"] = round(time.perf_counter() - started, 4)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Runs the startup phases once per worker and records how long each took."""
+    timings = app.state.startup_timings
+
+    phase_started = time.perf_counter()
+    if DB_AUTO_CREATE_SCHEMA:
+        migrate_schema()
+    timings["schema_seconds"] = round(time.perf_counter() - phase_started, 4)
+
+    phase_started = time.perf_counter()
+    configure_mappers()
+    timings["mappers_seconds"] = round(time.perf_counter() - phase_started, 4)
+
+    timings["total_seconds"] = round(sum(timings.values()), 4)
+    logger.info("Startup finished", extra={"timings": timings})
+
+    # Building the OpenAPI schema walks every route and model. It is not needed
+    # to serve, so it is built after the worker is ready instead of delaying
+    # it or the first request to /docs.
+    threading.Thread(target=_warm_routers, args=(app,), name="warm-routers", daemon=True).start()
+    yield
+    passwords.shutdown()
+    metrics.mark_process_dead()
 
 app = FastAPI(
     title="Innova Tickets API",
     description="API para el sistema de tickets de Innova S.A.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    **fastapi_options(FastAPI)
 )
 
 origins = [
@@ -58,11 +136,96 @@ app.add_middleware(
 # Add SessionMiddleware
 app.add_middleware(SessionMiddleware, secret_key=os.urandom(32)) # Generate a random secret key
 
+# Tags the statements of each request with its route for the slow-query log
+app.add_middleware(QueryOriginMiddleware)
+
+@app.middleware("http")
+async def metrics_middleware(request: Request, call_next):
+    """Per-route latency, requests in flight and pool usage for /metrics."""
+    in_progress = metrics.HTTP_REQUESTS_IN_PROGRESS.labels(request.method)
+    in_progress.inc()
+    started = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        in_progress.dec()
+        # The template path keeps the label set small (/api/cards/{card_id}, not one per id)
+        route = request.scope.get("route")
+        metrics.HTTP_REQUEST_DURATION.labels(
+            request.method, getattr(route, "path", "unmatched"), str(status_code)
+        ).observe(time.perf_counter() - started)
+        if metrics.MULTIPROCESS:
+            metrics.update_pool_metrics()
+
+@app.middleware("http")
+async def query_stats_middleware(request: Request, call_next):
+    """
+    Counts the SQL statements and database time of each request, reports them
+    in the Server-Timing header and warns when one statement repeats per row.
+    """
+    if not DB_QUERY_STATS:
+        return await call_next(request)
+
+    started = time.perf_counter()
+    with track_queries() as stats:
+        response = await call_next(request)
+    total_ms = (time.perf_counter() - started) * 1000
+    response.headers["Server-Timing"] = f"{stats.server_timing()}, app;dur={total_ms:.1f}"
+
+    route = request.scope.get("route")
+    for statement, runs in stats.repeated(DB_N_PLUS_ONE_THRESHOLD):
+        logger.warning(
+            "possible N+1 in %s %s: %d runs of: %s",
+            request.method, getattr(route, 'path', request.url.path), runs, ' '.join(statement.split())[:300]
+        )
+    return response
+
+async def can_profile(token: str) -> bool:
+    """Only administrators may ask for a request profile (?profile=1)."""
+    async with AsyncSessionLocal() as db:
+        user = await users_api.resolve_token_user(token, db)
+    return user is not None and user.roll == '1'
+
+app.add_middleware(ProfilingMiddleware, authorize=can_profile)
+
+# Added after the other middlewares so it is the outermost one and its span
+# covers all of them
+app.add_middleware(TracingMiddleware)
+
+@app.exception_handler(DBAPIError)
+async def database_error_handler(request: Request, exc: DBAPIError):
+    """A query cut off by its statement timeout means the server is busy, not broken."""
+    if is_statement_timeout(exc):
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "The query exceeded its time budget. Narrow the filters (e.g. a date range) and try again."},
+            headers={"Retry-After": "30"}
+        )
+    raise exc
+
+@app.exception_handler(PoolTimeoutError)
+async def pool_timeout_handler(request: Request, exc: PoolTimeoutError):
+    """No connection became free in time; the pool for this kind of traffic is saturated."""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "The database is busy. Please try again shortly."},
+        headers={"Retry-After": "10"}
+    )
+
 @app.get("/health", tags=["Monitoring"])
 async def health_check():
     """Simple health check endpoint."""
     return {"status": "ok"}
 
+@app.get("/metrics", tags=["Monitoring"], include_in_schema=False)
+def prometheus_metrics():
+    """Prometheus scrape endpoint, aggregated over all workers in multiprocess mode."""
+    body, content_type = metrics.render_metrics()
+    return Response(content=body, media_type=content_type)
+
 app.include_router(auth_api.router)
 app.include_router(users_api.router)
 app.include_router(clientes_api.router)
@@ -79,6 +242,8 @@ app.include_router(department_manager_api.router)
 app.include_router(attention_flow_api.router)
 app.include_router(boards_api.router)
 app.include_router(reports_api.router)
+app.include_router(monitoring_api.router)
+app.include_router(changes_api.router)
 
 @app.get("/debug/routes", tags=["Debug"])
 async def debug_routes():
@@ -92,8 +257,21 @@ async def debug_routes():
             })
     return {"routes": routes_list}
 
+@app.get("/debug/startup", tags=["Debug"])
+async def debug_startup():
+    """Time spent in each startup phase of this worker."""
+    return {"schema_created": DB_AUTO_CREATE_SCHEMA, "timings": app.state.startup_timings}
+
 @app.get("/debug-cors", tags=["Monitoring"])
 async def debug_cors():
     return {"allowed_origins": origins}
 
+# The objects created so far stay for the life of the worker: keep them out of
+# every later collection
+gc.freeze()
+gc.enable()
+
+# Module import (routers, models, engines) is the first startup phase
+app.state.startup_timings = {"import_seconds": round(time.perf_counter() - _import_started, 4)}
+
 # We will add more endpoints for tickets, users, etc. in the next steps.
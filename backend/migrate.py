@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Schema management command.
+
+Creates any missing tables from backend.models and applies the pending
+versioned migrations in backend/migrations, recording each one in the
+SchemaMigrations table. Run it on deploy and start the API with
+DB_AUTO_CREATE_SCHEMA=false so workers skip this on startup.
+
+Ejecución:
+  python -m backend.migrate              # create tables + apply pending migrations
+  python -m backend.migrate --status     # list applied and pending migrations
+  python -m backend.migrate --downgrade 0
+"""
+import argparse
+import time
+from datetime import datetime
+
+from sqlalchemy import Table, Column, Integer, String, DateTime, MetaData, select, delete, insert
+
+from .database import engine, Base
+from . import models # Registers the tables on Base.metadata
+from .migrations import MIGRATIONS
+
+schema_migrations = Table(
+    "SchemaMigrations", MetaData(),
+    Column("version", Integer, primary_key=True, autoincrement=False),
+    Column("description", String(200), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+def create_schema(db_engine=None):
+    """Creates the tables that do not exist yet. Existing tables are left untouched."""
+    Base.metadata.create_all(bind=db_engine or engine)
+
+
+def applied_versions(connection):
+    schema_migrations.create(connection, checkfirst=True)
+    return set(connection.execute(select(schema_migrations.c.version)).scalars())
+
+
+def upgrade(db_engine=None, target=None):
+    """Applies pending migrations up to target (all of them by default). Returns the versions applied."""
+    applied = []
+    with (db_engine or engine).begin() as connection:
+        done = applied_versions(connection)
+        for migration in MIGRATIONS:
+            if migration.VERSION in done or (target is not None and migration.VERSION > target):
+                continue
+            migration.upgrade(connection)
+            connection.execute(insert(schema_migrations).values(
+                version=migration.VERSION,
+                description=migration.DESCRIPTION,
+                applied_at=datetime.utcnow()
+            ))
+            applied.append(migration.VERSION)
+    return applied
+
+
+def downgrade(target, db_engine=None):
+    """Reverts applied migrations with a version above target, newest first."""
+    reverted = []
+    with (db_engine or engine).begin() as connection:
+        done = applied_versions(connection)
+        for migration in reversed(MIGRATIONS):
+            if migration.VERSION not in done or migration.VERSION <= target:
+                continue
+            migration.downgrade(connection)
+            connection.execute(delete(schema_migrations).where(schema_migrations.c.version == migration.VERSION))
+            reverted.append(migration.VERSION)
+    return reverted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create tables and apply schema migrations")
+    parser.add_argument("--status", action="store_true", help="Show applied and pending migrations")
+    parser.add_argument("--target", type=int, help="Upgrade only up to this version")
+    parser.add_argument("--downgrade", type=int, metavar="VERSION", help="Revert migrations above VERSION")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    if args.status:
+        with engine.begin() as connection:
+            done = applied_versions(connection)
+        for migration in MIGRATIONS:
+            state = "applied" if migration.VERSION in done else "pending"
+            print(f"{migration.VERSION:04d} {state:8} {migration.DESCRIPTION}")
+        return
+
+    if args.downgrade is not None:
+        reverted = downgrade(args.downgrade)
+        print(f"Reverted migrations: {reverted or 'none'} ({time.perf_counter() - started:.2f}s)")
+        return
+
+    create_schema()
+    applied = upgrade(target=args.target)
+    print(f"Schema up to date, applied migrations: {applied or 'none'} ({time.perf_counter() - started:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+"""
+Versioned schema migrations, applied in order by backend.migrate.
+
+Each module defines VERSION, DESCRIPTION, upgrade(connection) and
+downgrade(connection). Add new modules to MIGRATIONS with the next VERSION.
+"""
+from . import m0001_hot_path_indexes, m0002_token_version, m0003_revoked_tokens, m0004_user_deactivation, m0005_revocation_ms, m0006_used_refresh_tokens, m0007_refresh_token_used_at
+
+MIGRATIONS = [
+    m0001_hot_path_indexes,
+    m0002_token_version,
+    m0003_revoked_tokens,
+    m0004_user_deactivation,
+    m0005_revocation_ms,
+    m0006_used_refresh_tokens,
+    m0007_refresh_token_used_at,
+]
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Indexes for the hot filter and join columns.
+
+Each index is built for the predicates of a specific query:
+  Cards (CustCode, State)            cards_api.read_cards for client users, with or without the
+                                     Status filter; InnoDB appends the primary key, so the
+                                     ORDER BY internalId DESC is served by the index too.
+                                     Also clientes_api.read_clientes and the additional-hours report.
+  Cards (State)                      read_cards for staff filtering by Status.
+  Cards (state_last_changed_date, State)
+                                     check_escalations: range on the idle cutoff, with the
+                                     State NOT IN filter checked from the index.
+  Cards (Assign)                     tickets by assignee.
+  Activity (User, TransDate)         create_actividad same-day overlap check, read_actividades,
+                                     get_global_activities filtered by consultant.
+  Activity (CustCode, TransDate)     get_global_activities and support_hours by client,
+                                     check_support_hours.
+  Activity (CardId)                  joins from activities to tickets, additional-hours report.
+  Activity (TransDate)               get_global_activities filtered only by date range.
+  CardsEventRow (masterId)           comments of a ticket.
+  PersonOfCustomer (reset_token)     reset_password.
+  DepartmentManagerRow (Department)  create_card auto-assignment by module department.
+
+Cards.LinkTrello, used by the Trello sync, is already indexed by its unique constraint.
+Indexes that already exist under another name with the same leading columns are skipped.
+"""
+
+from .operations import create_index, drop_index
+
+VERSION = 1
+DESCRIPTION = "Hot path indexes for cards, activities and lookups"
+
+INDEXES = [
+    ("ix_cards_custcode_state", "Cards", ["CustCode", "State"]),
+    ("ix_cards_state", "Cards", ["State"]),
+    ("ix_cards_state_changed", "Cards", ["state_last_changed_date", "State"]),
+    ("ix_cards_assign", "Cards", ["Assign"]),
+    ("ix_activity_user_transdate", "Activity", ["User", "TransDate"]),
+    ("ix_activity_custcode_transdate", "Activity", ["CustCode", "TransDate"]),
+    ("ix_activity_cardid", "Activity", ["CardId"]),
+    ("ix_activity_transdate", "Activity", ["TransDate"]),
+    ("ix_cardseventrow_masterid", "CardsEventRow", ["masterId"]),
+    ("ix_personofcustomer_reset_token", "PersonOfCustomer", ["reset_token"]),
+    ("ix_departmentmanagerrow_department", "DepartmentManagerRow", ["Department"]),
+]
+
+
+def upgrade(connection):
+    for index_name, table_name, columns in INDEXES:
+        create_index(connection, index_name, table_name, columns)
+
+
+def downgrade(connection):
+    for index_name, table_name, _columns in reversed(INDEXES):
+        drop_index(connection, index_name, table_name)
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+"""
+PersonOfCustomer.token_version, the counter carried by access tokens.
+
+Access tokens hold the user's roll, customer, status and verification as
+signed claims. Changing any of them bumps the counter, and tokens issued with
+an older value are refused until the client renews them. Existing users start
+at 0.
+"""
+from sqlalchemy import Column, Integer
+
+from .operations import add_column, drop_column
+
+VERSION = 2
+DESCRIPTION = "Token version counter for users"
+
+
+def upgrade(connection):
+    add_column(connection, "PersonOfCustomer", Column("token_version", Integer, nullable=False, server_default="0"))
+
+
+def downgrade(connection):
+    drop_column(connection, "PersonOfCustomer", "token_version")
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""
+RevokedTokens, the denylist behind logout and "log out all sessions".
+
+One row per revoked login session (by the sid claim) or per user whose tokens
+issued so far are all revoked. Rows are useless once expires_at has passed
+and are deleted as new revocations come in.
+"""
+from sqlalchemy import Column, DateTime, Index, Integer, MetaData, String, Table
+
+VERSION = 3
+DESCRIPTION = "Revoked tokens table"
+
+
+def _table():
+    return Table(
+        "RevokedTokens", MetaData(),
+        Column("id", Integer, primary_key=True, autoincrement=True),
+        Column("session_id", String(32), nullable=True, unique=True),
+        Column("user", String(50), nullable=False),
+        Column("revoked_at", DateTime, nullable=False),
+        Column("expires_at", DateTime, nullable=False),
+        Index("ix_RevokedTokens_user", "user"),
+        Index("ix_RevokedTokens_expires_at", "expires_at"),
+    )
+
+
+def upgrade(connection):
+    _table().create(connection, checkfirst=True)
+
+
+def downgrade(connection):
+    _table().drop(connection, checkfirst=True)
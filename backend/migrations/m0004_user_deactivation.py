@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+"""
+PersonOfCustomer.deactivated_at, set when an admin deactivates a user.
+
+Status 0 is also the status of a registration waiting for activation, so it
+cannot tell a deactivated user apart from a pending one. Login and token
+refresh are refused while deactivated_at is set. Existing users start active.
+"""
+from sqlalchemy import Column, DateTime
+
+from .operations import add_column, drop_column
+
+VERSION = 4
+DESCRIPTION = "Deactivation timestamp for users"
+
+
+def upgrade(connection):
+    add_column(connection, "PersonOfCustomer", Column("deactivated_at", DateTime, nullable=True))
+
+
+def downgrade(connection):
+    drop_column(connection, "PersonOfCustomer", "deactivated_at")
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+"""
+RevokedTokens.revoked_at_ms, the revocation time in milliseconds.
+
+DATETIME columns keep whole seconds on MySQL, so a token issued in the same
+second as a "log out all sessions" could not be told apart from the tokens it
+revokes. Tokens carry their issue time in milliseconds (iat_ms) and are
+compared with this column; rows from before it keep the whole-second check.
+"""
+from sqlalchemy import BigInteger, Column
+
+from .operations import add_column, drop_column
+
+VERSION = 5
+DESCRIPTION = "Millisecond revocation time"
+
+
+def upgrade(connection):
+    add_column(connection, "RevokedTokens", Column("revoked_at_ms", BigInteger, nullable=True))
+
+
+def downgrade(connection):
+    drop_column(connection, "RevokedTokens", "revoked_at_ms")
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""
+UsedRefreshTokens, the refresh tokens already traded for new ones.
+
+/api/token/refresh records the jti claim of every refresh token it accepts.
+A refresh token that comes back a second time was copied, so its login
+session is revoked. Rows are useless once the token has expired and are
+deleted as new ones come in.
+"""
+from sqlalchemy import Column, DateTime, Index, MetaData, String, Table
+
+VERSION = 6
+DESCRIPTION = "Used refresh tokens table"
+
+
+def _table():
+    return Table(
+        "UsedRefreshTokens", MetaData(),
+        Column("jti", String(32), primary_key=True),
+        Column("session_id", String(32), nullable=True),
+        Column("expires_at", DateTime, nullable=False),
+        Index("ix_UsedRefreshTokens_expires_at", "expires_at"),
+    )
+
+
+def upgrade(connection):
+    _table().create(connection, checkfirst=True)
+
+
+def downgrade(connection):
+    _table().drop(connection, checkfirst=True)
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+"""
+UsedRefreshTokens.used_at, when the refresh token was first traded.
+
+Two requests of the same browser (two tabs, a quick navigation) can present
+the same refresh token at once. A second use shortly after the first is
+accepted instead of revoking the session; used_at tells how long ago the first
+one was. Rows from before it count as outside that window.
+"""
+from sqlalchemy import Column, DateTime
+
+from .operations import add_column, drop_column
+
+VERSION = 7
+DESCRIPTION = "First use time of refresh tokens"
+
+
+def upgrade(connection):
+    add_column(connection, "UsedRefreshTokens", Column("used_at", DateTime, nullable=True))
+
+
+def downgrade(connection):
+    drop_column(connection, "UsedRefreshTokens", "used_at")
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""Schema operations shared by the migration modules."""
+from sqlalchemy import inspect, text, MetaData, Table, Index
+
+
+def index_exists(connection, table_name, index_name, columns=None):
+    """
+    True if the table has an index with this name or, when columns are given,
+    any index whose leading columns are exactly those columns.
+    """
+    for index in inspect(connection).get_indexes(table_name):
+        if index["name"] == index_name:
+            return True
+        if columns and list(index["column_names"][:len(columns)]) == list(columns):
+            return True
+    return False
+
+
+def create_index(connection, index_name, table_name, columns):
+    """Creates the index unless an equivalent one is already there. Returns True if created."""
+    if index_exists(connection, table_name, index_name, columns):
+        return False
+    table = Table(table_name, MetaData(), autoload_with=connection)
+    Index(index_name, *[table.c[column] for column in columns]).create(connection)
+    return True
+
+
+def drop_index(connection, index_name, table_name):
+    """Drops the index if it exists. Returns True if dropped."""
+    if not index_exists(connection, table_name, index_name):
+        return False
+    table = Table(table_name, MetaData(), autoload_with=connection)
+    index = next(index for index in table.indexes if index.name == index_name)
+    index.drop(connection)
+    return True
+
+
+def column_exists(connection, table_name, column_name):
+    return any(column["name"] == column_name for column in inspect(connection).get_columns(table_name))
+
+
+def add_column(connection, table_name, column):
+    """Adds the column unless the table already has it. Returns True if added."""
+    if column_exists(connection, table_name, column.name):
+        return False
+    preparer = connection.dialect.identifier_preparer
+    ddl = f"ALTER TABLE {preparer.quote(table_name)} ADD COLUMN {preparer.quote(column.name)} " \
+          f"{column.type.compile(dialect=connection.dialect)}"
+    if column.server_default is not None:
+        ddl += f" DEFAULT {column.server_default.arg}"
+    if not column.nullable:
+        ddl += " NOT NULL"
+    connection.execute(text(ddl))
+    return True
+
+
+def drop_column(connection, table_name, column_name):
+    """Drops the column if it exists. Returns True if dropped."""
+    if not column_exists(connection, table_name, column_name):
+        return False
+    preparer = connection.dialect.identifier_preparer
+    connection.execute(text(f"ALTER TABLE {preparer.quote(table_name)} DROP COLUMN {preparer.quote(column_name)}"))
+    return True
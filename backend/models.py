@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Date, Time, ForeignKey, Float, Boolean, DateTime
+from sqlalchemy import Column, Integer, BigInteger, String, Text, Date, Time, ForeignKey, Float, Boolean, DateTime, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from .database import Base
@@ -40,6 +40,13 @@ class Proyecto(Base):
 
 class Actividad(Base):
     __tablename__ = "Activity"
+    # Hot path indexes, added to existing databases by migration 0001
+    __table_args__ = (
+        Index("ix_activity_user_transdate", "User", "TransDate"),
+        Index("ix_activity_custcode_transdate", "CustCode", "TransDate"),
+        Index("ix_activity_cardid", "CardId"),
+        Index("ix_activity_transdate", "TransDate"),
+    )
     id = Column("internalId", Integer, primary_key=True, index=True)
     titulo = Column("Comment", String(100))
     descripcion = Column("Detail", Text)
@@ -66,6 +73,9 @@ class Actividad(Base):
 
 class PersonOfCustomer(Base):
     __tablename__ = "PersonOfCustomer"
+    __table_args__ = (
+        Index("ix_personofcustomer_reset_token", "reset_token"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     user = Column(String(50), unique=True, index=True, nullable=False)
     gmail = Column(String(100), unique=True, index=True)
@@ -79,9 +89,17 @@ class PersonOfCustomer(Base):
     reset_token_expires = Column(DateTime, nullable=True)
     status = Column(Integer, nullable=True, default=0)
     customername = Column(String(255), nullable=True)
+    token_version = Column(Integer, nullable=False, default=0, server_default="0") # Bumped when a token claim changes
+    deactivated_at = Column(DateTime, nullable=True) # Set by an admin; status 0 alone is a pending registration
 
 class Card(Base):
     __tablename__ = "Cards"
+    __table_args__ = (
+        Index("ix_cards_custcode_state", "CustCode", "State"),
+        Index("ix_cards_state", "State"),
+        Index("ix_cards_state_changed", "state_last_changed_date", "State"),
+        Index("ix_cards_assign", "Assign"),
+    )
     internalId = Column(Integer, primary_key=True, autoincrement=True)
     Status = Column(Integer, nullable=True)
     Code = Column(String(30), nullable=True)
@@ -202,6 +220,9 @@ class TicketAttachment(Base):
 
 class CardsEventRow(Base):
     __tablename__ = "CardsEventRow"
+    __table_args__ = (
+        Index("ix_cardseventrow_masterid", "masterId"),
+    )
     id = Column("internalId", Integer, primary_key=True, index=True)
     master_id = Column("masterId", Integer, ForeignKey("Cards.internalId"))
     comment = Column("Comment", Text)
@@ -242,6 +263,9 @@ class DepartmentManager(Base):
 
 class DepartmentManagerRow(Base):
     __tablename__ = "DepartmentManagerRow"
+    __table_args__ = (
+        Index("ix_departmentmanagerrow_department", "Department"),
+    )
     id = Column("internalId", Integer, primary_key=True, index=True)
     master_id = Column("masterId", Integer, ForeignKey("DepartmentManager.internalId"))
     department = Column("Department", String(100), nullable=False)
@@ -295,4 +319,60 @@ class BoardListRow(Base):
     OpenStatus = Column(Integer, nullable=True)
     State = Column(String(20), nullable=True)
     Name = Column(String(200), nullable=True)
-    board = relationship("Board", back_populates="lists")
\ No newline at end of file
+    board = relationship("Board", back_populates="lists")
+
+class ChangeLog(Base):
+    """Append-only log of committed changes to the tracked tables, written by core/changes.py."""
+    __tablename__ = "ChangeLog"
+    __table_args__ = (
+        Index("ix_changelog_table_id", "TableName", "internalId"),
+    )
+    # The id is the cursor of GET /api/changes. SQLite only autoincrements INTEGER keys.
+    id = Column("internalId", BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    table_name = Column("TableName", String(50), nullable=False)
+    row_id = Column("RowId", Integer, nullable=False)
+    operation = Column("Operation", String(10), nullable=False) # insert, update or delete
+    changed_columns = Column("ChangedColumns", Text, nullable=True) # JSON list of column names
+    data = Column("Data", Text, nullable=True) # JSON of the row values known to the session
+    changed_at = Column("ChangedAt", DateTime, nullable=False)
+
+class ChangeLogSequence(Base):
+    """
+    A single row that orders ChangeLog writes: each committing transaction
+    bumps it before writing its entries and holds its row lock until commit.
+    """
+    __tablename__ = "ChangeLogSequence"
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    value = Column(BigInteger().with_variant(Integer, "sqlite"), nullable=False, default=0)
+
+class RevokedToken(Base):
+    """
+    Tokens refused before they expire: those of one login session (session_id
+    set, as on logout) or every token of the user issued up to revoked_at
+    (session_id null). Rows can be deleted once expires_at has passed.
+    """
+    __tablename__ = "RevokedTokens"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    session_id = Column(String(32), nullable=True, unique=True) # sid claim of the tokens of one login
+    user = Column(String(50), nullable=False, index=True)
+    revoked_at = Column(DateTime, nullable=False)
+    revoked_at_ms = Column(BigInteger, nullable=True) # revoked_at in milliseconds, compared with the iat_ms claim
+    expires_at = Column(DateTime, nullable=False, index=True) # When the last token it covers expires
+
+class UsedRefreshToken(Base):
+    """
+    Refresh tokens already traded for new ones, by their jti claim. A second
+    use of one after the reuse grace period revokes its login session. Rows
+    can be deleted once expires_at has passed.
+    """
+    __tablename__ = "UsedRefreshTokens"
+    jti = Column(String(32), primary_key=True)
+    session_id = Column(String(32), nullable=True) # sid claim of the refresh token
+    used_at = Column(DateTime, nullable=True) # First use; a second one soon after is not a replay
+    expires_at = Column(DateTime, nullable=False, index=True) # When the refresh token expires
+
+# Registers the session event that fills ChangeLog, so every process that
+# uses the models (API and automation scripts) records its changes.
+from .core import changes # noqa: E402
+# Same for the listener that evicts changed users from the principal cache
+from .core import principal_cache # noqa: E402
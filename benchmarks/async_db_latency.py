@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Concurrent request latency for async def routes: blocking driver vs async driver.
+
+Mounts two versions of the same endpoint on a throwaway FastAPI app:
+  /blocking  async def route running the query through the sync Session
+             (how bulk_insert_attendance, login_for_access_token, etc. used to work)
+  /async     async def route running the query through get_async_db
+While a burst of those requests is in flight, /ping requests measure how long
+any other request in the same worker has to wait.
+
+The query is a MySQL SELECT SLEEP(delay) so the database wait is explicit;
+it needs a MySQL/MariaDB DATABASE_URL (SQLite has no SLEEP).
+
+Ejecución: python -m benchmarks.async_db_latency --concurrency 50 --db-delay 0.05
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from backend.database import async_engine, engine, get_async_db, get_db
+
+SLEEP_SQL = text("SELECT SLEEP(:delay)")
+
+
+def build_app(db_delay):
+    app = FastAPI()
+
+    @app.get("/blocking")
+    async def blocking_route(db: Session = Depends(get_db)):
+        db.execute(SLEEP_SQL, {"delay": db_delay})
+        return {}
+
+    @app.get("/async")
+    async def async_route(db: AsyncSession = Depends(get_async_db)):
+        await db.execute(SLEEP_SQL, {"delay": db_delay})
+        return {}
+
+    @app.get("/ping")
+    async def ping():
+        return {}
+
+    return app
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def timed_get(client, path):
+    start = time.perf_counter()
+    response = await client.get(path)
+    response.raise_for_status()
+    return time.perf_counter() - start
+
+
+async def run_scenario(app, path, concurrency):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await timed_get(client, path)  # Warm up the pool
+        start = time.perf_counter()
+        db_calls = [asyncio.create_task(timed_get(client, path)) for _ in range(concurrency)]
+        await asyncio.sleep(0)
+        ping_calls = [asyncio.create_task(timed_get(client, "/ping")) for _ in range(concurrency)]
+        db_latencies = await asyncio.gather(*db_calls)
+        ping_latencies = await asyncio.gather(*ping_calls)
+        wall = time.perf_counter() - start
+    # aiomysql connections are bound to this event loop
+    await async_engine.dispose()
+
+    return {
+        "route": path,
+        "concurrency": concurrency,
+        "wall_seconds": round(wall, 4),
+        "db_route_p50_ms": round(statistics.median(db_latencies) * 1000, 2),
+        "db_route_p95_ms": round(percentile(db_latencies, 95) * 1000, 2),
+        "ping_p50_ms": round(statistics.median(ping_latencies) * 1000, 2),
+        "ping_p95_ms": round(percentile(ping_latencies, 95) * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--db-delay", type=float, default=0.05, help="Seconds each query waits in MySQL")
+    args = parser.parse_args()
+
+    if engine.dialect.name != "mysql":
+        sys.exit(f"This benchmark needs MySQL/MariaDB, the configured database is {engine.dialect.name}")
+
+    app = build_app(args.db_delay)
+    results = {
+        "before": asyncio.run(run_scenario(app, "/blocking", args.concurrency)),
+        "after": asyncio.run(run_scenario(app, "/async", args.concurrency)),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
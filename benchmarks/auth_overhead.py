@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Cost of authenticating one request, with and without the principal cache.
+
+Against the database in DATABASE_URL (filled by benchmarks.data_generator),
+times the pieces of get_current_user in process: decoding the JWT alone,
+resolving the token with the cache off (one query for the token version and
+revocations each time) and with the cache warm. It then calls /api/monitoring/db-pool, a route that
+runs no query of its own, through TestClient with the cache off and on, so the
+difference is the auth overhead as a client sees it.
+
+Ejecución: DATABASE_URL=sqlite:///bench.db python -m benchmarks.auth_overhead --runs 2000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from fastapi.testclient import TestClient
+from jose import jwt
+
+from backend.api.auth_api import ALGORITHM, SECRET_KEY
+from backend.api.users_api import resolve_token_user
+from backend.core import principal_cache
+from backend.database import AsyncSessionLocal, async_engine
+from backend.main import app
+from benchmarks.data_generator import BENCHMARK_PASSWORD
+from benchmarks.suite import percentile
+
+
+def summarize(durations_us):
+    return (
+        f"p50 {percentile(durations_us, 0.50):9.1f} us  p95 {percentile(durations_us, 0.95):9.1f} us  "
+        f"mean {statistics.mean(durations_us):9.1f} us"
+    )
+
+
+async def time_resolution(token, runs, ttl_seconds):
+    """resolve_token_user as get_current_user calls it, a session per call."""
+    cache = principal_cache.cache
+    cache.ttl_seconds = ttl_seconds
+    cache.clear()
+    durations = []
+    try:
+        for _ in range(runs):
+            started = time.perf_counter()
+            async with AsyncSessionLocal() as db:
+                user = await resolve_token_user(token, db)
+            durations.append((time.perf_counter() - started) * 1e6)
+            if user is None:
+                raise RuntimeError("The benchmark token does not resolve to a user")
+    finally:
+        # Pooled connections belong to this event loop; TestClient runs its own
+        await async_engine.dispose()
+    return durations
+
+
+def time_decode(token, runs):
+    durations = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        durations.append((time.perf_counter() - started) * 1e6)
+    return durations
+
+
+def time_route(client, headers, runs):
+    durations = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        response = client.get("/api/monitoring/db-pool", headers=headers)
+        durations.append((time.perf_counter() - started) * 1e6)
+        response.raise_for_status()
+    return durations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the auth overhead per request with and without the principal cache")
+    parser.add_argument("--runs", type=int, default=2000, help="timed calls per case")
+    args = parser.parse_args()
+
+    cache = principal_cache.cache
+    ttl = cache.ttl_seconds or principal_cache.AUTH_CACHE_TTL_SECONDS or 30
+    with TestClient(app) as client:
+        response = client.post("/api/token", data={"username": "admin", "password": BENCHMARK_PASSWORD})
+        response.raise_for_status()
+        token = response.json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        print(f"{'jwt decode':28} {summarize(time_decode(token, args.runs))}")
+
+        print(f"{'resolve, cache off':28} {summarize(asyncio.run(time_resolution(token, args.runs, 0)))}")
+        route_off = time_route(client, headers, args.runs)
+
+        print(f"{'resolve, cache warm':28} {summarize(asyncio.run(time_resolution(token, args.runs, ttl)))}")
+        route_on = time_route(client, headers, args.runs)
+
+    print(f"{'db-pool route, cache off':28} {summarize(route_off)}")
+    print(f"{'db-pool route, cache on':28} {summarize(route_on)}")
+    saved = percentile(route_off, 0.50) - percentile(route_on, 0.50)
+    print(f"\nThe cache saves {saved:.1f} us per authenticated request at the median")
+
+
+if __name__ == "__main__":
+    main()
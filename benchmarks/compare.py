@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Compares two result files written by benchmarks.suite.
+
+Prints the p50 and p95 of every route and script in both files with the
+relative change, and exits with status 1 when any p50 got slower by more than
+--threshold percent (or any route runs more statements, or any script's
+peak RSS grew by more than --threshold percent), so it can gate a merge.
+
+Ejecución: python -m benchmarks.compare benchmarks/results/abc1234-....json benchmarks/results/def5678-....json
+"""
+import argparse
+import json
+import sys
+
+
+def change(before, after):
+    if not before:
+        return None
+    return (after - before) / before * 100
+
+
+def compare(baseline, candidate, threshold):
+    regressions = []
+    if baseline.get("dataset") != candidate.get("dataset"):
+        print(f"WARNING: different data sets\n  {baseline.get('dataset')}\n  {candidate.get('dataset')}")
+
+    print(f"{'case':28} {'p50 before':>11} {'p50 after':>11} {'change':>8} {'p95 before':>11} {'p95 after':>11} {'queries':>9}")
+    for section in ("routes", "scripts"):
+        for name, before in baseline.get(section, {}).items():
+            after = candidate.get(section, {}).get(name)
+            if after is None:
+                print(f"{name:28} missing in the second file")
+                continue
+            delta = change(before["p50_ms"], after["p50_ms"])
+            queries = ""
+            if "queries" in before or "queries" in after:
+                queries = f"{before.get('queries', '-')}->{after.get('queries', '-')}"
+            print(
+                f"{name:28} {before['p50_ms']:11.2f} {after['p50_ms']:11.2f} "
+                f"{(f'{delta:+.1f}%' if delta is not None else '-'):>8} "
+                f"{before['p95_ms']:11.2f} {after['p95_ms']:11.2f} {queries:>9}"
+            )
+            if delta is not None and delta > threshold:
+                regressions.append(f"{name}: p50 {delta:+.1f}%")
+            if after.get("queries", 0) > before.get("queries", after.get("queries", 0)):
+                regressions.append(f"{name}: {before['queries']} -> {after['queries']} queries")
+
+    memory_before, memory_after = baseline.get("memory", {}), candidate.get("memory", {})
+    if memory_before and memory_after:
+        print(f"\n{'script':28} {'peak RSS before':>16} {'peak RSS after':>15} {'change':>8}")
+    for name, before in memory_before.items():
+        after = memory_after.get(name)
+        if after is None:
+            continue
+        delta = change(before["peak_rss_mb"], after["peak_rss_mb"])
+        print(f"{name:28} {before['peak_rss_mb']:13.1f} MB {after['peak_rss_mb']:12.1f} MB {f'{delta:+.1f}%':>8}")
+        if delta is not None and delta > threshold:
+            regressions.append(f"{name}: peak RSS {delta:+.1f}%")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0, help="allowed p50 slowdown in percent")
+    args = parser.parse_args()
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.candidate, encoding="utf-8") as f:
+        candidate = json.load(f)
+
+    print(f"{baseline.get('commit')} ({baseline.get('timestamp')}) -> {candidate.get('commit')} ({candidate.get('timestamp')})\n")
+    regressions = compare(baseline, candidate, args.threshold)
+    if regressions:
+        print("\nRegressions:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print("\nNo regressions.")
+
+
+if __name__ == "__main__":
+    main()
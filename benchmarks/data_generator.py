@@ -0,0 +1,348 @@
+# -*- coding: utf-8 -*-
+"""
+Seeded data generator for the benchmarks.
+
+Fills an empty database through backend.models with a production-sized data
+set: at --scale 1, 2k customers, 200k cards, 2M activities, 5M check-in rows,
+600k comments and 20k attachments, plus the users, Trello boards and
+attention flow settings the routes and automation scripts need. The same
+--seed always produces the same rows, so results of two runs can be compared.
+
+Every user is created with the password in BENCHMARK_PASSWORD: "admin" is an
+administrator, "cons01".."cons40" are consultants (roll 3) and "client0001"..
+are client users, one per ten customers.
+
+Ejecución: DATABASE_URL=sqlite:///bench.db python -m benchmarks.data_generator --scale 0.01 --seed 42
+"""
+import argparse
+import json
+import random
+import time
+from datetime import date, datetime, time as dtime, timedelta
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session
+from werkzeug.security import generate_password_hash
+
+from backend import models
+from backend.database import engine
+from backend.migrate import create_schema
+
+BENCHMARK_PASSWORD = "bench"
+
+# Row counts at --scale 1
+FULL_SCALE = {
+    "customers": 2_000,
+    "cards": 200_000,
+    "activities": 2_000_000,
+    "checkins": 5_000_000,
+    "comments": 600_000,
+    "attachments": 20_000,
+}
+CONSULTANTS = 40
+EMPLOYEES = 850 # 4 marks a day each: 5M rows are about four years
+BOARDS_PER_100_CUSTOMERS = 1
+TRELLO_CARDS_PER_BOARD = 200
+
+# Activities and tickets are spread over the four years before this date
+END_DATE = date(2026, 1, 1)
+HISTORY_DAYS = 4 * 365
+BATCH_SIZE = 10_000
+
+CARD_STATES = ["Nuevo", "Pendiente", "En proceso", "En pruebas", "En espera de respuesta", "Cerrado"]
+CARD_STATE_WEIGHTS = [5, 8, 6, 4, 3, 74]
+PRIORITIES = ["Baja", "Media", "Alta", "Crítica"]
+PRIORITY_WEIGHTS = [40, 35, 20, 5]
+ADDITIONAL_STATUSES = [None, "Pendiente de Aprobacion", "Aprobado", "Rechazado"]
+ADDITIONAL_WEIGHTS = [85, 5, 8, 2]
+DEPARTMENTS = ["SOP", "DES", "CON", "INF"]
+WORDS = (
+    "error factura reporte cliente sistema acceso usuario pantalla pedido stock cierre asiento "
+    "impresora servidor respaldo licencia modulo ajuste consulta migracion permiso venta compra"
+).split()
+
+
+def scaled_counts(scale):
+    return {name: max(int(count * scale), 1) for name, count in FULL_SCALE.items()}
+
+
+def _text(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def _day(rng):
+    return END_DATE - timedelta(days=rng.randrange(HISTORY_DAYS))
+
+
+def _slot(rng):
+    """Start and end of an activity between 08:00 and 18:00, in 15 minute steps."""
+    start = rng.randrange(32, 70)
+    end = min(start + rng.randint(1, 16), 72)
+    return dtime(start // 4, start % 4 * 15), dtime(end // 4, end % 4 * 15)
+
+
+def _insert(session, model, rows):
+    """ORM bulk insert of plain dicts keyed by attribute name, one transaction per batch."""
+    for start in range(0, len(rows), BATCH_SIZE):
+        session.execute(insert(model), rows[start:start + BATCH_SIZE])
+        session.commit()
+
+
+def _insert_stream(session, model, row_iter, total):
+    batch = []
+    for row in row_iter:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            session.execute(insert(model), batch)
+            session.commit()
+            batch = []
+    if batch:
+        session.execute(insert(model), batch)
+        session.commit()
+    return total
+
+
+def generate(db_engine, scale=1.0, seed=42, log=print):
+    counts = scaled_counts(scale)
+    rng = random.Random(seed)
+    create_schema(db_engine)
+
+    with Session(db_engine) as session:
+        if session.scalar(select(func.count()).select_from(models.Cliente)):
+            raise RuntimeError("The database already has customers; the generator needs an empty one.")
+
+        def timed(label, fill):
+            started = time.perf_counter()
+            rows = fill()
+            log(f"{label}: {rows} rows in {time.perf_counter() - started:.1f}s")
+
+        # --- Customers and projects ---
+        customer_codes = [f"C{n:05d}" for n in range(1, counts["customers"] + 1)]
+
+        def fill_customers():
+            rows = [
+                {
+                    "id": n,
+                    "code": code,
+                    "nombre": f"Cliente {n}",
+                    "razon_social": f"Cliente {n} S.A.",
+                    "ruc": f"80{n:07d}-1",
+                    "contacto": f"Contacto {n}",
+                    "email": f"cliente{n}@example.com",
+                    "estado": "1" if rng.random() < 0.05 else "0", # Closed flag, as the API reads it
+                    "support_hours": rng.choice([0.0, 20.0, 40.0, 80.0, 160.0]),
+                    "support_hours_consumed": 0.0,
+                    "last_alert_level": 0.0,
+                    "encargados": None,
+                }
+                for n, code in enumerate(customer_codes, start=1)
+            ]
+            _insert(session, models.Cliente, rows)
+            return len(rows)
+
+        timed("customers", fill_customers)
+
+        project_count = max(counts["customers"] // 4, 1)
+
+        def fill_projects():
+            rows = [
+                {
+                    "id": n,
+                    "nombre": f"Proyecto {n}",
+                    "descripcion": _text(rng, 8),
+                    "fecha_inicio": _day(rng),
+                    "estado": rng.choice(["Activo", "Finalizado"]),
+                    "cliente_id": rng.randint(1, counts["customers"]),
+                }
+                for n in range(1, project_count + 1)
+            ]
+            _insert(session, models.Proyecto, rows)
+            return len(rows)
+
+        timed("projects", fill_projects)
+
+        # --- Users: one hash for everyone, hashing is not what is measured ---
+        password_hash = generate_password_hash(BENCHMARK_PASSWORD)
+        consultants = [f"cons{n:02d}" for n in range(1, CONSULTANTS + 1)]
+
+        def fill_users():
+            rows = [{"user": "admin", "gmail": "admin@example.com", "roll": "1"}]
+            rows += [{"user": name, "gmail": f"{name}@example.com", "roll": "3"} for name in consultants]
+            rows += [
+                {
+                    "user": f"client{n:04d}", "gmail": f"client{n:04d}@example.com", "roll": "2",
+                    "cliente_id": n, "customername": f"Cliente {n}",
+                }
+                for n in range(1, counts["customers"] + 1, 10)
+            ]
+            for row in rows:
+                row.update(hashed_password=password_hash, is_verified=True, status=1)
+            _insert(session, models.PersonOfCustomer, rows)
+            return len(rows)
+
+        timed("users", fill_users)
+
+        # --- Trello boards: half of each board's cards already have a ticket ---
+        board_count = max(counts["customers"] * BOARDS_PER_100_CUSTOMERS // 100, 1)
+        linked_urls = []
+
+        def fill_boards():
+            boards, lists, board_data = [], [], []
+            for n in range(1, board_count + 1):
+                board_id = f"board{n:04d}"
+                list_ids = [f"{board_id}-list{k}" for k in range(4)]
+                boards.append({
+                    "internalId": n, "SerNr": n, "ID": board_id, "Name": f"Tablero {n}",
+                    "Customer": rng.choice(customer_codes), "UpdateC": True, "Closed": False,
+                    "Department": rng.choice(DEPARTMENTS), "Assigned": rng.choice(consultants)[:10],
+                })
+                for k, (state, open_status) in enumerate([("Nuevo", 1), ("Pendiente", 1), ("En pruebas", 1), ("Cerrado", 0)]):
+                    lists.append({"masterId": n, "ID": list_ids[k], "OpenStatus": open_status, "State": state, "Name": state})
+                cards = []
+                for k in range(TRELLO_CARDS_PER_BOARD):
+                    url = f"https://trello.com/c/{board_id}{k:04d}"
+                    if k % 2 == 0:
+                        linked_urls.append(url)
+                    cards.append({
+                        "shortUrl": url, "idList": rng.choice(list_ids), "name": _text(rng, 5),
+                        "desc": _text(rng, 20), "id": f"{rng.getrandbits(96):024x}", "idShort": k + 1,
+                    })
+                board_data.append({"Code": board_id, "Data": json.dumps(cards), "Date": END_DATE})
+            _insert(session, models.Board, boards)
+            _insert(session, models.BoardListRow, lists)
+            _insert(session, models.TrelloBoardData, board_data)
+            return len(boards)
+
+        timed("boards", fill_boards)
+
+        session.execute(insert(models.AttentionFlowSettings), [{
+            "max_time_new": 24, "max_time_pending": 48, "max_time_testing": 72, "max_time_waiting": 96,
+            "max_time_priority_low": 120, "max_time_priority_medium": 72,
+            "max_time_priority_high": 24, "max_time_priority_critical": 8,
+        }])
+        session.commit()
+
+        # --- Cards ---
+        card_count = counts["cards"]
+        card_customers = []
+
+        def card_rows():
+            for n in range(1, card_count + 1):
+                code = rng.choice(customer_codes)
+                card_customers.append(int(code[1:]))
+                day = _day(rng)
+                changed = datetime.combine(day, dtime(9)) + timedelta(days=rng.randrange(30))
+                yield {
+                    "internalId": n,
+                    "Name": _text(rng, 6),
+                    "Comment": _text(rng, 30),
+                    "CustCode": code,
+                    "CustName": f"Cliente {int(code[1:])}",
+                    "State": rng.choices(CARD_STATES, CARD_STATE_WEIGHTS)[0],
+                    "Priority": rng.choices(PRIORITIES, PRIORITY_WEIGHTS)[0],
+                    "date_column": day,
+                    "state_last_changed_date": changed,
+                    "assign": rng.choice(consultants),
+                    "Department": rng.choice(DEPARTMENTS),
+                    "AdditionalHoursStatus": rng.choices(ADDITIONAL_STATUSES, ADDITIONAL_WEIGHTS)[0],
+                    "LinkTrello": linked_urls[n - 1] if n <= len(linked_urls) else None,
+                }
+
+        timed("cards", lambda: _insert_stream(session, models.Card, card_rows(), card_count))
+
+        # --- Activities, mostly logged against a ticket of the same customer ---
+        def activity_rows():
+            for n in range(1, counts["activities"] + 1):
+                start, end = _slot(rng)
+                card_id = rng.randint(1, card_count) if rng.random() < 0.7 else None
+                yield {
+                    "id": n,
+                    "titulo": _text(rng, 4),
+                    "descripcion": _text(rng, 15),
+                    "fecha_creacion": _day(rng),
+                    "hora_inicio": start,
+                    "hora_fin": end,
+                    "user": rng.choice(consultants),
+                    "type_user": rng.randint(1, 4),
+                    "cliente_id": card_customers[card_id - 1] if card_id else rng.randint(1, counts["customers"]),
+                    "proyecto_id": rng.randint(1, project_count) if rng.random() < 0.2 else None,
+                    "card_id": card_id,
+                }
+
+        timed("activities", lambda: _insert_stream(session, models.Actividad, activity_rows(), counts["activities"]))
+
+        def comment_rows():
+            for n in range(1, counts["comments"] + 1):
+                yield {
+                    "id": n,
+                    "master_id": rng.randint(1, card_count),
+                    "comment": _text(rng, 20),
+                    "date_column": _day(rng),
+                    "time_column": dtime(rng.randrange(8, 19), rng.randrange(60)),
+                    "user": rng.choice(consultants),
+                }
+
+        timed("comments", lambda: _insert_stream(session, models.CardsEventRow, comment_rows(), counts["comments"]))
+
+        def attachment_rows():
+            for n in range(1, counts["attachments"] + 1):
+                yield {
+                    "id": n,
+                    "filename": f"adjunto_{n}.pdf",
+                    "filepath": f"uploads/bench/adjunto_{n}.pdf",
+                    "filesize": rng.randint(10_000, 5_000_000),
+                    "mimetype": "application/pdf",
+                    "created_at": datetime.combine(_day(rng), dtime(12)),
+                    "card_id": rng.randint(1, card_count),
+                }
+
+        timed("attachments", lambda: _insert_stream(
+            session, models.TicketAttachment, attachment_rows(), counts["attachments"]
+        ))
+
+        # --- Check-ins: entries and exits of each employee, ending the day before END_DATE ---
+        def checkin_rows():
+            employees = [f"{n:04d}" for n in range(1, EMPLOYEES + 1)]
+            per_day = EMPLOYEES * 4
+            day = END_DATE - timedelta(days=-(-counts["checkins"] // per_day))
+            ser_nr = 0
+            while ser_nr < counts["checkins"]:
+                for employee in employees:
+                    for hour in (8, 12, 13, 18):
+                        ser_nr += 1
+                        if ser_nr > counts["checkins"]:
+                            return
+                        moment = dtime(hour, rng.randrange(60), rng.randrange(60))
+                        yield {
+                            "SerNr": ser_nr,
+                            "user_name": "clock",
+                            "Office": "Central",
+                            "Computer": "BIO01",
+                            "Employee": employee,
+                            "attendance_date": day,
+                            "attendance_time": moment,
+                            "BiometricClock": "BIO01",
+                            "transaction_date": day,
+                            "transaction_time": moment,
+                        }
+                day += timedelta(days=1)
+
+        timed("check-ins", lambda: _insert_stream(session, models.CheckInOut, checkin_rows(), counts["checkins"]))
+
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fill an empty database with seeded benchmark data")
+    parser.add_argument("--scale", type=float, default=1.0, help="fraction of the production-sized data set")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"Generating benchmark data in {engine.url} (scale {args.scale}, seed {args.seed})")
+    started = time.perf_counter()
+    generate(engine, args.scale, args.seed)
+    print(f"Done in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+"""
+Load test with scenarios modeled on the desk's real traffic.
+
+Runs against a local instance (uvicorn backend.main:app on a database filled
+by benchmarks.data_generator). Each virtual user repeats one scenario, with a
+think time between iterations, replaying the requests the page makes:
+
+- kanban: a consultant opens kanban.html (GET /api/cards/) and drags a card
+  to another column (PUT /api/cards/{id}).
+- crear_actividad: a consultant opens crear_actividad.html for a ticket
+  (GET /api/cards/{id}, GET /api/proyectos/) and saves an activity
+  (POST /api/actividades/) in a free slot.
+- reports: an admin opens reports.html (clients, activities by user,
+  eligible users) and runs the global activities report for one month.
+- biometric: a clock posts the marks of one day to /api/checkinout/bulk.
+
+The number of users grows in steps (--users). For every step and scenario it
+reports p50/p95/p99 of the whole page, completed iterations per second and
+the error rate; the first step whose error rate passes --max-error-rate is
+where errors begin, and its throughput is reported next to the best
+throughput reached before it. Results are also written as JSON.
+
+Ejecución:
+    uvicorn backend.main:app --workers 4 --port 8000
+    python -m benchmarks.load_test --base-url http://127.0.0.1:8000 --users 5,10,25,50,100 --step-seconds 60
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import time
+from datetime import date, datetime, timedelta
+
+import httpx
+
+from benchmarks.data_generator import BENCHMARK_PASSWORD, CARD_STATES, CONSULTANTS, END_DATE, HISTORY_DAYS
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+DEFAULT_MIX = "kanban:5,crear_actividad:3,reports:1,biometric:1"
+CHECKINS_PER_UPLOAD = 500
+
+# Column a card is dragged to from each state, following TRANSITION_RULES in cards_api.
+# The states are the generator's, so every generated card can be moved.
+NEW, PENDING, IN_PROGRESS, TESTING, WAITING, CLOSED = CARD_STATES
+KANBAN_MOVES = {
+    NEW: PENDING,
+    PENDING: IN_PROGRESS,
+    IN_PROGRESS: TESTING,
+    TESTING: PENDING,
+    WAITING: IN_PROGRESS,
+    CLOSED: PENDING,
+}
+
+
+class ScenarioError(Exception):
+    pass
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class LoadTest:
+    def __init__(self, client, rng):
+        self.client = client
+        self.rng = rng
+        self.tokens = {}
+        self.card_ids = []
+        # Activities and check-ins go on days nobody else uses, so reruns do not overlap
+        self.first_free_day = date(2030, 1, 1) + timedelta(days=1000 * rng.randrange(250))
+        self.next_slot = {}
+        self.next_upload_day = 0
+
+    async def request(self, method, path, username=None, **kwargs):
+        headers = {"Authorization": f"Bearer {self.tokens[username]}"} if username else {}
+        response = await self.client.request(method, path, headers=headers, **kwargs)
+        if response.status_code >= 400:
+            raise ScenarioError(f"{method} {path}: {response.status_code}")
+        return response
+
+    async def login(self, username):
+        if username not in self.tokens:
+            response = await self.client.post("/api/token", data={"username": username, "password": BENCHMARK_PASSWORD})
+            response.raise_for_status()
+            self.tokens[username] = response.json()["access_token"]
+
+    async def setup(self):
+        await self.login("admin")
+        for n in range(1, CONSULTANTS + 1):
+            await self.login(f"cons{n:02d}")
+        response = await self.request("GET", "/api/cards/", "admin", params={"limit": 1000})
+        self.card_ids = [card["internalId"] for card in response.json()]
+
+    def activity_slot(self, username):
+        """Next free 15 minute slot of this consultant, 32 per day from 08:00."""
+        slot = self.next_slot.get(username, 0)
+        self.next_slot[username] = slot + 1
+        day = self.first_free_day + timedelta(days=slot // 32)
+        return datetime.combine(day, datetime.min.time()) + timedelta(hours=8, minutes=15 * (slot % 32))
+
+    # --- Scenarios; each returns once the page is done ---
+
+    async def kanban(self, username):
+        cards = (await self.request("GET", "/api/cards/", username)).json()
+        movable = [card for card in cards if card.get("State") in KANBAN_MOVES]
+        if movable:
+            card = self.rng.choice(movable)
+            await self.request(
+                "PUT", f"/api/cards/{card['internalId']}", username, json={"State": KANBAN_MOVES[card["State"]]}
+            )
+
+    async def crear_actividad(self, username):
+        card_id = self.rng.choice(self.card_ids)
+        ticket = (await self.request("GET", f"/api/cards/{card_id}", username)).json()
+        cliente_id = ticket.get("customer_internal_id") or 1
+        start = self.activity_slot(username)
+        await self.request(
+            "GET", "/api/proyectos/", username, params={"cliente_id": cliente_id, "active_date": start.date().isoformat()}
+        )
+        await self.request("POST", "/api/actividades/", username, json={
+            "titulo": ticket.get("Name") or "Actividad", "descripcion": "Carga de prueba",
+            "hora_inicio": start.isoformat(), "hora_fin": (start + timedelta(minutes=15)).isoformat(),
+            "cliente_id": cliente_id, "card_id": card_id, "type_user": "1",
+        })
+
+    async def reports(self, username):
+        await asyncio.gather(
+            self.request("GET", "/api/clientes/", "admin"),
+            self.request("GET", "/api/reports/activities_by_user", "admin"),
+            self.request("GET", "/api/department_managers/eligible_users/", "admin"),
+        )
+        month_start = END_DATE - timedelta(days=self.rng.randrange(31, HISTORY_DAYS))
+        await self.request("GET", "/api/reports/global_activities", "admin", params={
+            "start_date": month_start.isoformat(), "end_date": (month_start + timedelta(days=30)).isoformat()
+        })
+
+    async def biometric(self, username):
+        day = (self.first_free_day + timedelta(days=self.next_upload_day)).isoformat()
+        self.next_upload_day += 1
+        records = [
+            {"emp": f"{n // 4 + 1:04d}", "chDate": day, "chTime": f"{(8, 12, 13, 18)[n % 4]:02d}:00:00", "clock": "BIO01"}
+            for n in range(CHECKINS_PER_UPLOAD)
+        ]
+        await self.request("POST", "/api/checkinout/bulk", json={
+            "records": records, "user": "clock", "office": "Central", "computer": "BIO01"
+        })
+
+    # --- Load ---
+
+    async def virtual_user(self, scenario, username, deadline, think_time, samples):
+        scenario_function = getattr(self, scenario)
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                await scenario_function(username)
+                samples.append((scenario, time.perf_counter() - started, None))
+            except (ScenarioError, httpx.HTTPError) as e:
+                samples.append((scenario, time.perf_counter() - started, str(e) or type(e).__name__))
+            if think_time:
+                await asyncio.sleep(think_time * self.rng.uniform(0.5, 1.5))
+
+    async def run_step(self, users, mix, step_seconds, think_time):
+        samples = []
+        deadline = time.perf_counter() + step_seconds
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            self.virtual_user(mix[n % len(mix)], f"cons{n % CONSULTANTS + 1:02d}", deadline, think_time, samples)
+            for n in range(users)
+        ))
+        return samples, time.perf_counter() - started
+
+
+def summarize_step(users, samples, elapsed):
+    scenarios = {}
+    for name in sorted({sample[0] for sample in samples}):
+        durations = [seconds * 1000 for scenario, seconds, error in samples if scenario == name and error is None]
+        errors = [error for scenario, seconds, error in samples if scenario == name and error is not None]
+        total = len(durations) + len(errors)
+        scenarios[name] = {
+            "iterations": total,
+            "errors": len(errors),
+            "error_rate": round(len(errors) / total, 4) if total else 0.0,
+            "throughput_per_s": round(len(durations) / elapsed, 2),
+            "p50_ms": round(percentile(durations, 0.50), 1) if durations else None,
+            "p95_ms": round(percentile(durations, 0.95), 1) if durations else None,
+            "p99_ms": round(percentile(durations, 0.99), 1) if durations else None,
+            "first_errors": sorted(set(errors))[:5],
+        }
+    total = len(samples)
+    errors = sum(1 for sample in samples if sample[2] is not None)
+    return {
+        "users": users,
+        "seconds": round(elapsed, 1),
+        "throughput_per_s": round((total - errors) / elapsed, 2),
+        "error_rate": round(errors / total, 4) if total else 0.0,
+        "scenarios": scenarios,
+    }
+
+
+def parse_mix(text):
+    """
+    'kanban:2,reports:1' -> ['kanban', 'reports', 'kanban']: the scenario of each new user in turn,
+    interleaved so that small steps already run every scenario.
+    """
+    entries = []
+    for position, part in enumerate(text.split(",")):
+        name, _, weight = part.partition(":")
+        if name not in ("kanban", "crear_actividad", "reports", "biometric"):
+            raise SystemExit(f"Unknown scenario: {name}")
+        weight = int(weight or 1)
+        entries += [(turn / weight, position, name) for turn in range(weight)]
+    return [name for _, _, name in sorted(entries)]
+
+
+async def run(args):
+    mix = parse_mix(args.mix)
+    steps = [int(users) for users in args.users.split(",")]
+    limits = httpx.Limits(max_connections=max(steps) * 2, max_keepalive_connections=max(steps) * 2)
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "base_url": args.base_url,
+        "mix": args.mix,
+        "step_seconds": args.step_seconds,
+        "think_time": args.think_time,
+        "max_error_rate": args.max_error_rate,
+        "steps": [],
+    }
+
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        load_test = LoadTest(client, random.Random(args.seed))
+        await load_test.setup()
+        for users in steps:
+            samples, elapsed = await load_test.run_step(users, mix, args.step_seconds, args.think_time)
+            step = summarize_step(users, samples, elapsed)
+            report["steps"].append(step)
+            print(f"\n{users} users: {step['throughput_per_s']} iterations/s, {step['error_rate']:.1%} errors")
+            for name, result in step["scenarios"].items():
+                print(
+                    f"  {name:16} p50 {result['p50_ms']} ms  p95 {result['p95_ms']} ms  p99 {result['p99_ms']} ms  "
+                    f"{result['throughput_per_s']}/s  errors {result['errors']}/{result['iterations']}"
+                )
+                for error in result["first_errors"]:
+                    print(f"    {error}")
+
+    clean_steps = []
+    for step in report["steps"]:
+        if step["error_rate"] > args.max_error_rate:
+            report["errors_begin"] = {"users": step["users"], "throughput_per_s": step["throughput_per_s"]}
+            break
+        clean_steps.append(step)
+    report["max_clean_throughput_per_s"] = max((step["throughput_per_s"] for step in clean_steps), default=None)
+    if "errors_begin" in report:
+        print(f"\nErrors begin at {report['errors_begin']['users']} users "
+              f"({report['errors_begin']['throughput_per_s']} iterations/s); "
+              f"best throughput before that: {report['max_clean_throughput_per_s']} iterations/s")
+    else:
+        print(f"\nNo step passed {args.max_error_rate:.1%} errors; best throughput: {report['max_clean_throughput_per_s']} iterations/s")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stepped load test of the desk's main pages")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--users", default="5,10,25,50,100", help="concurrent users of each step")
+    parser.add_argument("--step-seconds", type=float, default=60)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="scenario:weight list")
+    parser.add_argument("--think-time", type=float, default=1.0, help="mean seconds between iterations of a user")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", help=f"JSON file to write (default: {RESULTS_DIR}/load-<commit>-<time>.json)")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"load-{report['commit'] or 'unknown'}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
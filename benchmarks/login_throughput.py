@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+Login throughput and event loop stalls during a burst of logins.
+
+Sends --logins logins, --concurrency at a time, to one in-process API worker
+and, meanwhile, measures how late a 5 ms timer on the same event loop fires:
+that lag is what every other request of the worker waits. Three scenarios:
+  inline    async def route verifying the hash on the event loop
+            (how login_for_access_token used to work)
+  pool      the same route verifying on the password hashing pool
+  api       the real POST /api/token, with token issue included
+The users are the consultants of benchmarks.data_generator.
+
+Exits with status 1 when the p95 loop lag of the api scenario exceeds
+--max-lag-ms.
+
+Ejecución: DATABASE_URL=sqlite:///bench.db python -m benchmarks.login_throughput --logins 200 --concurrency 50 --workers 2
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+
+import httpx
+from fastapi import Depends, FastAPI, Form, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.core import passwords, queries
+from backend.database import async_engine, get_async_db
+from backend.main import app as api_app
+from benchmarks.data_generator import BENCHMARK_PASSWORD, CONSULTANTS
+from benchmarks.suite import percentile
+
+TICK_SECONDS = 0.005
+
+
+def build_app():
+    app = FastAPI()
+
+    async def stored_hash(username, db):
+        result = await db.execute(queries.PERSON_BY_USERNAME, {"username": username})
+        user = result.scalars().first()
+        if user is None:
+            raise HTTPException(status_code=401)
+        return user.hashed_password
+
+    @app.post("/inline")
+    async def inline_login(username: str = Form(), password: str = Form(), db: AsyncSession = Depends(get_async_db)):
+        matches, _ = passwords.verify_password_sync(password, await stored_hash(username, db))
+        if not matches:
+            raise HTTPException(status_code=401)
+        return {}
+
+    @app.post("/pool")
+    async def pool_login(username: str = Form(), password: str = Form(), db: AsyncSession = Depends(get_async_db)):
+        matches, _ = await passwords.verify_password(password, await stored_hash(username, db))
+        if not matches:
+            raise HTTPException(status_code=401)
+        return {}
+
+    return app
+
+
+async def measure_lag(lags, stop):
+    """How late a TICK_SECONDS sleep wakes up, until stop is set."""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(TICK_SECONDS)
+        lags.append(time.perf_counter() - started - TICK_SECONDS)
+
+
+async def run_scenario(app, path, logins, concurrency):
+    transport = httpx.ASGITransport(app=app)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, lags = [], []
+
+    async def login(client, n):
+        username = f"cons{n % CONSULTANTS + 1:02d}"
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post(path, data={"username": username, "password": BENCHMARK_PASSWORD})
+            latencies.append(time.perf_counter() - started)
+        response.raise_for_status()
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await login(client, 0) # Warm up the connection pool and the hashing pool
+        latencies.clear()
+        stop = asyncio.Event()
+        ticker = asyncio.create_task(measure_lag(lags, stop))
+        started = time.perf_counter()
+        await asyncio.gather(*(login(client, n) for n in range(logins)))
+        wall = time.perf_counter() - started
+        stop.set()
+        await ticker
+    # Pooled connections belong to this event loop
+    await async_engine.dispose()
+
+    return {
+        "route": path,
+        "logins": logins,
+        "concurrency": concurrency,
+        "wall_seconds": round(wall, 3),
+        "logins_per_second": round(logins / wall, 1),
+        "login_p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "login_p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "loop_lag_p50_ms": round(statistics.median(lags) * 1000, 1),
+        "loop_lag_p95_ms": round(percentile(lags, 0.95) * 1000, 1),
+        "loop_lag_max_ms": round(max(lags) * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=passwords.PASSWORD_HASH_WORKERS, help="Password hashing pool size")
+    parser.add_argument("--max-lag-ms", type=float, default=50, help="p95 event loop lag allowed in the api scenario")
+    args = parser.parse_args()
+
+    passwords.PASSWORD_HASH_WORKERS = args.workers
+    bench_app = build_app()
+    results = {
+        "inline": asyncio.run(run_scenario(bench_app, "/inline", args.logins, args.concurrency)),
+        "pool": asyncio.run(run_scenario(bench_app, "/pool", args.logins, args.concurrency)),
+        "api": asyncio.run(run_scenario(api_app, "/api/token", args.logins, args.concurrency)),
+    }
+    passwords.shutdown()
+    results["hash_workers"] = args.workers
+    print(json.dumps(results, indent=2))
+
+    if results["api"]["loop_lag_p95_ms"] > args.max_lag_ms:
+        print(f"FAIL: p95 event loop lag during logins is {results['api']['loop_lag_p95_ms']} ms "
+              f"(budget {args.max_lag_ms} ms)", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
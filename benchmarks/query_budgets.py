@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+"""
+Query budget checks for every router in backend/api.
+
+The budgets are pytest cases in tests/test_query_budgets.py, collected by
+`python -m pytest` with the rest of the suite; this runs only them, verbose.
+Extra arguments go to pytest (e.g. -k read_cards).
+
+Ejecución: python -m benchmarks.query_budgets
+"""
+import os
+import sys
+
+import pytest
+
+TESTS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests", "test_query_budgets.py")
+
+
+def main():
+    sys.exit(pytest.main(["-v", TESTS, *sys.argv[1:]]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+Full-table-scan check for the hot queries.
+
+Runs EXPLAIN (MySQL) or EXPLAIN QUERY PLAN (SQLite) for the statements issued
+by cards_api.read_cards, actividades_api.create_actividad,
+reports_api.get_global_activities, check_escalations and the other lookups
+covered by migration 0001, and exits with status 1 if any of them reads one
+of the large tables with a full scan. Run it against a seeded database
+after `python -m backend.migrate`.
+
+Ejecución: python -m benchmarks.query_plans
+"""
+import sys
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import select, func, text
+
+from backend import models
+from backend.database import engine
+
+# Tables large enough that a full scan on a hot path is a regression
+LARGE_TABLES = {"Cards", "Activity", "CardsEventRow", "PersonOfCustomer", "DepartmentManagerRow", "CheckInOut"}
+
+
+def sample_values(connection):
+    """Picks real values from the database so the plans reflect actual data."""
+    def first(statement, default):
+        value = connection.execute(statement).scalar()
+        return default if value is None else value
+
+    return {
+        "cust_code": first(select(models.Card.CustCode).where(models.Card.CustCode.isnot(None)).limit(1), "C0001"),
+        "state": first(select(models.Card.State).where(models.Card.State.isnot(None)).limit(1), "Pendiente"),
+        "assign": first(select(models.Card.assign).where(models.Card.assign.isnot(None)).limit(1), "admin"),
+        "link": first(select(models.Card.LinkTrello).where(models.Card.LinkTrello.isnot(None)).limit(1), "https://trello.com/c/x"),
+        "card_id": first(select(func.max(models.Card.internalId)), 1),
+        "user": first(select(models.Actividad.user).where(models.Actividad.user.isnot(None)).limit(1), "admin"),
+        "cliente_id": first(select(models.Actividad.cliente_id).where(models.Actividad.cliente_id.isnot(None)).limit(1), 1),
+        "day": first(select(func.max(models.Actividad.fecha_creacion)), date.today()),
+        "department": first(select(models.DepartmentManagerRow.department).limit(1), "SOP"),
+    }
+
+
+def hot_queries(v):
+    """The statements to check, mirroring the filters used by each route or script."""
+    day = v["day"] if isinstance(v["day"], date) else datetime.strptime(str(v["day"]), "%Y-%m-%d").date()
+    global_activities = select(
+        models.Actividad.id, models.Actividad.fecha_creacion, models.Actividad.user,
+        models.Cliente.razon_social, models.Actividad.card_id, models.Proyecto.nombre,
+        models.Actividad.hora_inicio, models.Actividad.hora_fin, models.Card.AdditionalHoursStatus
+    ).join(models.Cliente, models.Actividad.cliente_id == models.Cliente.id, isouter=True)\
+     .join(models.Proyecto, models.Actividad.proyecto_id == models.Proyecto.id, isouter=True)\
+     .join(models.Card, models.Actividad.card_id == models.Card.internalId, isouter=True)
+
+    return {
+        "read_cards (client)": select(models.Card).where(models.Card.CustCode == v["cust_code"])
+            .order_by(models.Card.internalId.desc()).limit(100),
+        "read_cards (client + Status)": select(models.Card).where(
+            models.Card.CustCode == v["cust_code"], models.Card.State == v["state"]
+        ).order_by(models.Card.internalId.desc()).limit(100),
+        "read_cards (staff + Status)": select(models.Card).where(models.Card.State == v["state"])
+            .order_by(models.Card.internalId.desc()).limit(100),
+        "cards by assignee": select(models.Card).where(models.Card.assign == v["assign"]),
+        "create_actividad (client lookup)": select(models.Cliente).where(models.Cliente.id == v["cliente_id"]),
+        "create_actividad (overlap check)": select(models.Actividad).where(
+            models.Actividad.user == v["user"], models.Actividad.fecha_creacion == day
+        ),
+        "global_activities (date range)": global_activities.where(
+            models.Actividad.fecha_creacion >= day - timedelta(days=30),
+            models.Actividad.fecha_creacion <= day
+        ),
+        "global_activities (client)": global_activities.where(models.Actividad.cliente_id == v["cliente_id"]),
+        "global_activities (consultant)": global_activities.where(models.Actividad.user == v["user"]),
+        "global_activities (ticket)": global_activities.where(models.Actividad.card_id == v["card_id"]),
+        "check_escalations (open tickets)": select(models.Card).where(
+            models.Card.state_last_changed_date < datetime.utcnow() - timedelta(hours=24),
+            models.Card.State.notin_(['Cerrado', 'Terminado'])
+        ),
+        "sync_trello (existing ticket)": select(models.Card).where(models.Card.LinkTrello == v["link"]),
+        "comments of a ticket": select(models.CardsEventRow).where(models.CardsEventRow.master_id == v["card_id"]),
+        "reset_password (token)": select(models.PersonOfCustomer).where(models.PersonOfCustomer.reset_token == "x" * 32),
+        "create_card (department manager)": select(models.DepartmentManagerRow).where(
+            models.DepartmentManagerRow.department == v["department"]
+        ),
+    }
+
+
+def full_scans(connection, statement):
+    """Returns the large tables that the plan reads with a full scan."""
+    compiled = statement.compile(dialect=connection.dialect, compile_kwargs={"render_postcompile": True})
+    params = tuple(compiled.params[name] for name in compiled.positiontup) if compiled.positional else compiled.params
+    dialect = connection.dialect.name
+
+    if dialect == "sqlite":
+        rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params).fetchall()
+        scanned = set()
+        for row in rows:
+            detail = row[-1]
+            # "SCAN Cards" is a full scan; "SCAN Cards USING INDEX ..." walks an index
+            if detail.startswith("SCAN ") and "USING" not in detail:
+                scanned.add(detail.split()[1])
+        return scanned & LARGE_TABLES
+
+    rows = connection.exec_driver_sql(f"EXPLAIN {compiled}", params).mappings().fetchall()
+    return {row["table"] for row in rows if row["type"] == "ALL"} & LARGE_TABLES
+
+
+def main():
+    failures = 0
+    with engine.connect() as connection:
+        if connection.dialect.name == "mysql":
+            connection.execute(text("ANALYZE TABLE Cards, Activity, CardsEventRow, PersonOfCustomer, DepartmentManagerRow"))
+        values = sample_values(connection)
+        for name, statement in hot_queries(values).items():
+            scanned = full_scans(connection, statement)
+            if scanned:
+                failures += 1
+                print(f"FAIL  {name}: full scan on {', '.join(sorted(scanned))}")
+            else:
+                print(f"ok    {name}")
+
+    if failures:
+        print(f"{failures} hot queries fall back to a full table scan")
+        sys.exit(1)
+    print("All hot queries use an index")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+Cold-start time of the API worker.
+
+Starts a fresh interpreter several times, imports backend.main and runs the
+application lifespan, then reports the per-phase timings recorded in
+app.state.startup_timings. Exits with status 1 when the median time to
+ready exceeds the budget, so it can gate a deploy. warm_routers_seconds, the
+OpenAPI schema built in the background after the worker is ready, is
+reported but not part of the ready time.
+
+Schema creation is skipped (DB_AUTO_CREATE_SCHEMA=false) unless
+--with-schema is given, matching how workers run once `python -m
+backend.migrate` manages the schema.
+
+Ejecución: python -m benchmarks.startup_time --runs 5 --budget 1.0
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+CHILD_CODE = """
+import asyncio, json, threading, time
+started = time.perf_counter()
+from backend.main import app
+
+async def start():
+    async with app.router.lifespan_context(app):
+        pass
+
+asyncio.run(start())
+ready_seconds = round(time.perf_counter() - started, 4)
+# The OpenAPI schema is built in the background once the worker is ready
+for thread in threading.enumerate():
+    if thread.name == "warm-routers":
+        thread.join()
+timings = dict(app.state.startup_timings)
+timings["ready_seconds"] = ready_seconds
+print(json.dumps(timings))
+"""
+
+
+def run_once(env):
+    started = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD_CODE],
+        env=env, capture_output=True, text=True, check=True
+    ).stdout
+    timings = json.loads(output.strip().splitlines()[-1])
+    timings["process_seconds"] = round(time.perf_counter() - started, 4)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=1.0, help="Maximum median seconds until the app is ready")
+    parser.add_argument("--with-schema", action="store_true", help="Include create_all in the startup")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env["DB_AUTO_CREATE_SCHEMA"] = "true" if args.with_schema else "false"
+
+    runs = [run_once(env) for _ in range(args.runs)]
+    summary = {
+        key: round(statistics.median(run[key] for run in runs), 4)
+        for key in runs[0]
+    }
+    print(json.dumps({"runs": runs, "median": summary}, indent=2))
+
+    if summary["ready_seconds"] > args.budget:
+        print(f"FAIL: median ready time {summary['ready_seconds']}s exceeds budget {args.budget}s")
+        sys.exit(1)
+    print(f"OK: median ready time {summary['ready_seconds']}s within budget {args.budget}s")
+
+
+if __name__ == "__main__":
+    main()
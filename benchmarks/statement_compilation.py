@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+Python time spent building SQL for the hot per-request queries.
+
+Compares the previous db.query(...).filter(...).first() form with the
+prebuilt statements in backend/core/queries.py for the get_current_user
+lookup, the card-by-id lookup and the create_actividad client and overlap
+queries. Each figure is the full round trip in microseconds against an
+in-memory SQLite database, so database time is negligible and the difference
+is Python overhead.
+
+Ejecución: python -m benchmarks.statement_compilation --iterations 5000
+"""
+import argparse
+import json
+import time
+from datetime import date
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend import models
+from backend.database import Base
+from backend.core import queries
+
+
+def legacy_queries(db):
+    return {
+        "person_by_username": lambda i: db.query(models.PersonOfCustomer).filter(
+            models.PersonOfCustomer.user == f"user{i % 50}"
+        ).first(),
+        "card_by_id": lambda i: db.query(models.Card).filter(models.Card.internalId == i % 50 + 1).first(),
+        "cliente_by_id": lambda i: db.query(models.Cliente).filter(models.Cliente.id == i % 50 + 1).first(),
+        "activities_of_user_on": lambda i: db.query(models.Actividad).filter(
+            models.Actividad.user == f"user{i % 50}",
+            models.Actividad.fecha_creacion == date(2026, 1, 1)
+        ).all(),
+    }
+
+
+def prebuilt_queries(db):
+    return {
+        "person_by_username": lambda i: db.execute(
+            queries.PERSON_BY_USERNAME, {"username": f"user{i % 50}"}
+        ).scalars().first(),
+        "card_by_id": lambda i: db.execute(queries.CARD_BY_ID, {"card_id": i % 50 + 1}).scalars().first(),
+        "cliente_by_id": lambda i: db.execute(queries.CLIENTE_BY_ID, {"cliente_id": i % 50 + 1}).scalars().first(),
+        "activities_of_user_on": lambda i: db.execute(
+            queries.ACTIVITIES_OF_USER_ON, {"username": f"user{i % 50}", "day": date(2026, 1, 1)}
+        ).scalars().all(),
+    }
+
+
+def seed(db):
+    for i in range(50):
+        db.add(models.Cliente(code=f"C{i}", razon_social=f"Cliente {i}"))
+        db.add(models.PersonOfCustomer(user=f"user{i}", gmail=f"user{i}@example.com", hashed_password="x"))
+        db.add(models.Card(Name=f"Ticket {i}", CustCode=f"C{i}"))
+    db.commit()
+
+
+def per_call_us(func, iterations):
+    func(0) # Warm the caches
+    start = time.perf_counter()
+    for i in range(iterations):
+        func(i)
+    return round((time.perf_counter() - start) / iterations * 1_000_000, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=5000)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    seed(db)
+
+    legacy = legacy_queries(db)
+    prebuilt = prebuilt_queries(db)
+    results = {}
+    for name in legacy:
+        legacy_us = per_call_us(legacy[name], args.iterations)
+        prebuilt_us = per_call_us(prebuilt[name], args.iterations)
+        results[name] = {
+            "legacy_us": legacy_us,
+            "prebuilt_us": prebuilt_us,
+            "speedup": round(legacy_us / prebuilt_us, 2),
+        }
+    db.close()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
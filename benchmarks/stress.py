@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+"""
+Concurrency stress checks for the write paths that read before they write.
+
+Fires bursts of simultaneous requests at a running instance and then checks,
+straight in the database, the invariants those routes are meant to keep:
+
+- consumed_hours: consultants save activities for one client at the same
+  time. create_actividad adds each duration to Cliente.support_hours_consumed
+  after reading it, so concurrent saves can lose hours. Invariant: the
+  client's consumed hours equal the sum of its activities' durations.
+- overlap: one consultant saves the same time slot several times at once.
+  The overlap check reads the day's activities and then inserts. Invariant:
+  no two activities of the user overlap, and each slot is saved at most once.
+- serial: clocks upload check-ins at the same time, part of the marks shared
+  between uploads (a clock retrying, two clocks seeing the same badge).
+  bulk_insert_attendance numbers rows from max(SerNr)+1 and skips marks it
+  read as already stored. Invariants: no upload fails, every SerNr is unique
+  and every mark is stored exactly once.
+
+Each scenario works on a day (and, for consumed_hours, a client) no earlier
+run has used, so it can be repeated on the same database. Exits with status 1
+when any invariant is broken, printing how often, so a fix can be shown to
+bring the count to zero.
+
+The API and this script must use the same database: set DATABASE_URL (or the
+DB_* settings) to the one the instance was started with, filled by
+benchmarks.data_generator.
+
+Ejecución:
+    uvicorn backend.main:app --workers 4 --port 8000
+    python -m benchmarks.stress --base-url http://127.0.0.1:8000 --concurrency 20 --rounds 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+import httpx
+from sqlalchemy import func, select
+
+from backend import models
+from backend.database import SessionLocal
+from benchmarks.data_generator import BENCHMARK_PASSWORD, CONSULTANTS, END_DATE
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+SCENARIOS = ("consumed_hours", "overlap", "serial")
+SLOT_MINUTES = 10
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def next_free_day(column):
+    """First day after both the generated history and anything an earlier run wrote."""
+    with SessionLocal() as db:
+        latest = db.scalar(select(func.max(column)))
+    return max(latest or END_DATE, END_DATE) + timedelta(days=1)
+
+
+def slot(day, index):
+    start = datetime.combine(day, datetime.min.time()) + timedelta(hours=7, minutes=SLOT_MINUTES * index)
+    return start, start + timedelta(minutes=SLOT_MINUTES)
+
+
+def activity_body(cliente_id, start, end, label):
+    return {
+        "titulo": label, "descripcion": "Prueba de concurrencia",
+        "hora_inicio": start.isoformat(), "hora_fin": end.isoformat(), "cliente_id": cliente_id,
+    }
+
+
+class Outcome:
+    """Status counts of the requests of one scenario."""
+
+    def __init__(self):
+        self.statuses = Counter()
+
+    def record(self, response):
+        self.statuses[response.status_code if isinstance(response, httpx.Response) else "error"] += 1
+
+    def as_dict(self):
+        return {str(code): count for code, count in sorted(self.statuses.items(), key=str)}
+
+    @property
+    def server_errors(self):
+        return sum(count for code, count in self.statuses.items() if code == "error" or code >= 500)
+
+
+async def login(client, username):
+    response = await client.post("/api/token", data={"username": username, "password": BENCHMARK_PASSWORD})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def burst(requests):
+    """Sends the requests together; returns the responses (or the exceptions) in order."""
+    return await asyncio.gather(*requests, return_exceptions=True)
+
+
+def create_stress_client(stamp):
+    with SessionLocal() as db:
+        cliente = models.Cliente(
+            code=f"STRESS-{stamp}", nombre=f"Stress {stamp}", razon_social=f"Stress {stamp}",
+            ruc=f"STRESS-{stamp}", email=f"stress-{stamp}@example.com", estado="1",
+            support_hours=1_000_000.0, support_hours_consumed=0.0, last_alert_level=0.0,
+        )
+        db.add(cliente)
+        db.commit()
+        return cliente.id
+
+
+async def consumed_hours(client, tokens, args):
+    """Every consultant saves one activity per round for the same client, all at once."""
+    cliente_id = create_stress_client(int(time.time() * 1000))
+    day = next_free_day(models.Actividad.fecha_creacion)
+    outcome = Outcome()
+    for round_number in range(args.rounds):
+        start, end = slot(day, round_number)
+        responses = await burst(
+            client.post("/api/actividades/", json=activity_body(cliente_id, start, end, f"Stress {round_number}"),
+                        headers=headers)
+            for headers in tokens.values()
+        )
+        for response in responses:
+            outcome.record(response)
+
+    with SessionLocal() as db:
+        consumed = db.scalar(select(models.Cliente.support_hours_consumed).where(models.Cliente.id == cliente_id))
+        activities = db.execute(
+            select(models.Actividad.hora_inicio, models.Actividad.hora_fin).where(models.Actividad.cliente_id == cliente_id)
+        ).all()
+    expected = sum(
+        (datetime.combine(day, row.hora_fin) - datetime.combine(day, row.hora_inicio)).total_seconds() / 3600
+        for row in activities
+    )
+    lost = round(expected - consumed, 4)
+    violations = [f"consumed hours {consumed:.4f} but activities add up to {expected:.4f} ({lost} h lost)"] \
+        if abs(lost) > 1e-6 else []
+    return outcome, violations, {"cliente_id": cliente_id, "activities": len(activities), "lost_hours": lost}
+
+
+async def overlap(client, tokens, args):
+    """One consultant saves the same slot --concurrency times at once, once per round."""
+    username, headers = next(iter(tokens.items()))
+    day = next_free_day(models.Actividad.fecha_creacion)
+    outcome = Outcome()
+    for round_number in range(args.rounds):
+        start, end = slot(day, round_number)
+        body = activity_body(1, start, end, f"Overlap {round_number}")
+        for response in await burst(
+            client.post("/api/actividades/", json=body, headers=headers) for _ in range(args.concurrency)
+        ):
+            outcome.record(response)
+
+    with SessionLocal() as db:
+        activities = db.execute(
+            select(models.Actividad.hora_inicio, models.Actividad.hora_fin)
+            .where(models.Actividad.user == username, models.Actividad.fecha_creacion == day)
+            .order_by(models.Actividad.hora_inicio)
+        ).all()
+    per_slot = Counter((row.hora_inicio, row.hora_fin) for row in activities)
+    violations = [
+        f"slot {start:%H:%M}-{end:%H:%M} saved {count} times"
+        for (start, end), count in sorted(per_slot.items()) if count > 1
+    ]
+    overlapping = sum(1 for previous, current in zip(activities, activities[1:]) if current.hora_inicio < previous.hora_fin)
+    return outcome, violations, {"user": username, "day": day.isoformat(), "activities": len(activities), "overlapping_pairs": overlapping}
+
+
+async def serial(client, tokens, args):
+    """--concurrency clocks upload at once, each with its own marks plus marks every clock sends."""
+    day = next_free_day(models.CheckInOut.attendance_date)
+    headers = next(iter(tokens.values()))
+    outcome = Outcome()
+    sent = set()
+    for round_number in range(args.rounds):
+        marks_day = day + timedelta(days=round_number)
+        shared = [(f"S{n:04d}", f"{8 + n % 10:02d}:{n % 60:02d}:00") for n in range(args.marks // 2)]
+        uploads = []
+        for clock in range(args.concurrency):
+            own = [(f"C{clock:02d}{n:03d}", f"{8 + n % 10:02d}:{n % 60:02d}:00") for n in range(args.marks - len(shared))]
+            records = [
+                {"emp": employee, "chDate": marks_day.isoformat(), "chTime": mark_time, "clock": f"STRESS{clock:02d}"}
+                for employee, mark_time in shared + own
+            ]
+            sent.update((employee, marks_day, mark_time) for employee, mark_time in shared + own)
+            uploads.append({"records": records, "user": "stress", "office": "Central", "computer": f"STRESS{clock:02d}"})
+        for response in await burst(client.post("/api/checkinout/bulk", json=upload, headers=headers) for upload in uploads):
+            outcome.record(response)
+
+    last_day = day + timedelta(days=args.rounds - 1)
+    with SessionLocal() as db:
+        rows = db.execute(
+            select(models.CheckInOut.SerNr, models.CheckInOut.Employee, models.CheckInOut.attendance_date,
+                   models.CheckInOut.attendance_time)
+            .where(models.CheckInOut.attendance_date.between(day, last_day), models.CheckInOut.user_name == "stress")
+        ).all()
+    serials = Counter(row.SerNr for row in rows)
+    stored = Counter((row.Employee, row.attendance_date, row.attendance_time.strftime("%H:%M:%S")) for row in rows)
+    duplicated_serials = sum(1 for count in serials.values() if count > 1)
+    duplicated_marks = sum(1 for count in stored.values() if count > 1)
+    missing_marks = len(sent - set(stored))
+
+    violations = []
+    if outcome.server_errors:
+        violations.append(f"{outcome.server_errors} uploads failed")
+    if duplicated_serials:
+        violations.append(f"{duplicated_serials} SerNr used more than once")
+    if duplicated_marks:
+        violations.append(f"{duplicated_marks} marks stored more than once")
+    if missing_marks:
+        violations.append(f"{missing_marks} of {len(sent)} marks not stored")
+    return outcome, violations, {
+        "rows": len(rows), "marks_sent": len(sent), "duplicated_marks": duplicated_marks, "missing_marks": missing_marks,
+    }
+
+
+async def run(args):
+    scenarios = args.scenarios.split(",")
+    results = {}
+    limits = httpx.Limits(max_connections=args.concurrency * 2)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        consultants = [f"cons{n:02d}" for n in range(1, min(args.concurrency, CONSULTANTS) + 1)]
+        tokens = {username: await login(client, username) for username in consultants}
+        admin = {"admin": await login(client, "admin")}
+        for name in scenarios:
+            started = time.perf_counter()
+            scenario = {"consumed_hours": consumed_hours, "overlap": overlap, "serial": serial}[name]
+            outcome, violations, details = await scenario(client, admin if name == "serial" else tokens, args)
+            results[name] = {
+                "seconds": round(time.perf_counter() - started, 2),
+                "statuses": outcome.as_dict(),
+                "violations": violations,
+                **details,
+            }
+            print(f"{name:16} {results[name]['seconds']:7.2f}s  statuses {outcome.as_dict()}  "
+                  f"{'OK' if not violations else 'BROKEN: ' + '; '.join(violations[:5])}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check invariants of the read-then-write routes under concurrent requests")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"comma separated, from {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", type=int, default=20, help="simultaneous requests per burst")
+    parser.add_argument("--rounds", type=int, default=10, help="bursts per scenario")
+    parser.add_argument("--marks", type=int, default=50, help="check-ins per upload, half of them shared by all clocks")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--output", help=f"JSON file to write (default: {RESULTS_DIR}/stress-<commit>-<time>.json)")
+    args = parser.parse_args()
+    unknown = set(args.scenarios.split(",")) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    if args.rounds * SLOT_MINUTES > 15 * 60:
+        parser.error("--rounds does not fit in one day of slots")
+
+    commit = git_commit()
+    print(f"Stress run of commit {commit} against {args.base_url}: {args.concurrency} concurrent requests, {args.rounds} rounds")
+    results = asyncio.run(run(args))
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"stress-{commit or 'unknown'}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({
+            "commit": commit, "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "concurrency": args.concurrency, "rounds": args.rounds, "scenarios": results,
+        }, f, indent=2)
+    print(f"Results written to {output}")
+
+    broken = [name for name, result in results.items() if result["violations"]]
+    if broken:
+        print(f"\nInvariants broken in: {', '.join(broken)}")
+        raise SystemExit(1)
+    print("\nAll invariants held.")
+
+
+if __name__ == "__main__":
+    main()
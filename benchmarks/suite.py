@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+"""
+Repeatable benchmarks of the key routes and the automation scripts.
+
+Runs against the database in DATABASE_URL (or the DB_* settings), which must
+have been filled by benchmarks.data_generator. Each route is called through
+the real application with TestClient: a few warm-up calls, then --runs timed
+calls, recording wall time percentiles and the statement count reported in
+the Server-Timing header. Each script function is run --script-runs times in
+process; the first run is reported apart because the Trello sync and the
+support hours check change data on their first pass.
+
+Results are written as JSON named after the commit, so two commits can be
+compared with benchmarks.compare. With --memory each script also runs once
+in a process of its own, and its peak RSS over the RSS after imports is
+recorded. The routes that write (activity creation,
+check-in upload) add rows, so regenerate the database for runs that should
+be compared exactly.
+
+Ejecución: DATABASE_URL=sqlite:///bench.db python -m benchmarks.suite --runs 20
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select
+
+from backend import models
+from backend.database import engine, SessionLocal
+from backend.main import app
+from benchmarks.data_generator import BENCHMARK_PASSWORD, END_DATE
+
+from automatizaciones.check_escalations import check_ticket_escalations
+from automatizaciones.check_support_hours import check_support_hours
+from automatizaciones.sync_trello_db_to_tickets import sync_trello_to_tickets
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+WARMUP_RUNS = 2
+CHECKINS_PER_UPLOAD = 500
+
+_SERVER_TIMING_QUERIES = re.compile(r'desc="(\d+) queries"')
+
+# Module and function of each script, for the runs in a separate process
+SCRIPT_ENTRY_POINTS = {
+    "check_escalations": ("automatizaciones.check_escalations", "check_ticket_escalations"),
+    "sync_trello": ("automatizaciones.sync_trello_db_to_tickets", "sync_trello_to_tickets"),
+    "check_support_hours": ("automatizaciones.check_support_hours", "check_support_hours"),
+}
+
+# Runs one script function and prints its RSS figures as JSON on the last line
+_MEMORY_PROBE = """
+import contextlib, importlib, io, json, sys
+from backend.core.memory import peak_rss_kb
+function = getattr(importlib.import_module(sys.argv[1]), sys.argv[2])
+baseline = peak_rss_kb()
+with contextlib.redirect_stdout(io.StringIO()):
+    function()
+print(json.dumps({"baseline_rss_kb": baseline, "peak_rss_kb": peak_rss_kb()}))
+"""
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def summarize(durations_ms, query_counts=None):
+    summary = {
+        "runs": len(durations_ms),
+        "min_ms": round(min(durations_ms), 2),
+        "p50_ms": round(percentile(durations_ms, 0.50), 2),
+        "p95_ms": round(percentile(durations_ms, 0.95), 2),
+        "mean_ms": round(statistics.mean(durations_ms), 2),
+    }
+    if query_counts:
+        summary["queries"] = max(query_counts)
+    return summary
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def dataset_counts():
+    tables = {
+        "customers": models.Cliente, "cards": models.Card, "activities": models.Actividad,
+        "checkins": models.CheckInOut, "comments": models.CardsEventRow, "attachments": models.TicketAttachment,
+    }
+    with SessionLocal() as db:
+        return {name: db.scalar(select(func.count()).select_from(model)) for name, model in tables.items()}
+
+
+def login(client, username):
+    response = client.post("/api/token", data={"username": username, "password": BENCHMARK_PASSWORD})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def route_cases(tokens):
+    """Name, method, path, headers and a request factory (run index -> json body or None)."""
+    month_start = (END_DATE - timedelta(days=31)).isoformat()
+
+    def new_activity(run):
+        # One free 15 minute slot per run, on days after the generated history
+        day = END_DATE + timedelta(days=1 + run // 32)
+        start = datetime.combine(day, datetime.min.time()) + timedelta(hours=8, minutes=15 * (run % 32))
+        return {
+            "titulo": f"Benchmark {run}", "descripcion": "Actividad de benchmark",
+            "hora_inicio": start.isoformat(), "hora_fin": (start + timedelta(minutes=15)).isoformat(),
+            "cliente_id": 1, "card_id": 1,
+        }
+
+    def checkin_upload(run):
+        # A clock upload for a day that has no marks yet
+        day = (END_DATE + timedelta(days=run)).isoformat()
+        records = [
+            {"emp": f"{n // 4 + 1:04d}", "chDate": day, "chTime": f"{(8, 12, 13, 18)[n % 4]:02d}:00:00", "clock": "BIO01"}
+            for n in range(CHECKINS_PER_UPLOAD)
+        ]
+        return {"records": records, "user": "clock", "office": "Central", "computer": "BIO01"}
+
+    return [
+        ("cards_list", "GET", "/api/cards/?limit=100", tokens["admin"], None),
+        ("cards_list_by_state", "GET", "/api/cards/?Status=Pendiente&limit=100", tokens["admin"], None),
+        ("cards_list_client", "GET", "/api/cards/?limit=100", tokens["client"], None),
+        ("clientes_list", "GET", "/api/clientes/", tokens["admin"], None),
+        ("actividades_create", "POST", "/api/actividades/", tokens["bench"], new_activity),
+        ("global_activities_month", "GET",
+         f"/api/reports/global_activities?start_date={month_start}T00:00:00&end_date={END_DATE.isoformat()}T00:00:00",
+         tokens["admin"], None),
+        ("global_activities_client", "GET", "/api/reports/global_activities?client_id=1", tokens["admin"], None),
+        ("checkinout_bulk", "POST", "/api/checkinout/bulk", tokens["admin"], checkin_upload),
+    ]
+
+
+def bench_route(client, method, path, headers, body_factory, runs):
+    durations, queries = [], []
+    for run in range(WARMUP_RUNS + runs):
+        body = body_factory(run) if body_factory else None
+        started = time.perf_counter()
+        response = client.request(method, path, headers=headers, json=body)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if response.status_code >= 400:
+            raise RuntimeError(f"{method} {path} returned {response.status_code}: {response.text[:300]}")
+        if run < WARMUP_RUNS:
+            continue
+        durations.append(elapsed_ms)
+        match = _SERVER_TIMING_QUERIES.search(response.headers.get("server-timing", ""))
+        if match:
+            queries.append(int(match.group(1)))
+    return summarize(durations, queries)
+
+
+def bench_script(function, runs):
+    durations = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            function()
+        durations.append((time.perf_counter() - started) * 1000)
+    summary = summarize(durations[1:] or durations)
+    summary["first_run_ms"] = round(durations[0], 2)
+    return summary
+
+
+def measure_script_memory(name):
+    """Peak RSS of one script run in a fresh interpreter, so nothing else has inflated it."""
+    module, function = SCRIPT_ENTRY_POINTS[name]
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [root, os.environ.get("PYTHONPATH")])))
+    completed = subprocess.run(
+        [sys.executable, "-c", _MEMORY_PROBE, module, function],
+        capture_output=True, text=True, cwd=root, env=env
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"{name} failed in the memory run:\n{completed.stderr[-2000:]}")
+    figures = json.loads(completed.stdout.strip().splitlines()[-1])
+    if figures["peak_rss_kb"] is None:
+        raise RuntimeError("Peak RSS is not available on this platform")
+    return {
+        "baseline_rss_mb": round(figures["baseline_rss_kb"] / 1024, 1),
+        "peak_rss_mb": round(figures["peak_rss_kb"] / 1024, 1),
+        "growth_mb": round((figures["peak_rss_kb"] - figures["baseline_rss_kb"]) / 1024, 1),
+    }
+
+
+def ensure_bench_user():
+    """Activities are created by a user with no history, so their overlap check stays the same size."""
+    with SessionLocal() as db:
+        if not db.query(models.PersonOfCustomer).filter(models.PersonOfCustomer.user == "bench").first():
+            admin = db.query(models.PersonOfCustomer).filter(models.PersonOfCustomer.user == "admin").one()
+            db.add(models.PersonOfCustomer(
+                user="bench", gmail="bench@example.com", hashed_password=admin.hashed_password,
+                roll="1", is_verified=True, status=1
+            ))
+            db.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the key routes and the automation scripts")
+    parser.add_argument("--runs", type=int, default=20, help="timed calls per route")
+    parser.add_argument("--script-runs", type=int, default=3, help="runs per automation script")
+    parser.add_argument("--memory", action="store_true", help="also record the peak RSS of each script, run in its own process")
+    parser.add_argument("--only", help="comma separated case names to run")
+    parser.add_argument("--output", help=f"JSON file to write (default: {RESULTS_DIR}/<commit>-<time>.json)")
+    args = parser.parse_args()
+    only = set(args.only.split(",")) if args.only else None
+
+    ensure_bench_user()
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "database": engine.dialect.name,
+        "python": platform.python_version(),
+        "dataset": dataset_counts(),
+        "routes": {},
+        "scripts": {},
+        "memory": {},
+    }
+    print(f"Benchmarking commit {commit} on {engine.url} with {report['dataset']}")
+
+    with TestClient(app) as client:
+        tokens = {
+            "admin": login(client, "admin"),
+            "bench": login(client, "bench"),
+            "client": login(client, "client0001"),
+        }
+        for name, method, path, headers, body_factory in route_cases(tokens):
+            if only and name not in only:
+                continue
+            # The routes log with print; keep the benchmark output readable
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = bench_route(client, method, path, headers, body_factory, args.runs)
+            report["routes"][name] = result
+            print(f"{name:28} p50 {result['p50_ms']:9.2f} ms  p95 {result['p95_ms']:9.2f} ms  queries {result.get('queries', '-')}")
+
+    scripts = {
+        "check_escalations": check_ticket_escalations,
+        "sync_trello": sync_trello_to_tickets,
+        "check_support_hours": check_support_hours,
+    }
+    for name, function in scripts.items():
+        if only and name not in only:
+            continue
+        result = bench_script(function, args.script_runs)
+        report["scripts"][name] = result
+        print(f"{name:28} first {result['first_run_ms']:9.2f} ms  p50 {result['p50_ms']:9.2f} ms")
+        if args.memory:
+            result = measure_script_memory(name)
+            report["memory"][name] = result
+            print(f"{name:28} peak RSS {result['peak_rss_mb']:9.1f} MB  ({result['growth_mb']:+.1f} MB over {result['baseline_rss_mb']} MB after imports)")
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{commit or 'unknown'}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
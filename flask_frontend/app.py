@@ -4,17 +4,99 @@ import os
 # Add the project root directory to the Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from flask import Flask, render_template, redirect, url_for, session, request
+from flask import Flask, render_template, redirect, url_for, session, request, g, has_request_context
 from functools import wraps
 import requests
+import time
+
+from backend.core import tracing
 
 app = Flask(__name__)
 app.secret_key = os.urandom(24)
 
+tracing.setup_tracing("flowdesk-frontend", sql=False)
+
+class TracedSession(requests.Session):
+    """
+    Sends the trace of the current page request to the API in the traceparent
+    header. A call made with the session's access token that the API refuses
+    (revoked, or older than a change to the user) is retried once with
+    renewed tokens.
+    """
+
+    def request(self, method, url, headers=None, **kwargs):
+        headers = dict(headers or {})
+        response = super().request(method, url, headers=tracing.inject_headers(dict(headers)), **kwargs)
+        if response.status_code == 401 and has_request_context() and session.get('access_token') \
+                and headers.get('Authorization') == f"Bearer {session['access_token']}":
+            if not refresh_tokens():
+                # Renew on the next page request instead of handing out the refused token again
+                session.pop('access_token_expires_at', None)
+                return response
+            headers['Authorization'] = f"Bearer {session['access_token']}"
+            response = super().request(method, url, headers=tracing.inject_headers(dict(headers)), **kwargs)
+        return response
+
+api = TracedSession()
+
+@app.before_request
+def start_trace():
+    name = f"{request.method} {request.url_rule.rule if request.url_rule else request.path}"
+    g.trace_span = tracing.start_server_span(name, request.headers, {"http.request.method": request.method})
+
+@app.after_request
+def record_trace_status(response):
+    g.trace_status = response.status_code
+    return response
+
+@app.teardown_request
+def end_trace(error=None):
+    tracing.end_server_span(g.pop('trace_span', None), g.pop('trace_status', None), error)
+
 def get_api_base_url():
     # Use 127.0.0.1 for local development to ensure consistency
     return "http://127.0.0.1:8000"
 
+# Pages hand the access token to their scripts, so renew it while it still has this long to live
+TOKEN_RENEW_MARGIN_SECONDS = 300
+
+def store_tokens(token_data):
+    session['access_token'] = token_data.get('access_token')
+    session['refresh_token'] = token_data.get('refresh_token')
+    session['access_token_expires_at'] = time.time() + token_data.get('expires_in', 0)
+
+def refresh_tokens():
+    """
+    Trades the refresh token for new tokens. False when that failed; a refused
+    refresh token also ends the session.
+    """
+    if not session.get('refresh_token'):
+        return False
+    try:
+        response = api.post(f"{get_api_base_url()}/api/token/refresh", json={"refresh_token": session['refresh_token']})
+    except requests.exceptions.RequestException:
+        return False
+    if response.status_code == 401:
+        session.clear()
+        return False
+    if not response.ok:
+        return False
+    token_data = response.json()
+    store_tokens(token_data)
+    session['roll'] = token_data.get('user_info', {}).get('roll')
+    return True
+
+@app.before_request
+def renew_access_token():
+    """Trades the refresh token for a new access token when the current one is about to expire."""
+    if 'user' not in session or not session.get('refresh_token'):
+        return
+    if request.endpoint in (None, 'static'):
+        return # Assets and unknown paths (favicon.ico) load alongside the page; only pages renew
+    if session.get('access_token_expires_at', 0) - time.time() > TOKEN_RENEW_MARGIN_SECONDS:
+        return
+    refresh_tokens() # On failure keep the current token; the page will show the API error
+
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -42,10 +124,12 @@ def login():
         
         try:
             # The backend expects form data for OAuth2PasswordRequestForm
-            response = requests.post(backend_login_url, data={"username": email, "password": password})
+            response = api.post(backend_login_url, data={"username": email, "password": password})
             
             if response.status_code == 401:
                 return render_template('login.html', error="Invalid credentials", api_base_url=api_base_url)
+            if response.status_code == 403:
+                return render_template('login.html', error="This account has been deactivated.", api_base_url=api_base_url)
             
             response.raise_for_status()  # Raise an exception for other bad responses (4xx or 5xx)
             
@@ -54,13 +138,13 @@ def login():
 
             session['user'] = user_info.get('username')
             session['roll'] = user_info.get('roll')
-            session['access_token'] = token_data.get('access_token')
+            store_tokens(token_data)
 
             # Now that we are logged in, get user details including customer_code
             try:
                 headers = {"Authorization": f"Bearer {session['access_token']}"}
                 user_me_url = f"{api_base_url}/api/users/me"
-                user_response = requests.get(user_me_url, headers=headers)
+                user_response = api.get(user_me_url, headers=headers)
                 user_response.raise_for_status()
                 me_data = user_response.json()
                 
@@ -163,7 +247,7 @@ def register():
         }
         
         try:
-            response = requests.post(f"{api_base_url}/api/register", json=registration_data)
+            response = api.post(f"{api_base_url}/api/register", json=registration_data)
             response.raise_for_status() # Raise an exception for bad status codes (4xx or 5xx)
             
             # If registration is successful, redirect to login with a success message
@@ -191,9 +275,18 @@ def reset_password():
 
 @app.route('/logout')
 def logout():
+    if session.get('access_token'):
+        try:
+            # Revoke the tokens too, or they keep working until they expire
+            api.post(f"{get_api_base_url()}/api/users/me/logout",
+                     headers={"Authorization": f"Bearer {session['access_token']}"})
+        except requests.exceptions.RequestException:
+            pass
     session.pop('user', None)
     session.pop('roll', None)
     session.pop('access_token', None)
+    session.pop('refresh_token', None)
+    session.pop('access_token_expires_at', None)
     return redirect(url_for('login'))
 
 @app.route('/unverified')
@@ -274,9 +367,9 @@ def settings():
         }
         try:
             # Try to update first
-            response = requests.put(f"{api_base_url}/settings/smtp", json=settings_data, headers=headers)
+            response = api.put(f"{api_base_url}/settings/smtp", json=settings_data, headers=headers)
             if response.status_code == 404: # Not found, so create
-                response = requests.post(f"{api_base_url}/settings/smtp", json=settings_data, headers=headers)
+                response = api.post(f"{api_base_url}/settings/smtp", json=settings_data, headers=headers)
             
             # Handle auth errors specifically
             if response.status_code in [401, 403]:
@@ -292,7 +385,7 @@ def settings():
 
     # Fetch current settings for GET request or after POST
     try:
-        response = requests.get(f"{api_base_url}/settings/smtp", headers=headers)
+        response = api.get(f"{api_base_url}/settings/smtp", headers=headers)
         
         if response.status_code in [401, 403]:
             error = "Error de autorización. No tienes permiso para ver esta configuración."
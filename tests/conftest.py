@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""
+Shared fixtures for the test suite.
+
+The suite runs against a fresh SQLite database in a temporary directory,
+seeded with benchmarks.data_generator; DATABASE_URL and the replica settings
+of the environment are ignored. The settings below are applied before
+backend is first imported, since its modules read them at import time.
+"""
+import os
+import shutil
+import tempfile
+
+_fixture_dir = tempfile.mkdtemp(prefix="flowdesk-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_fixture_dir, 'tests.db')}"
+os.environ["DB_REPLICA_URL"] = ""
+os.environ["DB_QUERY_STATS"] = "true" # Statement counts in the Server-Timing header
+os.environ["DB_SLOW_QUERY_MS"] = "0"
+os.environ["AUTH_CACHE_TTL_SECONDS"] = "0" # Every call pays its user lookup, as on a cold worker
+
+import pytest
+
+FIXTURE_SCALE = 0.01
+
+
+@pytest.fixture(scope="session")
+def seeded_engine():
+    """The engine of the test database, filled by the benchmark data generator."""
+    from backend.database import engine
+    from benchmarks.data_generator import generate
+
+    generate(engine, FIXTURE_SCALE, seed=7, log=lambda message: None)
+    yield engine
+    engine.dispose()
+    shutil.rmtree(_fixture_dir, ignore_errors=True)
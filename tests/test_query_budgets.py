@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""
+Query budgets for every router in backend/api.
+
+Each route is called twice through TestClient: once with a request that
+returns one or a few rows and once with one that returns many (a bigger
+limit, a busier client or ticket, more configured rows). The statement count
+of each call, read from the Server-Timing header, must stay within the
+route's budget and must be the same for both calls: a count that grows with
+the result is an N+1.
+
+Paths can name fixture rows chosen after seeding, such as {busiest_client};
+they are filled in from the fixture_ids fixture.
+"""
+import re
+from typing import Callable, NamedTuple
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import func, update
+
+from backend import models
+from backend.database import SessionLocal
+from backend.main import app
+from benchmarks.data_generator import BENCHMARK_PASSWORD
+
+_SERVER_TIMING_QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+class Budget(NamedTuple):
+    """
+    A request is a path or (path, json body). user can be a (small, large)
+    pair when the size depends on who asks; grow runs between the two calls.
+    """
+    name: str
+    user: str | tuple
+    method: str
+    small: str | tuple
+    large: str | tuple
+    statements: int
+    grow: Callable | None = None
+
+
+def add_department_rows(db, manager_id, consultants):
+    for n in consultants:
+        person = db.query(models.PersonOfCustomer).filter(models.PersonOfCustomer.user == f"cons{n:02d}").one()
+        db.add(models.DepartmentManagerRow(
+            master_id=manager_id, department=f"Departamento {n}", in_charge_id=person.id, in_charge_name=person.user
+        ))
+
+
+def grow_department_rows():
+    with SessionLocal() as db:
+        manager_id = db.query(models.DepartmentManager.id).scalar()
+        add_department_rows(db, manager_id, range(2, 11))
+        db.commit()
+
+
+def checkins(count):
+    records = [
+        {"emp": f"{n // 4 + 1:04d}", "chDate": f"2031-01-{count % 28 + 1:02d}",
+         "chTime": f"{(8, 12, 13, 18)[n % 4]:02d}:00:00", "clock": "BIO01"}
+        for n in range(count)
+    ]
+    return ("/api/checkinout/bulk", {"records": records, "user": "clock", "office": "Central", "computer": "BIO01"})
+
+
+def activity(minute):
+    return ("/api/actividades/", {
+        "titulo": "Presupuesto", "descripcion": "Control de consultas",
+        "hora_inicio": f"2031-02-01T09:{minute:02d}:00", "hora_fin": f"2031-02-01T09:{minute + 10:02d}:00",
+        "cliente_id": 2, "card_id": 1,
+    })
+
+
+BUDGETS = [
+    # actividades_api
+    Budget("create_actividad", "admin", "POST", activity(0), activity(20), 8),
+    Budget("read_actividades", "cons01", "GET", "/api/actividades/?limit=1", "/api/actividades/?limit=500", 2),
+    Budget("read_actividad", "admin", "GET", "/api/actividades/1", "/api/actividades/2", 2),
+    Budget("additional_hours_report", "admin", "GET",
+           "/api/reports/additional-hours/1", "/api/reports/additional-hours/{additional_client}", 3),
+    # attachments_api
+    Budget("attachments_for_card", "admin", "GET",
+           "/api/cards/{lone_card}/attachments", "/api/cards/{attached_card}/attachments", 2),
+    # attention_flow_api
+    Budget("attention_flow", "admin", "GET", "/api/settings/attention-flow", "/api/settings/attention-flow", 2),
+    # boards_api
+    Budget("read_boards", "admin", "GET", "/api/boards/?limit=1", "/api/boards/?limit=100", 2),
+    # cards_api
+    Budget("read_cards", "admin", "GET", "/api/cards/?limit=1", "/api/cards/?limit=500", 2),
+    Budget("read_cards_client", "client0001", "GET", "/api/cards/?limit=1", "/api/cards/?limit=500", 3),
+    Budget("read_card", "admin", "GET", "/api/cards/1", "/api/cards/2", 1),
+    # changes_api
+    Budget("read_changes", "admin", "GET", "/api/changes?limit=1", "/api/changes?limit=1000", 2),
+    # checkinout_api
+    Budget("last_serial", "admin", "GET", "/api/checkinout/last-serial", "/api/checkinout/last-serial", 1),
+    Budget("bulk_checkins", "admin", "POST", checkins(1), checkins(500), 3),
+    # clientes_api
+    Budget("read_clientes", "admin", "GET", "/api/clientes/?limit=1", "/api/clientes/?limit=1000", 3),
+    Budget("read_cliente", "admin", "GET", "/api/clientes/1", "/api/clientes/2", 2),
+    Budget("search_clientes", "admin", "GET", "/api/clientes/search/?q=C00001", "/api/clientes/search/?q=Cliente", 2),
+    # comments_api
+    Budget("comments_for_card", "admin", "GET",
+           "/api/cards/{lone_card}/comments/", "/api/cards/{commented_card}/comments/", 1),
+    # department_manager_api
+    Budget("eligible_users", "admin", "GET",
+           "/api/department_managers/eligible_users/", "/api/department_managers/eligible_users/", 2),
+    Budget("department_managers", "admin", "GET", "/api/department_managers/", "/api/department_managers/", 3,
+           grow=grow_department_rows),
+    # monitoring_api
+    Budget("db_pool", "admin", "GET", "/api/monitoring/db-pool", "/api/monitoring/db-pool", 1),
+    # person_of_customer_api
+    Budget("read_personas", "admin", "GET", "/api/personas/?limit=1", "/api/personas/?limit=100", 2),
+    Budget("read_persona", "admin", "GET", "/api/personas/1", "/api/personas/2", 2),
+    # proyectos_api
+    Budget("read_proyectos", "admin", "GET", "/api/proyectos/?limit=1", "/api/proyectos/?limit=100", 2),
+    Budget("read_proyecto", "admin", "GET", "/api/proyectos/1", "/api/proyectos/2", 1),
+    # reports_api
+    Budget("activities_by_user", "admin", "GET",
+           "/api/reports/activities_by_user", "/api/reports/activities_by_user", 2),
+    Budget("support_hours", "admin", "GET",
+           "/api/reports/support_hours/1", "/api/reports/support_hours/{busiest_client}", 2),
+    Budget("global_activities", "admin", "GET",
+           "/api/reports/global_activities?client_id=1&end_date=2022-06-01T00:00:00",
+           "/api/reports/global_activities?client_id={busiest_client}", 1),
+    # settings_api
+    Budget("smtp_settings", "admin", "GET", "/settings/smtp", "/settings/smtp", 2),
+    # tickets_api is not listed: its ActividadResponse declares the integer Priority and
+    # Status columns as strings, so it cannot serialize stored activities at all
+    # users_api
+    Budget("users_me", ("client0001", "client0011"), "GET", "/api/users/me", "/api/users/me", 4),
+]
+
+
+def extend_fixture():
+    """Data the generator does not create, shaped so the small and large calls differ in size."""
+    with SessionLocal() as db:
+        # Client 1 keeps a single ticket with additional hours
+        first_card = db.query(func.min(models.Card.internalId)).filter(models.Card.CustCode == "C00001").scalar()
+        db.execute(
+            update(models.Card)
+            .where(models.Card.CustCode == "C00001", models.Card.internalId != first_card)
+            .values(AdditionalHoursStatus=None)
+        )
+        db.execute(
+            update(models.Card).where(models.Card.internalId == first_card)
+            .values(AdditionalHoursStatus="Aprobado", HourCot=4.0)
+        )
+        # client0001 has one person in charge, client0011 has ten
+        db.execute(update(models.Cliente).where(models.Cliente.id == 1).values(encargados="cons01"))
+        db.execute(
+            update(models.Cliente).where(models.Cliente.id == 11)
+            .values(encargados=",".join(f"cons{n:02d}" for n in range(1, 11)))
+        )
+        # Only read back by the settings route; nothing listens on this port
+        db.add(models.SmtpSettings(host="127.0.0.1", port=1, username="budgets", password="budgets"))
+        manager = models.DepartmentManager()
+        db.add(manager)
+        db.flush()
+        add_department_rows(db, manager.id, range(1, 2))
+        db.commit()
+
+
+def busiest(column, *filters):
+    """Value of column with the most rows, e.g. the card with most comments."""
+    with SessionLocal() as db:
+        return db.query(column).filter(*filters).group_by(column).order_by(func.count().desc(), column).limit(1).scalar()
+
+
+@pytest.fixture(scope="module")
+def fixture_ids(seeded_engine):
+    extend_fixture()
+    return {
+        "busiest_client": busiest(models.Actividad.cliente_id),
+        "additional_client": busiest(
+            models.Cliente.id,
+            models.Card.CustCode == models.Cliente.code, models.Card.AdditionalHoursStatus.isnot(None)
+        ),
+        "commented_card": busiest(models.CardsEventRow.master_id),
+        "attached_card": busiest(models.TicketAttachment.card_id),
+        "lone_card": busiest(models.Card.internalId), # Any card; its comments and attachments are few or none
+    }
+
+
+@pytest.fixture(scope="module")
+def client(fixture_ids):
+    with TestClient(app) as api:
+        yield api
+
+
+@pytest.fixture(scope="module")
+def auth_headers(client):
+    headers = {}
+    for username in ("admin", "cons01", "client0001", "client0011"):
+        response = client.post("/api/token", data={"username": username, "password": BENCHMARK_PASSWORD})
+        response.raise_for_status()
+        headers[username] = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    # Some activity in the change log for read_changes
+    for card_id in range(1, 21):
+        client.put(f"/api/cards/{card_id}", json={"Comment": "Revisado"}, headers=headers["admin"])
+    return headers
+
+
+def statement_count(client, headers, method, request, fixture_ids):
+    path, body = request if isinstance(request, tuple) else (request, None)
+    path = path.format(**fixture_ids)
+    response = client.request(method, path, headers=headers, json=body)
+    assert response.status_code < 400, f"{method} {path} returned {response.status_code}: {response.text[:300]}"
+    match = _SERVER_TIMING_QUERIES.search(response.headers.get("server-timing", ""))
+    assert match, f"{method} {path} has no Server-Timing header; is DB_QUERY_STATS on?"
+    return int(match.group(1))
+
+
+@pytest.mark.parametrize("budget", BUDGETS, ids=[budget.name for budget in BUDGETS])
+def test_query_budget(budget, client, auth_headers, fixture_ids):
+    small_user, large_user = budget.user if isinstance(budget.user, tuple) else (budget.user, budget.user)
+    small_count = statement_count(client, auth_headers[small_user], budget.method, budget.small, fixture_ids)
+    if budget.grow:
+        budget.grow()
+    large_count = statement_count(client, auth_headers[large_user], budget.method, budget.large, fixture_ids)
+
+    assert large_count == small_count, f"{small_count} -> {large_count} statements: grows with the result size"
+    assert large_count <= budget.statements, f"{large_count} statements, over budget of {budget.statements}"